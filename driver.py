@@ -1,7 +1,8 @@
 import numpy as np
 from tqdm import tqdm
 import logging
-from util import check_distance
+from executor import ExecutionBackend
+from util import check_distance, get_settings
 
 
 class Driver:
@@ -9,20 +10,39 @@ class Driver:
     The simulation driver class. Responsible for moving time and events forward.
     """
 
-    def __init__(self, scenario, negotiation_protocol):
+    def __init__(self, scenario, negotiation_protocol, executor=None):
         """
         Initializes the driver class.
         :param scenario: Scenario to be simulated.
         :param negotiation_protocol: Negotiation protocol to be used.
+        :param executor: ExecutionBackend the negotiations run in. If None, one is created from config.yaml
+        (Execution) and shut down at the end of the run.
         """
         self.scenario = scenario
         self.negotiation_protocol = negotiation_protocol
+        self.owns_executor = executor is None
+        self.executor = executor if executor is not None else ExecutionBackend.from_settings(get_settings().execution)
+        # the protocols share the driver's backend instead of creating worker pools per event
+        self.negotiation_protocol.executor = self.executor
 
     def run(self):
         """
         The main method of the driver that moves the time and events forward.
         :return: Returns power and time consumption, user consents, and updated scenario objects.
         """
+        try:
+            return self.simulate()
+        finally:
+            # the protocol engine lives for one run (it holds the backend shut down below)
+            self.negotiation_protocol.reset()
+            if self.owns_executor:
+                self.executor.shutdown()
+
+    def simulate(self):
+        """
+        Moves the time and events forward (see run()).
+        :return: Returns power and time consumption, user consents, and updated scenario objects.
+        """
         # Current user list
         curr_users_list = []
 
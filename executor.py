@@ -0,0 +1,100 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from util import get_settings, set_settings
+
+'''
+Execution backend shared by the negotiation protocols. The driver creates one backend per simulation run and injects
+it into the protocols, so that worker threads or processes are created once per run instead of once per event.
+
+Modes:
+ - inline: tasks run one after the other in the calling thread,
+ - thread: tasks run in a pool of worker threads,
+ - process: tasks run in a pool of worker processes. Only tasks that do not change shared objects (pure tasks, which
+   return their results) can run in other processes, the others run in the thread pool.
+Batches smaller than inline_threshold always run inline, as dispatching them costs more than it saves.
+'''
+
+MODES = ("inline", "thread", "process")
+
+
+class ExecutionBackend:
+    """
+    Maps tasks over batches of items with the configured parallelism. The pools are created on first use.
+    """
+    def __init__(self, mode="inline", workers=None, inline_threshold=8):
+        """
+        :param mode: inline, thread or process.
+        :param workers: Maximum number of worker threads/processes (None for the concurrent.futures default).
+        :param inline_threshold: Batches with fewer items run inline.
+        """
+        if mode not in MODES:
+            raise ValueError(f"Execution mode must be one of {', '.join(MODES)}, got {mode}")
+        self.mode = mode
+        self.workers = workers
+        self.inline_threshold = inline_threshold
+        self._thread_pool = None
+        self._process_pool = None
+
+    @classmethod
+    def from_settings(cls, settings):
+        """
+        :param settings: ExecutionSettings (see util.py).
+        :return: ExecutionBackend object.
+        """
+        return cls(settings.mode, settings.workers, settings.inline_threshold)
+
+    def _pool(self, pure):
+        """
+        :param pure: Whether the task only returns results (no changes to shared objects).
+        :return: Executor to run a batch in.
+        """
+        if self.mode == "process" and pure:
+            if self._process_pool is None:
+                # the workers get the compiled settings of this process instead of parsing config.yaml again
+                self._process_pool = ProcessPoolExecutor(max_workers=self.workers, initializer=set_settings,
+                                                         initargs=(get_settings(),))
+            return self._process_pool
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(max_workers=self.workers)
+        return self._thread_pool
+
+    def map(self, fn, items, pure=False):
+        """
+        Apply fn to every item.
+        :param fn: Task function taking one item (picklable in process mode).
+        :param items: Iterable of items.
+        :param pure: Whether the task only returns results and does not change shared objects (e.g., users or the
+        IoT device), which is required to run it in other processes.
+        :return: List of the results, in item order.
+        """
+        items = list(items)
+        if self.mode == "inline" or len(items) < self.inline_threshold:
+            return [fn(item) for item in items]
+        return list(self._pool(pure).map(fn, items))
+
+    def shutdown(self):
+        """
+        Wait for the running tasks and release the worker threads/processes. The backend can still be used afterwards,
+        the pools are created again on demand.
+        """
+        for pool in (self._thread_pool, self._process_pool):
+            if pool is not None:
+                pool.shutdown(wait=True)
+        if self._thread_pool is not None or self._process_pool is not None:
+            logging.debug("Execution backend (%s) shut down", self.mode)
+        self._thread_pool = None
+        self._process_pool = None
+
+    def __getstate__(self):
+        # the pools belong to this process, copies (e.g., sent to a worker process with a protocol) create their own
+        state = self.__dict__.copy()
+        state["_thread_pool"] = None
+        state["_process_pool"] = None
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
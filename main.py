@@ -1,7 +1,6 @@
 import argparse
 import logging
 import os
-import random
 import time
 
 import numpy as np
@@ -11,12 +10,12 @@ from iot_device import IoTDevice
 from logging_module import setup_logging
 from negotiation_protocols.negotiation import NegotiationProtocol
 from networks.network import Network
-from process_results import ResultProcessor
 from scenarios.scenario import Scenario
-from util import result_file_util, write_results, Distribution, calc_norm_utility, determine_decimals, load_config, get_users_in_range
+from util import result_file_util, write_results, Distribution, calc_norm_utility, determine_decimals, get_settings, \
+    users_in_range_mask, RandomStreams, derive_run_seed
 
 
-def main(scenario_name, network_type, protocol, filename, distribution_type):
+def main(scenario_name, network_type, protocol, filename, distribution_type, seed=None):
     # make scenario lower case for consistency
     scenario_name = scenario_name.lower()
 
@@ -26,6 +25,10 @@ def main(scenario_name, network_type, protocol, filename, distribution_type):
     # same for the protocol
     protocol = protocol.lower()
 
+    # independent random streams of this run (arrivals, protocol and one per user), all derived from a single seed
+    streams = RandomStreams(seed)
+    logging.info("Seed: %s", streams.seed)
+
     # create the scenario that determines user types, locations and movement patterns, network parameters and
     # simulation runtime
     list_of_users = []
@@ -35,13 +38,13 @@ def main(scenario_name, network_type, protocol, filename, distribution_type):
     iot_device = IoTDevice((0, 0))
 
     # create distribution object
-    dist = Distribution(distribution_type)
+    dist = Distribution(distribution_type, streams.subsystem("arrivals"))
 
     # network technology that determines the range of communication, power consumed and allowed data rates
     network = Network(network_type)
 
     # Generates the users/PAs
-    scenario = Scenario(scenario_name, list_of_users, iot_device, network)
+    scenario = Scenario(scenario_name, list_of_users, iot_device, network, streams)
     scenario.generate_scenario(dist)
     logging.debug("Number of users: %s", len(scenario.list_of_users))
 
@@ -50,18 +53,23 @@ def main(scenario_name, network_type, protocol, filename, distribution_type):
     # scenario.plot_scenario()
 
     # create the negotiation protocol object that determines the rules of the encounter
-    negotiation_protocol = NegotiationProtocol(protocol, network)
+    negotiation_protocol = NegotiationProtocol(protocol, network, streams.subsystem("protocol"))
 
     driver = Driver(scenario, negotiation_protocol)
 
     total_consented, avg_user_power_consumption, total_owner_power_consumption, \
         avg_user_time_spent, total_owner_time_spent, end_time, list_of_users, iot_device \
         = driver.run()  # drives the simulation environment
+    network.end_run()
 
     # calculate normalized utilities
     calc_norm_utility(list_of_users, 0)
     calc_norm_utility(list_of_users+[iot_device], 1)
 
+    # users whose trajectory crossed the communication range of the IoT device (computed once for both columns)
+    in_range_user_num = int(np.count_nonzero(users_in_range_mask(list_of_users, network.network_impl.comm_distance,
+                                                                 iot_device.device_location)))
+
     # Write to csv
     # Define the data rows
     rows = [[protocol, network_type, scenario_name,
@@ -72,9 +80,8 @@ def main(scenario_name, network_type, protocol, filename, distribution_type):
              total_consented,
              len(list_of_users),
              round((total_consented / len(list_of_users)) * 100, 2),
-             len(get_users_in_range(list_of_users, network.network_impl.comm_distance)),
-             round((total_consented / len(get_users_in_range(list_of_users, network.network_impl.comm_distance))) * 100,
-                   2),
+             in_range_user_num,
+             round((total_consented / in_range_user_num) * 100, 2),
              round(end_time, determine_decimals(end_time)),
              round(np.mean([u.utility for u in list_of_users]), 2),
              round(iot_device.utility, 2),
@@ -97,6 +104,7 @@ if __name__ == "__main__":
     parser.add_argument("-t", "--tournament", help="Tournament-styled testing", action='store_true')
     parser.add_argument("-d", "--distribution", help="Distribution to use, e.g., poisson")
     parser.add_argument("-v", "--verbose", help="Enable verbose output", action="store_true")
+    parser.add_argument("--seed", type=int, help="Root seed to reproduce a run (or a whole tournament)")
 
     # Read arguments from command line
     args = parser.parse_args()
@@ -117,33 +125,30 @@ if __name__ == "__main__":
     else:
         distribution_type = args.distribution
 
-    # default seeds for reproducibility
-    # random.seed(123)
-    # np.random.seed(123)
-
     # Load YAML file
-    config = load_config()
+    config = get_settings()
 
     if args.tournament:
         # Tournament run case
         # Extract values directly from the YAML configuration
-        runs = config['Tournament']['runs']
-        networks = config['Tournament']['networks']
-        scenarios = config['Tournament']['scenarios']
-        protocols = config['Tournament']['protocols']
-        seed = int(time.time())
-        logging.debug("Initial Seed: ", seed)
+        runs = config.tournament.runs
+        networks = config.tournament.networks
+        scenarios = config.tournament.scenarios
+        protocols = config.tournament.protocols
+        seed = args.seed if args.seed is not None else int(time.time())
+        logging.info("Tournament seed: %s", seed)
         # Run the code for each combination of protocol, network, and scenario
         for protocol in protocols:
             for network in networks:
                 for scenario in scenarios:
                     for i in range(runs):
                         # use run number for seed
-                        random.seed(seed + 1)
+                        # (same seed for a run number across combinations, pass it to --seed to reproduce a run)
+                        run_seed = derive_run_seed(seed, i)
                         # Run your code here with the current combination of protocol, network, and scenario
                         logging.info(f"Run {i + 1} of {runs} for protocol {protocol}, network {network}, "
-                                     f"and scenario {scenario}")
-                        main(scenario, network, protocol, file_path, distribution_type)
+                                     f"and scenario {scenario} (seed {run_seed})")
+                        main(scenario, network, protocol, file_path, distribution_type, run_seed)
     else:
         # Single run case
         if not args.protocol or not args.network or not args.scenario:
@@ -155,10 +160,11 @@ if __name__ == "__main__":
         logging.info("Network: %s", network_type)
         scenario_name = args.scenario
         logging.info("Scenario: %s", scenario_name)
-        main(scenario_name, network_type, protocol, file_path, distribution_type)
+        main(scenario_name, network_type, protocol, file_path, distribution_type, args.seed)
 
     logging.info("Processing Results!")
-    # Process results
+    # Process results (imported here, as the result processing loads pandas and matplotlib)
+    from process_results import ResultProcessor
     result_processor = ResultProcessor()
     result_processor.process_results(script_dir)
     # Plot results only works for tournament for now
@@ -0,0 +1,82 @@
+import math
+import time
+
+from networks.bleemod_python import ble_model_jit
+from networks.bleemod_python.ble_model_discovery import BLEDiscovery, DiscoveryModelResult
+
+"""
+Compare the vectorized BLE discovery model (all phi at once) against the scalar per-phi reference implementation.
+Run from the repository root: python -m misc.ble_discovery_parity_testing
+"""
+
+
+def scalar_reference(discovery, n_points, epsilon_hit, Ta, Ts, ds, rho_max, max_time, n_bytes_tx):
+    """
+    Average the scalar per-phi model results, exactly as the discovery model originally did (with the Python
+    implementation, the per-phi methods would otherwise use the compiled kernels).
+    :return: DiscoveryModelResult
+    """
+    jit_enabled = ble_model_jit.ENABLED
+    ble_model_jit.set_enabled(False)
+    try:
+        return _scalar_reference(discovery, n_points, epsilon_hit, Ta, Ts, ds, rho_max, max_time, n_bytes_tx)
+    finally:
+        ble_model_jit.set_enabled(jit_enabled)
+
+
+def _scalar_reference(discovery, n_points, epsilon_hit, Ta, Ts, ds, rho_max, max_time, n_bytes_tx):
+    delta = (3.0 * Ts) / float(n_points)
+    phi = 0
+    result_joined = DiscoveryModelResult()
+
+    for cnt in range(n_points):
+        if n_bytes_tx is None:
+            result_single = discovery._ble_model_discovery_get_result_one_phi(epsilon_hit, Ta, Ts, ds, phi, rho_max,
+                                                                              max_time)
+        else:
+            result_single = discovery._ble_model_discovery_get_result_one_phi_alanezi(epsilon_hit, Ta, Ts, ds, phi,
+                                                                                      rho_max, max_time, n_bytes_tx)
+        result_joined.discoveryLatency += result_single.discoveryLatency
+        result_joined.chargeAdv += result_single.chargeAdv
+        result_joined.chargeScan += result_single.chargeScan
+        phi += delta
+
+    result_joined.discoveryLatency /= float(n_points)
+    result_joined.chargeAdv /= float(n_points)
+    result_joined.chargeScan /= float(n_points)
+    return result_joined
+
+
+# (Ta, Ts, ds, n_bytes_tx); n_bytes_tx None => standard model
+parameter_sets = [
+    (0.25, 5, 2, None),
+    (0.25, 5, 2, 0),
+    (0.25, 5, 2, 1000),
+    (0.1, 1, 0.5, 200),
+    (1.0, 2, 0.1, 50),
+    (0.02, 0.5, 0.05, None),
+]
+
+# no cache, every call evaluates the model
+discovery = BLEDiscovery()
+rel_tol = 1e-9
+
+for Ta, Ts, ds, n_bytes_tx in parameter_sets:
+    start = time.time()
+    reference = scalar_reference(discovery, 100, 0.9999, Ta, Ts, ds, 0.01, 1000, n_bytes_tx)
+    scalar_time = time.time() - start
+
+    start = time.time()
+    if n_bytes_tx is None:
+        vectorized = discovery.ble_model_discovery_get_result(100, 0.9999, Ta, Ts, ds, 0.01, 1000)
+    else:
+        vectorized = discovery.ble_model_discovery_get_result_alanezi(100, 0.9999, Ta, Ts, ds, 0.01, 1000, n_bytes_tx)
+    vectorized_time = time.time() - start
+
+    for attribute in ("discoveryLatency", "chargeAdv", "chargeScan"):
+        expected = getattr(reference, attribute)
+        actual = getattr(vectorized, attribute)
+        status = "OK" if math.isclose(expected, actual, rel_tol=rel_tol, abs_tol=1e-15) else "MISMATCH"
+        print(f"Ta={Ta} Ts={Ts} ds={ds} n_bytes_tx={n_bytes_tx} {attribute}: "
+              f"scalar={expected!r} vectorized={actual!r} {status}")
+    print(f"scalar: {scalar_time:.3f}s, vectorized: {vectorized_time:.3f}s")
@@ -0,0 +1,95 @@
+import math
+import sys
+import time
+
+import numpy as np
+
+from networks.bleemod_python import ble_model_jit
+from networks.bleemod_python.ble_model_connected import BLEConnected, BLE_E_MODE_INT_MAXSEQUENCES
+from networks.bleemod_python.ble_model_discovery import BLEDiscovery
+from networks.bleemod_python.ble_model_scanning import BLEScanner, BLEModelSCEventType, BLEModelSCScanType
+
+"""
+Check that the numba-compiled BLE model kernels (ble_model_jit.py) agree with the Python implementation.
+Run from the repository root: python -m misc.ble_jit_parity_testing
+"""
+
+if not ble_model_jit.AVAILABLE:
+    print("numba is not installed, only the Python backend is available")
+    sys.exit(0)
+
+rng = np.random.default_rng(0)
+connected = BLEConnected()
+scanner = BLEScanner()
+discovery = BLEDiscovery()
+mismatches = 0
+
+
+def both_backends(function, *args):
+    """
+    Evaluate a model function with the Python and with the compiled backend.
+    :return: Python result, compiled result
+    """
+    ble_model_jit.set_enabled(False)
+    python_result = function(*args)
+    ble_model_jit.set_enabled(True)
+    return python_result, function(*args)
+
+
+def check(name, python_result, jit_result, rel_tol=1e-12):
+    """
+    Compare the results of both backends and report mismatches.
+    """
+    global mismatches
+    if not math.isclose(python_result, jit_result, rel_tol=rel_tol, abs_tol=1e-18):
+        mismatches += 1
+        print(f"MISMATCH {name}: python={python_result!r} jit={jit_result!r}")
+
+
+# Connected mode sequences
+for _ in range(200):
+    master_or_slave = int(rng.integers(0, 2))
+    Tc = float(rng.uniform(0.0075, 4.0))
+    n_seq = int(rng.integers(1, BLE_E_MODE_INT_MAXSEQUENCES + 1))
+    n_rx = rng.integers(0, 300, BLE_E_MODE_INT_MAXSEQUENCES)
+    n_tx = rng.integers(0, 300, BLE_E_MODE_INT_MAXSEQUENCES)
+    args = (master_or_slave, Tc, n_seq, n_rx, n_tx, 3)
+    check("charge_sequences", *both_backends(connected.ble_e_model_c_get_charge_sequences, *args))
+    check("duration_sequences", *both_backends(connected.ble_e_model_c_get_duration_sequences, *args))
+    check("charge_event_same_payload", *both_backends(connected.ble_e_model_c_get_charge_event_same_payload,
+                                                      master_or_slave, Tc, n_seq, int(n_rx[0]), int(n_tx[0]), 3))
+
+# Scan events of all types
+for _ in range(200):
+    for event_type in BLEModelSCEventType:
+        args = (float(rng.uniform(0.0025, 10.0)), event_type, BLEModelSCScanType.SC_SCAN_TYPE_PERIODIC,
+                37, int(rng.integers(0, 300)), int(rng.integers(0, 300)), float(rng.uniform(0.0, 10.0)))
+        check(f"charge_scan_event {event_type.name}", *both_backends(scanner.ble_e_model_sc_get_charge_scan_event,
+                                                                     *args))
+
+# Discovery model, single phi and averaged
+parameter_sets = [(0.25, 5, 2, 0), (0.25, 5, 2, 1000), (0.1, 1, 0.5, 200), (1.0, 2, 0.1, 50), (0.02, 0.5, 0.05, 0)]
+for Ta, Ts, ds, n_bytes_tx in parameter_sets:
+    for phi in rng.uniform(0, 3 * Ts, 10):
+        for python_result, jit_result in [
+                both_backends(discovery._ble_model_discovery_get_result_one_phi, 0.9999, Ta, Ts, ds, phi, 0.01, 1000),
+                both_backends(discovery._ble_model_discovery_get_result_one_phi_alanezi, 0.9999, Ta, Ts, ds, phi,
+                              0.01, 1000, n_bytes_tx)]:
+            for attribute in ("discoveryLatency", "chargeAdv", "chargeScan"):
+                check(f"one_phi {attribute} Ta={Ta} Ts={Ts} ds={ds} phi={phi}", getattr(python_result, attribute),
+                      getattr(jit_result, attribute), rel_tol=1e-9)
+
+    timings = []
+    results = []
+    for enabled in (False, True):
+        ble_model_jit.set_enabled(enabled)
+        start = time.time()
+        results.append(discovery.ble_model_discovery_get_result_alanezi(100, 0.9999, Ta, Ts, ds, 0.01, 1000,
+                                                                        n_bytes_tx))
+        timings.append(time.time() - start)
+    for attribute in ("discoveryLatency", "chargeAdv", "chargeScan"):
+        check(f"discovery {attribute} Ta={Ta} Ts={Ts} ds={ds}", getattr(results[0], attribute),
+              getattr(results[1], attribute), rel_tol=1e-9)
+    print(f"Ta={Ta} Ts={Ts} ds={ds} n_bytes_tx={n_bytes_tx}: python {timings[0]:.4f}s, jit {timings[1]:.4f}s")
+
+print("OK" if mismatches == 0 else f"{mismatches} mismatches")
@@ -0,0 +1,77 @@
+import math
+import time
+
+import numpy as np
+
+from networks.lora import LoRa
+
+"""
+Compare the stateless LoRa engine (precomputed ToA tables, scalar and vectorized) against the original LoRa
+send/receive implementation, which chose the mode and changed the network object on every call.
+Run from the repository root: python -m misc.lora_engine_parity_testing
+"""
+
+
+def reference(config, payload, receive):
+    """
+    Original LoRa.determine_mode() followed by LoRa.send() / LoRa.receive().
+    :return: Power and time consumption (W and s).
+    """
+    best_mode = None
+    best_toa = float('inf')
+    for mode in config.mode_configs:
+        t_sym = (2 ** mode.sf) / (mode.bw * 1000)
+        n_phy = 8 + max(math.ceil((28 + 8 * payload + 4 * mode.sf) / (4 * mode.sf)) * (config.cr + 4), 0)
+        t_tx = t_sym * 4.25 + t_sym * n_phy
+        if t_tx < best_toa:
+            best_toa = t_tx
+            best_mode = mode
+    sf, max_payload = best_mode.sf, best_mode.lora_max_payload
+
+    t_tx = 0
+    t_sym = (2 ** sf) / (best_mode.bw * 1000)
+    t_pre = t_sym * 4.25
+    if math.ceil(payload / max_payload) > 1:
+        while payload - max_payload > 0:
+            payload = payload - max_payload
+            size = max_payload if receive else payload
+            n_phy = 8 + max(math.ceil((28 + 8 * size + 4 * sf) / (4 * sf)) * (config.cr + 4), 0)
+            if receive:
+                t_tx = t_pre + t_sym * n_phy
+            else:
+                t_tx += t_pre + t_sym * n_phy
+    n_phy = 8 + max(math.ceil((28 + 8 * payload + 4 * sf) / (4 * sf)) * (config.cr + 4), 0)
+    t_tx += t_pre + t_sym * n_phy
+
+    current = config.i_rx if receive else best_mode.i_tx
+    return (t_tx / 3600) * config.voltage * (current / 1000), t_tx
+
+
+lora = LoRa()
+payloads = list(range(0, 2000)) + [4095, 4096, 4097, 5000, 12345]
+mismatches = 0
+
+for receive in (False, True):
+    expected = [reference(lora.config, payload, receive) for payload in payloads]
+    scalar = [(lora.receive if receive else lora.send)(payload) for payload in payloads]
+    _, power, duration = lora.engine.transmissions(payloads, receive)
+    for payload, (power_ref, t_ref), (power_s, t_s), power_v, t_v in zip(payloads, expected, scalar, power, duration):
+        if (power_ref, t_ref) != (power_s, t_s) or (power_ref, t_ref) != (float(power_v), float(t_v)):
+            mismatches += 1
+            print(f"MISMATCH receive={receive} payload={payload}: reference={(power_ref, t_ref)} "
+                  f"scalar={(power_s, t_s)} vectorized={(float(power_v), float(t_v))}")
+
+    start = time.time()
+    for payload in payloads:
+        reference(lora.config, payload, receive)
+    t_reference = time.time() - start
+    start = time.time()
+    for payload in payloads:
+        (lora.receive if receive else lora.send)(payload)
+    t_scalar = time.time() - start
+    start = time.time()
+    lora.engine.transmissions(np.array(payloads), receive)
+    t_vectorized = time.time() - start
+    print(f"receive={receive}: reference {t_reference:.4f}s, engine {t_scalar:.4f}s, vectorized {t_vectorized:.4f}s")
+
+print("OK" if mismatches == 0 else f"{mismatches} mismatches")
@@ -1,11 +1,9 @@
-from concurrent.futures import ThreadPoolExecutor
-
 from util import check_distance, calc_utility, calc_time_remaining
-import random
 import sys
 import logging
 from functools import reduce
-from util import get_config
+from util import get_settings
+from negotiation_protocols.outcome import NegotiationTask, NegotiationOutcome, CostTemplates
 
 
 class Alanezi:
@@ -13,17 +11,22 @@ class Alanezi:
     Implements Alanezi negotiation protocol. Includes BLE, ZigBee and LoRa based negotiations.
     """
 
-    def __init__(self, network):
+    def __init__(self, network, rng=None, executor=None):
         """
         Initializes Alanezi class.
         :param network: network type (e.g., BLE)
+        :param rng: Protocol-level numpy Generator (unused, the protocol draws no protocol-level random numbers).
+        :param executor: ExecutionBackend (unused, the costs of all users are computed in one batch).
         """
         self.network = network
-        self.config = get_config()['Alanezi']  # load alanezi config
-        self.user_pp_size = self.config['user_pp_size']
-        self.owner_pp_size = self.config['owner_pp_size']
-        self.gamma_ranges = {}
-        self.pragmatist_thresholds = {}
+        self.config = get_settings().alanezi  # load alanezi config
+        self.user_pp_size = self.config.user_pp_size
+        self.owner_pp_size = self.config.owner_pp_size
+        self.gamma_ranges = self.config.gamma_ranges
+        self.pragmatist_thresholds = self.config.pragmatist_thresholds
+        # negotiation costs per number of phases, compiled on first use and kept for the run (with the BLE contention
+        # model the users advertise, so the costs are compiled per user)
+        self.cost_templates = CostTemplates(network, per_user=True)
 
     def run(self, curr_users_list, iot_device):
         """
@@ -40,7 +43,7 @@ class Alanezi:
         #  for now we go through the list of users, offer to them the privacy policies and
         #  see if they consent and if it is after 1 phase or 2 phases
 
-        privacy_dim = self.config['privacy_dim']
+        privacy_dim = self.config.privacy_dim
         # For example, privacy_dim[2] can be imagined as:
         # Data Type(t): Extremely detailed user behavior data(e.g., clickstreams, purchase history)
         # Retention(r): 1 year
@@ -59,9 +62,6 @@ class Alanezi:
 
         logging.debug("Applicable users: %s", [u.id_ for u in applicable_users])
 
-        self.gamma_ranges = self.config['gamma_ranges']
-        self.pragmatist_thresholds = self.config['pragmatist_thresholds']
-
         # if no applicable users left we return
         if applicable_users:
             temp_list = []
@@ -75,7 +75,7 @@ class Alanezi:
                         # for fundamentalists, we offer PP4
                         priv_policy = privacy_dim[3]
                         # as per work gamma is a value in range (0.843,1]
-                        gamma = random.uniform(*self.gamma_ranges['fundamentalist'])
+                        gamma = u.rng.uniform(*self.gamma_ranges.fundamentalist)
                         # combination of these values makes sure that only 20.4% of fundamentalists consent
                         util = (-gamma * reduce((lambda x, y: x * y), list(priv_policy))) + sum(list(priv_policy))
                         logging.debug("User %d privacy label %d (fundamentalist) and utility %f",
@@ -89,17 +89,17 @@ class Alanezi:
                         # we first offer PP3
                         # priv_policy = privacy_dim[2]
                         # as per work gamma is a value in range (0.25, 0.75]
-                        probability = random.uniform(*self.gamma_ranges['pragmatist'])
+                        probability = u.rng.uniform(*self.gamma_ranges.pragmatist)
                         logging.debug("User %d privacy label %d (pragmatist) and gamma %d",
                                       u.id_, u.privacy_label, probability)
                         # if gamma is too large we will not consent
                         # otherwise at least 1 round
-                        if probability <= self.pragmatist_thresholds['one_phase']:
+                        if probability <= self.pragmatist_thresholds.one_phase:
                             # single phase consent
                             logging.debug("will consent in 1 round")
                             u.update_consent(1)
                             temp_list.append(u)
-                        elif probability <= self.pragmatist_thresholds['two_phase']:
+                        elif probability <= self.pragmatist_thresholds.two_phase:
                             # two phase consent
                             logging.debug("will consent in 2 rounds")
                             u.update_consent(2)
@@ -122,440 +122,107 @@ class Alanezi:
             logging.debug("Applicable users that will consent: %s", [u.id_ for u in applicable_users])
 
             if applicable_users:
-                # Create a list of dictionaries containing arguments for the function
-                user_data_list = [{"user_data": user_data, "user_pp_size": self.user_pp_size,
-                                   "owner_pp_size": self.owner_pp_size,
-                                   "applicable_users": applicable_users,
-                                   "iot_device": iot_device}
-                                  for user_data in enumerate(applicable_users)]
+                # Charge the cohort from the cost templates of the negotiation plans (1 or 2 phases)
+                tasks = [NegotiationTask(index, u.id_, u.consent) for index, u in enumerate(applicable_users)]
+                outcomes = self.cost_templates.outcomes(tasks, self.compile_outcomes)
 
-                # Use multithreading to parallelize the for loop
-                # Couldn't use the ProcessPoolExecutor as it clones the objects and does not return the results
-                # Can still be easily replaced if necessary
-                # Reference:
-                # https://stackoverflow.com/questions/41164606/altering-different-python-objects-in-parallel-processes-respectively
-                with ThreadPoolExecutor() as executor:
-                    # Map the function over the user data list
-                    list(executor.map(self.consumption_for_user, user_data_list))
-                    executor.shutdown(wait=True, cancel_futures=False)
+                for u, outcome in zip(applicable_users, outcomes):
+                    self.consumption_for_user(u, iot_device, outcome.user_power, outcome.user_time,
+                                              outcome.owner_power, outcome.owner_time)
 
-    # Define a function to calculate power consumption and duration with a single user
-    def consumption_for_user(self, args):
+    def compile_outcomes(self, tasks):
         """
-        Used to parallelize the consumption calculations since BLE library takes a while to compute.
-        :param args: Arguments used to run the functions. Includes: user_data, user_pp_size, owner_pp_size,
-        user_consent_obj, user_consent, applicable_users, iot_device.
-        :return: Returns total device power and time consumption, as well as the updated user lists.
+        Computes the negotiation costs of users with one batch cost evaluation per negotiation plan (1 or 2 phases).
+        :param tasks: NegotiationTask objects.
+        :return: NegotiationOutcome objects, in task order.
         """
-
-        index, u = args["user_data"]
-        user_pp_size = args["user_pp_size"]
-        owner_pp_size = args["owner_pp_size"]
-        iot_device = args["iot_device"]
-
-        if u.consent == 0:
-            (logging.error
-             ("Something went wrong in Alanezi. There is a user that has not consented but we try to process them."))
-            exit(-1)
-
-        # check if the current user is going to negotiate:
-        if u.consent > 0:
-            if self.network.network_type == "ble":
-                # Calculate the power consumption and duration for BLE
-                self.ble_negotiation(user_pp_size, owner_pp_size, u, iot_device)
-            elif self.network.network_type == "zigbee":
-                # Calculate the power consumption and duration for Zigbee
-                self.zigbee_negotiation(user_pp_size, owner_pp_size, u, iot_device)
-            elif self.network.network_type == "lora":
-                # Calculate the power consumption and duration for LoRa
-                self.lora_negotiation(user_pp_size, owner_pp_size, u, iot_device)
-            else:
-                # raise error and exit
-                logging.error("Invalid network type in alanezi.py.")
-                sys.exit(1)
-
-            # Calculate user and owner utility
-            u.add_to_utility(calc_utility(calc_time_remaining(u), u.power_consumed,
-                                          u.weights))
-            # Use the user remaining time to calculate the IoT device utility,
-            # since the user is moving away (not the device)
-            iot_device.add_to_utility(calc_utility(calc_time_remaining(u),
-                                                   iot_device.power_consumed, iot_device.weights))
-            if iot_device.utility == float("inf"):
-                # raise error and exit
-                logging.error("Got infinite utility for IoT device in alanezi.py.")
-                sys.exit(-1)
-
-    def ble_negotiation(self, user_pp_size, owner_pp_size, u, iot_device):
+        outcomes = {}
+        for consent in (1, 2):
+            cohort = [task for task in tasks if task.consent == consent]
+            if cohort:
+                phase_plan, payload_bytes, roles = self.negotiation_plan(consent, self.user_pp_size, self.owner_pp_size)
+                cohort_costs = self.network.costs(phase_plan, payload_bytes, roles, cohort)
+                for task, *rows in zip(cohort, *(cost.tolist() for cost in cohort_costs)):
+                    outcomes[task.index] = NegotiationOutcome(task.index, task.id_, task.consent, *rows)
+        return [outcomes[task.index] for task in tasks]
+
+    def negotiation_plan(self, consent, user_pp_size, owner_pp_size):
         """
-        BLE-based Alanezi negotiation implementation.
+        Alanezi negotiation flow on the current network type as a phase plan (see Network.costs()).
+        :param consent: Number of negotiation phases (1 or 2).
         :param user_pp_size: User privacy policy size in bytes.
-        :param owner_pp_size: User privacy policy size in bytes.
-        :param u: Current user under negotiation.
-        :param iot_device: IoT device object.
-        :return: Power and time consumption of user and iot device.
+        :param owner_pp_size: Owner privacy policy size in bytes.
+        :return: Phase plan, payload bytes and roles (sending side) of every phase.
         """
-
-        # Alanezi's proposed negotiation follows the following flow:
-        # BLE broadcast with data request information (user is advertising and IoT owner is scanning, user PP is sent)
-        # -> connection establishment -> IoT owner accepts/negotiation -> …done?
-
-        # Consequently, no matter the number of phases the advertising, scanning and connection establishment with
-        # at least 1 connection packet always occurs
-        # We use the values directly provided by Kindt et al.
-
-        # has to be local not to double count
-        iot_device_power_consumed = 0
-        iot_device_time_consumed = 0
-
-        # get the duration of all constant parts of a connection event. (Preprocessing, Postprocessing,...)
-        dc = self.network.network_impl.connected.ble_e_model_c_get_duration_constant_parts()
-
-        # now do the same with the charge of these phases
-        charge_c = self.network.network_impl.connected.ble_e_model_c_get_charge_constant_parts()
-
-        # charge_c is in [C], so we should divide by dc to get the current
-        current_c = charge_c / dc
-
-        u.add_to_time_spent(dc)
-        iot_device_time_consumed += dc
-        u.add_to_power_consumed(current_c)
-        iot_device_power_consumed += current_c
-
-        # Calculate the latency and energy consumption of device discovery. The values are taken from:
-        # https://www.researchgate.net/publication/335808941_Connection-less_BLE_Performance_Evaluation_on_Smartphones
-        # the discovery includes PP exchange as the first round
-        if u.consent == 1:
-            result = (self.network.network_impl.discovery.ble_model_discovery_get_result_alanezi
-                      (100, 0.9999, 0.25, 5, 2, 0.01, 1000, user_pp_size))
-        else:
-            result = (self.network.network_impl.discovery.ble_model_discovery_get_result
-                      (100, 0.9999, 0.25, 5, 2, 0.01, 1000))
-
-        u.add_to_time_spent(result.discoveryLatency)
-        iot_device_time_consumed += result.discoveryLatency
-        # charge_c is in [C], so we should divide by dc to get the current
-        current_c = result.chargeAdv / result.discoveryLatency
-        u.add_to_power_consumed(current_c)
-        iot_device_power_consumed += current_c
-
-        connection_established = False
-
-        # if owner accepts in 1-phase then owner starts sending/collecting the data, and we are done
-        # exchanged during device discovery phase
-        # if negotiation is 2 phases
-        if u.consent == 2:
-
-            if not connection_established:
-                # at the end of discovery the device go through connection establishment
-                # as per documentation there is no duration, since it is accounted in the discovery
-                # For user we set periodic scan type
-
-                duration = \
-                    (
-                        self.network.network_impl.connection_establishment.ble_e_model_ce_get_duration_for_connection_procedure
-                        (1, 0, 1,
-                         0,
-                         0.1))
-                u.add_to_time_spent(duration)
-
-                u.add_to_power_consumed(
-                    self.network.network_impl.connection_establishment.ble_e_model_ce_get_charge_for_connection_procedure
-                    (1, 0, 1,
-                     0,
-                     0.1) / duration)
-
-                duration = \
-                    (
-                        self.network.network_impl.connection_establishment.ble_e_model_ce_get_duration_for_connection_procedure
-                        (1, 0, 0,
-                         0,
-                         0.1))
-                iot_device_time_consumed += duration
-                iot_device_power_consumed += (
-                        self.network.network_impl.connection_establishment.ble_e_model_ce_get_charge_for_connection_procedure
-                        (1, 0, 0,
-                         0,
-                         0.1) / duration)
-
-                # TODO: Think about this?
-                connection_established = True
-
-            # in 2 phase negotiation we start exactly the same way as in 1 phase
-            # however now the owner responds with an alternative proposal and waits for the user to reply
-            # so two more steps are added
-
-            duration = self.network.network_impl.connected.ble_e_model_c_get_duration_sequences(1, 0.1, 1,
-                                                                                                [user_pp_size],
-                                                                                                [0], 3)
-
-            iot_device_time_consumed += duration
-
-            power_spent = self.network.network_impl.connected.ble_e_model_c_get_charge_sequences(1, 0.1, 1,
-                                                                                                 [user_pp_size],
-                                                                                                 [0], 3)
-            iot_device_power_consumed += (power_spent / duration)
-            duration = self.network.network_impl.connected.ble_e_model_c_get_duration_sequences(1, 0.1, 1,
-                                                                                                [0],
-                                                                                                [user_pp_size], 3)
-            power_spent = self.network.network_impl.connected.ble_e_model_c_get_charge_sequences(1, 0.1, 1,
-                                                                                                 [0],
-                                                                                                 [user_pp_size], 3)
-            u.add_to_power_consumed(power_spent / duration)
-            u.add_to_time_spent(duration)
-
-            # Note that we assume that there is no delay between connection establishment and sending first packet
-            # after connection establishment the owner sends the proposal and the user receives it
-            # We assume that the user reply is the received PP
-            # we call from master point of view because it has Tx first and then Rx which better simulates the behaviour
-            duration = self.network.network_impl.connected.ble_e_model_c_get_duration_sequences(1, 0.1, 1,
-                                                                                                [0],
-                                                                                                [owner_pp_size], 3)
-
-            iot_device_time_consumed += duration
-
-            power_spent = self.network.network_impl.connected.ble_e_model_c_get_charge_sequences(1, 0.1, 1,
-                                                                                                 [0],
-                                                                                                 [owner_pp_size], 3)
-            iot_device_power_consumed += (power_spent / duration)
-            duration = self.network.network_impl.connected.ble_e_model_c_get_duration_sequences(1, 0.1, 1,
-                                                                                                [owner_pp_size],
-                                                                                                [0], 3)
-            power_spent = self.network.network_impl.connected.ble_e_model_c_get_charge_sequences(1, 0.1, 1,
-                                                                                                 [owner_pp_size],
-                                                                                                 [0], 3)
-            u.add_to_power_consumed(power_spent / duration)
-            u.add_to_time_spent(duration)
-
-            # Acceptance
-            duration = self.network.network_impl.connected.ble_e_model_c_get_duration_sequences(1, 0.1, 1,
-                                                                                                [0],
-                                                                                                [owner_pp_size], 3)
-            u.add_to_time_spent(duration)
-
-            power_spent = self.network.network_impl.connected.ble_e_model_c_get_charge_sequences(1, 0.1, 1,
-                                                                                                 [0],
-                                                                                                 [owner_pp_size], 3)
-            u.add_to_power_consumed(power_spent / duration)
-            duration = self.network.network_impl.connected.ble_e_model_c_get_duration_sequences(1, 0.1, 1,
-                                                                                                [owner_pp_size],
-                                                                                                [0], 3)
-            power_spent = self.network.network_impl.connected.ble_e_model_c_get_charge_sequences(1, 0.1, 1,
-                                                                                                 [owner_pp_size],
-                                                                                                 [0], 3)
-            iot_device_power_consumed += (power_spent / duration)
-            iot_device_time_consumed += duration
-
-        # convert from As to Ws
-        u.power_consumed = u.power_consumed * self.network.network_impl.voltage
-        iot_device.add_to_power_consumed(iot_device_power_consumed * self.network.network_impl.voltage)
-        iot_device.add_to_time_spent(iot_device_time_consumed)
-
-    def zigbee_negotiation(self, user_pp_size, owner_pp_size, u, iot_device):
-        """
-        ZigBee-based Alanezi negotiation implementation.
-        :param user_pp_size: User privacy policy size in bytes.
-        :param owner_pp_size: User privacy policy size in bytes.
-        :param u: Current user under negotiation.
-        :param iot_device: IoT device object.
-        :return: Power and time consumption of user and iot device.
-        """
-
         # Alanezi's proposed negotiation follows the following flow:
         # broadcast with data request information (user is advertising and IoT owner is scanning, user PP is sent)
         # -> connection establishment -> IoT owner accepts/negotiation -> …done?
-
-        # We adjust the negotiation flow to fit Zigbee as follows:
-        # ZigBee Mote (user) starts up ->
-        # -> Mote associates with the Coordinator (IoT device) -> Mote sends data request information to Coordinator
-        # -> Coordinator accepts/negotiation -> ...done?
-
-        # has to be local not to double count
-        iot_device_power_consumed = 0
-        iot_device_time_consumed = 0
-
-        # print(f"User %s power consumption at the start of negotiation: %s" % (u.id_, u.power_consumed))
-
-        # get the duration and power consumption of startup for the device (Ws, s)
-        charge_c, dc = self.network.network_impl.startup()
-
-        u.add_to_time_spent(dc)
-        iot_device_time_consumed += dc
-        u.add_to_power_consumed(charge_c)
-        iot_device_power_consumed += charge_c
-
-        # Association duration and power consumption (Ws, s)
-
-        charge_a, da = self.network.network_impl.association()
-
-        u.add_to_time_spent(da)
-        iot_device_time_consumed += da
-        u.add_to_power_consumed(charge_a)
-        iot_device_power_consumed += charge_a
-
-        # at the end of association the mote sends its request to the coordinator
-        charge_tx, d_tx = self.network.network_impl.send(user_pp_size)
-        charge_rx, d_rx = self.network.network_impl.receive(user_pp_size)
-
-        u.add_to_time_spent(d_tx)
-        iot_device_time_consumed += d_rx
-        u.add_to_power_consumed(charge_tx)
-        iot_device_power_consumed += charge_rx
-
-        # the owner also needs to send an ACK to the mote
-        # as per: https://github.com/Koenkk/zigbee2mqtt/issues/1455
-        # ACK size is 65 bytes
-
-        charge_tx, d_tx = self.network.network_impl.send(self.network.network_impl.ack_size)
-        charge_rx, d_rx = self.network.network_impl.receive(self.network.network_impl.ack_size)
-
-        u.add_to_time_spent(d_rx)
-        iot_device_time_consumed += d_tx
-        u.add_to_power_consumed(charge_rx)
-        iot_device_power_consumed += charge_tx
-
-        # if owner accepts in 1-phase then owner starts sending/collecting the data, and we are done
-        # the PP exchange occurred during device discovery
-
-        # if negotiation is 2 phases
-        if u.consent == 2:
-            # in 2 phase negotiation we start exactly the same way as in 1 phase
-            # however now the owner responds with an alternative proposal and waits for the user to reply
-            # so two more steps are added
-
-            # Note that we assume that there is no delay between association and sending first packet
-            # after connection establishment the owner sends the proposal and the user receives it
-            # We assume that the user reply is the received PP
-            charge_tx, d_tx = self.network.network_impl.send(owner_pp_size)
-            charge_rx, d_rx = self.network.network_impl.receive(owner_pp_size)
-
-            u.add_to_time_spent(d_rx)
-            iot_device_time_consumed += d_tx
-            u.add_to_power_consumed(charge_rx)
-            iot_device_power_consumed += charge_tx
-
-            # Send ACK
-            charge_tx, d_tx = self.network.network_impl.send(self.network.network_impl.ack_size)
-            charge_rx, d_rx = self.network.network_impl.receive(self.network.network_impl.ack_size)
-
-            u.add_to_time_spent(d_tx)
-            iot_device_time_consumed += d_rx
-            u.add_to_power_consumed(charge_tx)
-            iot_device_power_consumed += charge_rx
-
-            # mote accepts PP
-            charge_tx, d_tx = self.network.network_impl.send(owner_pp_size)
-            charge_rx, d_rx = self.network.network_impl.receive(owner_pp_size)
-
-            u.add_to_time_spent(d_tx)
-            iot_device_time_consumed += d_rx
-            u.add_to_power_consumed(charge_tx)
-            iot_device_power_consumed += charge_rx
-
-            # ACK
-            charge_tx, d_tx = self.network.network_impl.send(self.network.network_impl.ack_size)
-            charge_rx, d_rx = self.network.network_impl.receive(self.network.network_impl.ack_size)
-
-            u.add_to_time_spent(d_rx)
-            iot_device_time_consumed += d_tx
-            u.add_to_power_consumed(charge_rx)
-            iot_device_power_consumed += charge_tx
-
+        # In 2 phase negotiation we start exactly the same way as in 1 phase, however now the owner responds with an
+        # alternative proposal and waits for the user to reply (we assume that the user reply is the received PP).
+        if self.network.network_type == "ble":
+            # The values are taken from Kindt et al. and from:
+            # https://www.researchgate.net/publication/335808941_Connection-less_BLE_Performance_Evaluation_on_Smartphones
+            # The discovery includes the PP exchange as the first round, if the owner accepts in 1 phase we are done
+            steps = [("connection_event", 0, "user"), ("discovery", user_pp_size if consent == 1 else 0, "user")]
+            if consent == 2:
+                # connection establishment, the owner's proposal and the user's acceptance
+                steps += [("connection", 0, "user"), ("message", user_pp_size, "user"),
+                          ("message", owner_pp_size, "owner"), ("message", owner_pp_size, "user")]
+        elif self.network.network_type == "zigbee":
+            # ZigBee Mote (user) starts up -> Mote associates with the Coordinator (IoT device)
+            # -> Mote sends data request information to Coordinator -> Coordinator accepts/negotiation -> ...done?
+            # Every message is acknowledged (ACK size as per: https://github.com/Koenkk/zigbee2mqtt/issues/1455)
+            steps = [("startup", 0, "user"), ("association", 0, "user"), ("message", user_pp_size, "user"),
+                     ("ack", 0, "owner")]
+            if consent == 2:
+                # the owner's proposal and the mote's acceptance
+                steps += [("message", owner_pp_size, "owner"), ("ack", 0, "user"), ("message", owner_pp_size, "user"),
+                          ("ack", 0, "owner")]
+            else:
+                # the Coordinator sends its consent to the mote
+                steps += [("message", owner_pp_size, "owner"), ("ack", 0, "user")]
+        elif self.network.network_type == "lora":
+            # Class A LoRa node sends data request information to the Gateway -> Gateway accepts/negotiation -> ...done?
+            steps = [("message", user_pp_size, "user")]
+            if consent == 2:
+                # Gateway (owner) sends alternative offer, LoRa device (user) sends back the same PP it received
+                steps += [("message", owner_pp_size, "owner"), ("message", owner_pp_size, "user")]
+            else:
+                # if owner accepts in 1-phase then owner replies with the same PP
+                steps += [("message", user_pp_size, "owner")]
         else:
-            # the Coordinator sends its consent to the mote
-
-            charge_tx, d_tx = self.network.network_impl.send(owner_pp_size)
-            charge_rx, d_rx = self.network.network_impl.receive(owner_pp_size)
-
-            u.add_to_time_spent(d_rx)
-            iot_device_time_consumed += d_tx
-            u.add_to_power_consumed(charge_rx)
-            iot_device_power_consumed += charge_tx
+            # raise error and exit
+            logging.error("Invalid network type in alanezi.py.")
+            sys.exit(1)
 
-            # Send ACK
-            charge_tx, d_tx = self.network.network_impl.send(self.network.network_impl.ack_size)
-            charge_rx, d_rx = self.network.network_impl.receive(self.network.network_impl.ack_size)
+        phase_plan, payload_bytes, roles = zip(*steps)
+        return phase_plan, payload_bytes, roles
 
-            u.add_to_time_spent(d_tx)
-            iot_device_time_consumed += d_rx
-            u.add_to_power_consumed(charge_tx)
-            iot_device_power_consumed += charge_rx
-
-        iot_device.add_to_time_spent(iot_device_time_consumed)
-        iot_device.add_to_power_consumed(iot_device_power_consumed)
-
-        # print(f"User %s power consumption at the end of negotiation: %s" % (u.id_, u.power_consumed))
-
-    def lora_negotiation(self, user_pp_size, owner_pp_size, u, iot_device):
+    def consumption_for_user(self, u, iot_device, user_power, user_time, owner_power, owner_time):
         """
-        LoRa-based Alanezi negotiation implementation.
-        :param user_pp_size: User privacy policy size in bytes.
-        :param owner_pp_size: User privacy policy size in bytes.
+        Charge the negotiation costs to a user and the IoT device and update their utilities.
         :param u: Current user under negotiation.
         :param iot_device: IoT device object.
-        :return: Power and time consumption of user and iot device.
+        :param user_power: User power consumption of every phase of the negotiation plan.
+        :param user_time: User time consumption of every phase.
+        :param owner_power: IoT device power consumption of every phase.
+        :param owner_time: IoT device time consumption of every phase.
         """
+        if u.consent == 0:
+            (logging.error
+             ("Something went wrong in Alanezi. There is a user that has not consented but we try to process them."))
+            exit(-1)
 
-        # Alanezi's proposed negotiation follows the following flow:
-        # broadcast with data request information (user is advertising and IoT owner is scanning, user PP is sent)
-        # -> connection establishment -> IoT owner accepts/negotiation -> …done?
-
-        # We adjust the negotiation flow to fit Lora as follows:
-        # Class A LoRa node sends data request information to the Gateway
-        # -> Gateway accepts/negotiation -> ...done?
-
-        # has to be local not to double count
-        iot_device_power_consumed = 0
-        iot_device_time_consumed = 0
-
-        # LoRa device (user) sends its request to the Gateway (owner)
-        power_tx, d_tx = self.network.network_impl.send(user_pp_size)
-
-        # Gateway reception
-        power_rx, d_rx = self.network.network_impl.receive(user_pp_size)
-
-        u.add_to_time_spent(d_tx)
-        iot_device_time_consumed += d_rx
-        u.add_to_power_consumed(power_tx)
-        iot_device_power_consumed += power_rx
-
-        # if negotiation is 2 phases
-        if u.consent == 2:
-            # in 2 phase negotiation we start exactly the same way as in 1 phase
-            # however now the owner responds with an alternative proposal and waits for the user to reply
-            # so two more steps are added
-
-            # Gateway (owner) sends alternative offer
-            power_tx, d_tx = self.network.network_impl.send(owner_pp_size)
-
-            # print("IoT device power consumed: ", power_tx)
-
-            # LoRa node reception
-            power_rx, d_rx = self.network.network_impl.receive(owner_pp_size)
-
-            u.add_to_time_spent(d_rx)
-            iot_device_time_consumed += d_tx
-            u.add_to_power_consumed(power_rx)
-            iot_device_power_consumed += power_tx
-
-            # Acceptance
-            # LoRa device (user) sends back the same PP it received
-            power_tx, d_tx = self.network.network_impl.send(owner_pp_size)
-
-            # Gateway reception
-            power_rx, d_rx = self.network.network_impl.receive(owner_pp_size)
-
-            u.add_to_time_spent(d_tx)
-            iot_device_time_consumed += d_rx
-            u.add_to_power_consumed(power_tx)
-            iot_device_power_consumed += power_rx
-        else:
-            # if owner accepts in 1-phase then owner replies with the same PP
-            # and starts sending/collecting the data and we are done
-            u.add_to_time_spent(d_rx)
-            iot_device_time_consumed += d_tx
-            u.add_to_power_consumed(power_rx)
-            iot_device_power_consumed += power_tx
-
-        iot_device.add_to_power_consumed(iot_device_power_consumed)
-        iot_device.add_to_time_spent(iot_device_time_consumed)
+        self.network.charge(u, iot_device, user_power, user_time, owner_power, owner_time)
+
+        # Calculate user and owner utility
+        u.add_to_utility(calc_utility(calc_time_remaining(u), u.power_consumed,
+                                      u.weights))
+        # Use the user remaining time to calculate the IoT device utility,
+        # since the user is moving away (not the device)
+        iot_device.add_to_utility(calc_utility(calc_time_remaining(u),
+                                               iot_device.power_consumed, iot_device.weights))
+        if iot_device.utility == float("inf"):
+            # raise error and exit
+            logging.error("Got infinite utility for IoT device in alanezi.py.")
+            sys.exit(-1)
@@ -1,11 +1,11 @@
 import logging
-import random
 import sys
 
 import numpy as np
-from util import get_config
+from util import get_settings
 
 from util import check_distance, calc_time_remaining, calc_utility
+from negotiation_protocols.outcome import NegotiationTask, NegotiationOutcome, CostTemplates
 
 
 class Concession:
@@ -13,19 +13,24 @@ class Concession:
     Implements Concession negotiation protocol. Includes BLE, ZigBee and LoRa based negotiations.
     """
 
-    def __init__(self, network):
+    def __init__(self, network, rng=None, executor=None):
         """
         Initializes Concession class. Includes BLE, ZigBee and LoRa based negotiations.
         Also includes user_utility dictionary of user's utility where user's id is the key
         :param network: network type (e.g., BLE)
+        :param rng: Protocol-level numpy Generator (unused, the protocol draws no protocol-level random numbers).
+        :param executor: ExecutionBackend (unused, the costs of all users are computed in one batch).
         """
         self.network = network
         self.user_utility = {}
-        self.config = get_config()['Concession']  # load concession config
-        self.user_pp_size = self.config['user_pp_size']
-        self.owner_pp_size = self.config['owner_pp_size']
-        self.consent_probabilities = {}
-        self.negotiation_steps = 0
+        self.config = get_settings().concession  # load concession config
+        self.user_pp_size = self.config.user_pp_size
+        self.owner_pp_size = self.config.owner_pp_size
+        self.consent_probabilities = self.config.consent_probabilities
+        self.negotiation_steps = self.config.negotiation_steps
+        # negotiation costs of a consenting user, compiled on first use and kept for the run (the owner advertises, so
+        # they do not depend on the user)
+        self.cost_templates = CostTemplates(network)
 
     def run(self, curr_users_list, iot_device):
         """
@@ -46,8 +51,7 @@ class Concession:
             if check_distance(u.curr_loc, distance) and not u.consent:
                 applicable_users.append(u)
 
-        self.consent_probabilities = self.config['consent_probabilities']
-        self.negotiation_steps = self.config['negotiation_steps']
+        phase_plan, payload_bytes, roles = self.negotiation_plan(self.owner_pp_size)
 
         for step in range(self.negotiation_steps):
             # check if there are still unconcented users and if not, exit negotiation
@@ -74,10 +78,10 @@ class Concession:
             # Check the highest utility user's privacy label
             if highest_utility_user.privacy_label == 1:
                 # for fundamentalists, similar to Alanezi, we assume only 20.4% consent
-                if random.random() <= self.consent_probabilities['fundamentalist']:
+                if highest_utility_user.rng.random() <= self.consent_probabilities.fundamentalist:
                     highest_utility_user.update_consent(1)
             elif highest_utility_user.privacy_label == 2:
-                if random.random() <= self.consent_probabilities['pragmatist']:
+                if highest_utility_user.rng.random() <= self.consent_probabilities.pragmatist:
                     # for pragmatists, similar to Alanezi, we assume only 73.55% accept
                     highest_utility_user.update_consent(1)
             # the unconcerned are assumed to always consent
@@ -85,19 +89,12 @@ class Concession:
                 highest_utility_user.update_consent(1)
 
             if highest_utility_user.consent:
-                if self.network.network_type == "ble":
-                    # Calculate the power consumption and duration for BLE
-                    self.ble_negotiation(self.owner_pp_size, highest_utility_user, iot_device)
-                elif self.network.network_type == "zigbee":
-                    # Calculate the power consumption and duration for zigbee
-                    self.zigbee_negotiation(self.owner_pp_size, highest_utility_user, iot_device)
-                elif self.network.network_type == "lora":
-                    # Calculate the power consumption and duration for zigbee
-                    self.lora_negotiation(self.owner_pp_size, highest_utility_user, iot_device)
-                else:
-                    # raise error and exit
-                    logging.info("Invalid network type in concession.py.")
-                    sys.exit(1)
+                # Calculate the power consumption and duration on the current network
+                outcome, = self.cost_templates.outcomes(
+                    [NegotiationTask(0, highest_utility_user.id_, highest_utility_user.consent)],
+                    lambda missing: self.compile_outcomes(missing, phase_plan, payload_bytes, roles))
+                self.network.charge(highest_utility_user, iot_device, outcome.user_power, outcome.user_time,
+                                    outcome.owner_power, outcome.owner_time)
 
                 # Calculate user and owner utility
                 highest_utility_user.add_to_utility(calc_utility(calc_time_remaining(highest_utility_user),
@@ -112,6 +109,19 @@ class Concession:
                     logging.error("Got infinite utility for IoT device in cunche.py.")
                     sys.exit(-1)
 
+    def compile_outcomes(self, tasks, phase_plan, payload_bytes, roles):
+        """
+        Computes the negotiation costs of users with one batch cost evaluation.
+        :param tasks: NegotiationTask objects.
+        :param phase_plan: Phase plan (see negotiation_plan()).
+        :param payload_bytes: Payload bytes of every phase.
+        :param roles: Sending side of every phase.
+        :return: NegotiationOutcome objects, in task order.
+        """
+        costs = self.network.costs(phase_plan, payload_bytes, roles, tasks)
+        return [NegotiationOutcome(task.index, task.id_, task.consent, *rows)
+                for task, *rows in zip(tasks, *(cost.tolist() for cost in costs))]
+
     def calc_assumed_utility(self, user):
         """
         Calculate user's utility given how much longer the user stays in the environment
@@ -130,164 +140,30 @@ class Concession:
         # Add user's utility to dictionary
         self.user_utility[user_id] = utility
 
-    def ble_negotiation(self, owner_pp_size, u, iot_device):
+    def negotiation_plan(self, owner_pp_size):
         """
-        BLE-based Concession negotiation implementation.
-        :param owner_pp_size: User privacy policy size in bytes.
-        :param u: Current user under negotiation.
-        :param iot_device: IoT Device.
-        :return: Power and time consumption of user and iot device.
+        Concession negotiation flow of a consenting user (1 phase) on the current network type as a phase plan (see
+        Network.costs()).
+        :param owner_pp_size: Owner privacy policy size in bytes.
+        :return: Phase plan, payload bytes and roles (sending side) of every phase.
         """
-
-        # has to be local not to double count
-        iot_device_power_consumed = 0
-        iot_device_time_consumed = 0
-
-        # if 0 phases (won't consent) we don't do anything
-        # if 1 phase
-        if u.consent:
-            # get the duration of all constant parts of a connection event. (Preprocessing, Postprocessing,...)
-            dc = self.network.network_impl.connected.ble_e_model_c_get_duration_constant_parts()
-
-            # now do the same with the charge of these phases
-            charge_c = self.network.network_impl.connected.ble_e_model_c_get_charge_constant_parts()
-
-            # charge_c is in [C], so we should divide by dc to get the current
-            current_c = charge_c / dc
-
-            u.add_to_time_spent(dc)
-            iot_device_time_consumed += dc
-            u.add_to_power_consumed(current_c)
-            iot_device_power_consumed += current_c
-
-            # Calculate the latency and energy consumption of device discovery. The values are taken from:
+        if self.network.network_type == "ble":
+            # the discovery includes PP exchange as the first round (similar to alanezi), the owner advertises. The
+            # values are taken from:
             # https://www.researchgate.net/publication/335808941_Connection-less_BLE_Performance_Evaluation_on_Smartphones
-            # the discovery includes PP exchange as the first round (similar to alanezi)
-            result = (self.network.network_impl.discovery.ble_model_discovery_get_result_alanezi
-                      (100, 0.9999, 0.25, 5, 2, 0.01, 1000, owner_pp_size))
-
-            u.add_to_time_spent(result.discoveryLatency)
-            iot_device_time_consumed += result.discoveryLatency
-            # charge_c is in [C], so we should divide by dc to get the current
-            current_c = result.chargeAdv / result.discoveryLatency
-            u.add_to_power_consumed(current_c)
-            iot_device_power_consumed += current_c
-
-        # convert from As to Ws
-        u.power_consumed = u.power_consumed * self.network.network_impl.voltage
-        iot_device.add_to_power_consumed(iot_device_power_consumed * self.network.network_impl.voltage)
-        iot_device.add_to_time_spent(iot_device_time_consumed)
-
-    def zigbee_negotiation(self, owner_pp_size, u, iot_device):
-        """
-        ZigBee-based Concession negotiation implementation.
-        :param owner_pp_size: User privacy policy size in bytes.
-        :param u: Current user under negotiation.
-        :param iot_device: IoT device.
-        :return: Power and time consumption of user and iot device.
-        """
-
-        # has to be local not to double count
-        iot_device_power_consumed = 0
-        iot_device_time_consumed = 0
-
-        # if 0 phases (won't consent) we don't do anything
-        # if 1 phase
-        if u.consent:
-            # get the duration and power consumption of startup for the device (Ws, s)
-            charge_c, dc = self.network.network_impl.startup()
-
-            u.add_to_time_spent(dc)
-            iot_device_time_consumed += dc
-            u.add_to_power_consumed(charge_c)
-            iot_device_power_consumed += charge_c
-
-            # Association duration and power consumption (Ws, s)
-
-            charge_a, da = self.network.network_impl.association()
-
-            u.add_to_time_spent(da)
-            iot_device_time_consumed += da
-            u.add_to_power_consumed(charge_a)
-            iot_device_power_consumed += charge_a
-
-            # at the end of association the Coordinator sends its PP to the mote
-
-            charge_tx, d_tx = self.network.network_impl.send(owner_pp_size)
-            charge_rx, d_rx = self.network.network_impl.receive(owner_pp_size)
-
-            u.add_to_time_spent(d_rx)
-            iot_device_time_consumed += d_tx
-            u.add_to_power_consumed(charge_rx)
-            iot_device_power_consumed += charge_tx
-
-            # Send ACK
-            charge_tx, d_tx = self.network.network_impl.send(self.network.network_impl.ack_size)
-            charge_rx, d_rx = self.network.network_impl.receive(self.network.network_impl.ack_size)
-
-            u.add_to_time_spent(d_tx)
-            iot_device_time_consumed += d_rx
-            u.add_to_power_consumed(charge_tx)
-            iot_device_power_consumed += charge_rx
-
-            # the mote sends its consent to the Coordinator
-
-            charge_tx, d_tx = self.network.network_impl.send(owner_pp_size)
-            charge_rx, d_rx = self.network.network_impl.receive(owner_pp_size)
-
-            u.add_to_time_spent(d_tx)
-            iot_device_time_consumed += d_rx
-            u.add_to_power_consumed(charge_tx)
-            iot_device_power_consumed += charge_rx
-
-            # Send ACK
-            charge_tx, d_tx = self.network.network_impl.send(self.network.network_impl.ack_size)
-            charge_rx, d_rx = self.network.network_impl.receive(self.network.network_impl.ack_size)
-
-            u.add_to_time_spent(d_rx)
-            iot_device_time_consumed += d_tx
-            u.add_to_power_consumed(charge_rx)
-            iot_device_power_consumed += charge_tx
-
-        iot_device.add_to_time_spent(iot_device_time_consumed)
-        iot_device.add_to_power_consumed(iot_device_power_consumed)
-
-    def lora_negotiation(self, owner_pp_size, u, iot_device):
-        """
-        LoRa-based Concession negotiation implementation.
-        :param owner_pp_size: User privacy policy size in bytes.
-        :param u: Current user under negotiation.
-        :param iot_device: IoT device.
-        :return: Power and time consumption of user and iot device.
-        """
-
-        # has to be local not to double count
-        iot_device_power_consumed = 0
-        iot_device_time_consumed = 0
-
-        # if 0 phases (won't consent) we don't do anything
-        # if 1 phase
-        if u.consent:
-            # IoT device (owner) sends PP to the LoRa node (user)
-
-            power_tx, d_tx = self.network.network_impl.send(owner_pp_size)
-            power_rx, d_rx = self.network.network_impl.receive(owner_pp_size)
-
-            u.add_to_time_spent(d_rx)
-            iot_device_time_consumed += d_tx
-            u.add_to_power_consumed(power_rx)
-            iot_device_power_consumed += power_tx
-
-            # print("IoT device power consumed: ", power_tx)
-
-            # the LoRa node replies with consent (same PP)
-            power_tx, d_tx = self.network.network_impl.send(owner_pp_size)
-            power_rx, d_rx = self.network.network_impl.receive(owner_pp_size)
-
-            u.add_to_time_spent(d_tx)
-            iot_device_time_consumed += d_rx
-            u.add_to_power_consumed(power_tx)
-            iot_device_power_consumed += power_rx
-
-        iot_device.add_to_power_consumed(iot_device_power_consumed)
-        iot_device.add_to_time_spent(iot_device_time_consumed)
+            steps = [("connection_event", 0, "owner"), ("discovery", owner_pp_size, "owner")]
+        elif self.network.network_type == "zigbee":
+            # at the end of association the Coordinator sends its PP to the mote and the mote sends its consent to the
+            # Coordinator, every message is acknowledged
+            steps = [("startup", 0, "user"), ("association", 0, "user"), ("message", owner_pp_size, "owner"),
+                     ("ack", 0, "user"), ("message", owner_pp_size, "user"), ("ack", 0, "owner")]
+        elif self.network.network_type == "lora":
+            # IoT device (owner) sends PP to the LoRa node (user), the LoRa node replies with consent (same PP)
+            steps = [("message", owner_pp_size, "owner"), ("message", owner_pp_size, "user")]
+        else:
+            # raise error and exit
+            logging.info("Invalid network type in concession.py.")
+            sys.exit(1)
+
+        phase_plan, payload_bytes, roles = zip(*steps)
+        return phase_plan, payload_bytes, roles
@@ -1,10 +1,9 @@
-from concurrent.futures import ThreadPoolExecutor
-
+from executor import ExecutionBackend
+from negotiation_protocols.outcome import NegotiationTask, NegotiationOutcome, CostTemplates
 from util import check_distance, calc_utility, calc_time_remaining
-import random
 import sys
 import logging
-from util import get_config
+from util import get_settings
 
 
 class Cunche:
@@ -12,16 +11,21 @@ class Cunche:
     Implements Cunche negotiation protocol. Includes BLE, ZigBee and LoRa based negotiations.
     """
 
-    def __init__(self, network):
+    def __init__(self, network, rng=None, executor=None):
         """
         Initializes Cunche class.
         :param network: network type (e.g., BLE)
+        :param rng: Protocol-level numpy Generator (unused, the protocol draws no protocol-level random numbers).
+        :param executor: ExecutionBackend the per-user negotiations run in (inline if None).
         """
         self.network = network
-        self.config = get_config()['Cunche']  # load cunche config
-        self.user_pp_size = self.config['user_pp_size']
-        self.owner_pp_size = self.config['owner_pp_size']
-        self.consent_thresholds = {}
+        self.executor = executor if executor is not None else ExecutionBackend()
+        # negotiation costs per consent, compiled on first use and kept for the run
+        self.cost_templates = CostTemplates(network, per_user=False)
+        self.config = get_settings().cunche  # load cunche config
+        self.user_pp_size = self.config.user_pp_size
+        self.owner_pp_size = self.config.owner_pp_size
+        self.consent_thresholds = self.config.consent_thresholds
 
     def run(self, curr_users_list, iot_device):
         """
@@ -41,8 +45,6 @@ class Cunche:
                 applicable_users.append(u)
 
         # print("Applicable users: {}".format([(u.id_, u.curr_loc, distance) for u in applicable_users]))
-        self.consent_thresholds = self.config['consent_thresholds']
-
         if applicable_users:
             temp_list = []
             for u in applicable_users:
@@ -53,11 +55,11 @@ class Cunche:
                     # check the user's privacy label
                     if u.privacy_label == 1:
                         # for fundamentalists, we see if user is in 1 - 0.796 consenting
-                        rnd = random.random()
-                        if rnd > self.consent_thresholds['fundamentalist']['initial_consent_probability']:
+                        rnd = u.rng.random()
+                        if rnd > self.consent_thresholds.fundamentalist.initial_consent_probability:
                             # print("Passed random check")
                             # of these only 25% consent in first phase and 75% in second phase
-                            if random.random() <= self.consent_thresholds['fundamentalist']['first_phase_probability']:
+                            if u.rng.random() <= self.consent_thresholds.fundamentalist.first_phase_probability:
                                 u.update_consent(1)
                                 temp_list.append(u)
                             else:
@@ -69,9 +71,9 @@ class Cunche:
                     elif u.privacy_label == 2:
                         # for privacy pragmatists 26.45% do not consent
                         # of the remaining 73.55%, 75% consent in first phase and 25% in second phase
-                        rnd = random.random()
-                        if rnd <= self.consent_thresholds['pragmatist']['initial_consent_probability']:
-                            if random.random() <= self.consent_thresholds['pragmatist']['first_phase_probability']:
+                        rnd = u.rng.random()
+                        if rnd <= self.consent_thresholds.pragmatist.initial_consent_probability:
+                            if u.rng.random() <= self.consent_thresholds.pragmatist.first_phase_probability:
                                 u.update_consent(1)
                                 temp_list.append(u)
                             else:
@@ -88,149 +90,131 @@ class Cunche:
             applicable_users = temp_list
 
         if applicable_users:
-            # Create a list of dictionaries containing arguments for the function
-            user_data_list = [{"user_data": user_data, "user_pp_size": self.user_pp_size,
-                               "owner_pp_size": self.owner_pp_size,
-                               "applicable_users": applicable_users,
-                               "iot_device": iot_device}
-                              for user_data in enumerate(applicable_users)]
-
-            # Use multiprocessing to parallelize the for loop
-            with ThreadPoolExecutor() as executor:
-                # Map the function over the user data list
-                list(executor.map(self.consumption_for_user, user_data_list))
-                executor.shutdown(wait=True, cancel_futures=False)
+            tasks = [NegotiationTask(index, u.id_, u.consent) for index, u in enumerate(applicable_users)]
+
+            # The costs come from the cost templates, the missing templates are computed with the shared execution
+            # backend. The per-user negotiations only compute the costs, so they can run in worker processes (unless
+            # the network cost queries are recorded or replayed, which has to happen in this process)
+            outcomes = self.cost_templates.outcomes(
+                tasks, lambda missing: self.executor.map(self.consumption_for_user, missing,
+                                                         pure=self.network.replay is None))
+
+            # merge the outcomes in user order, so that the results do not depend on the execution mode
+            for u, outcome in zip(applicable_users, outcomes):
+                self.merge_outcome(u, iot_device, outcome)
 
     # Define a function to calculate power consumption and duration with a single user
-    def consumption_for_user(self, args):
+    def consumption_for_user(self, task):
         """
-        Used to parallelize the consumption calculations since BLE library takes a while to compute.
-        :param args: Arguments used to run the functions. Includes: user_data, user_pp_size, owner_pp_size,
-        user_consent_obj, user_consent, applicable_users, iot_device.
-        :return: Returns total device power and time consumption, as well as the updated user lists.
+        Used to parallelize the consumption calculations since BLE library takes a while to compute. Does not change
+        the user or the IoT device, the outcome is merged by merge_outcome().
+        :param task: NegotiationTask of the user.
+        :return: NegotiationOutcome of the user.
         """
 
-        index, u = args["user_data"]
-        user_pp_size = args["user_pp_size"]
-        owner_pp_size = args["owner_pp_size"]
-        iot_device = args["iot_device"]
-
-        if u.consent == 0:
+        if task.consent == 0:
             (logging.error
              ("Something went wrong in Cunche. There is a user that has not consented but we try to process them."))
             exit(-1)
 
-        # check if the current user is going to negotiate:
-        if u.consent > 0:
-            if self.network.network_type == "ble":
-                # Calculate the power consumption and duration for BLE
-                self.ble_negotiation(user_pp_size, owner_pp_size, u, iot_device)
-            elif self.network.network_type == "zigbee":
-                # Calculate the power consumption and duration for zigbee
-                self.zigbee_negotiation(user_pp_size, owner_pp_size, u, iot_device)
-            elif self.network.network_type == "lora":
-                # Calculate the power consumption and duration for zigbee
-                self.lora_negotiation(user_pp_size, owner_pp_size, u, iot_device)
-            else:
-                # raise error and exit
-                logging.error("Invalid network type in cunche.py.")
-                sys.exit(-1)
-
-            # Calculate user and owner utility
-            u.add_to_utility(calc_utility(calc_time_remaining(u), u.power_consumed,
-                                          u.weights))
-            # Use the user remaining time to calculate the IoT device utility,
-            # since the user is moving away (not the device)
-            iot_device.add_to_utility(calc_utility(calc_time_remaining(u),
-                                                   iot_device.power_consumed, iot_device.weights))
-            if iot_device.utility == float("inf"):
-                # raise error and exit
-                logging.error("Got infinite utility for IoT device in cunche.py.")
-                sys.exit(-1)
-
-    def ble_negotiation(self, user_pp_size, owner_pp_size, u, iot_device):
+        if self.network.network_type == "ble":
+            # Calculate the power consumption and duration for BLE
+            return self.ble_negotiation(self.user_pp_size, self.owner_pp_size, task)
+        elif self.network.network_type == "zigbee":
+            # Calculate the power consumption and duration for zigbee
+            return self.zigbee_negotiation(self.user_pp_size, self.owner_pp_size, task)
+        elif self.network.network_type == "lora":
+            # Calculate the power consumption and duration for zigbee
+            return self.lora_negotiation(self.user_pp_size, self.owner_pp_size, task)
+        else:
+            # raise error and exit
+            logging.error("Invalid network type in cunche.py.")
+            sys.exit(-1)
+
+    def merge_outcome(self, u, iot_device, outcome):
+        """
+        Charges the negotiation outcome of a user to the user and the IoT device and updates their utilities.
+        :param u: User object.
+        :param iot_device: IoT device object.
+        :param outcome: NegotiationOutcome of the user.
+        """
+        self.network.charge(u, iot_device, outcome.user_power, outcome.user_time, outcome.owner_power,
+                            outcome.owner_time)
+
+        # Calculate user and owner utility
+        u.add_to_utility(calc_utility(calc_time_remaining(u), u.power_consumed,
+                                      u.weights))
+        # Use the user remaining time to calculate the IoT device utility,
+        # since the user is moving away (not the device)
+        iot_device.add_to_utility(calc_utility(calc_time_remaining(u),
+                                               iot_device.power_consumed, iot_device.weights))
+        if iot_device.utility == float("inf"):
+            # raise error and exit
+            logging.error("Got infinite utility for IoT device in cunche.py.")
+            sys.exit(-1)
+
+    def ble_negotiation(self, user_pp_size, owner_pp_size, task):
         """
         BLE-based Cunche negotiation implementation.
         :param user_pp_size: User privacy policy size in bytes.
         :param owner_pp_size: User privacy policy size in bytes.
-        :param u: Current user under negotiation.
-        :param iot_device: IoT Device.
-        :return: Power and time consumption of user and iot device.
+        :param task: NegotiationTask of the current user.
+        :return: NegotiationOutcome with the power and time consumption of the user and the IoT device.
         """
 
-        # has to be local not to double count
-        iot_device_power_consumed = 0
-        iot_device_time_consumed = 0
+        outcome = NegotiationOutcome.for_task(task)
 
         # if 0 phases (won't consent) we don't do anything
         # if 1 phase
-        if u.consent > 0:
+        if task.consent > 0:
             # get the duration of all constant parts of a connection event. (Preprocessing, Postprocessing,...)
-            dc = self.network.network_impl.connected.ble_e_model_c_get_duration_constant_parts()
+            dc = self.network.network_impl.profile.duration_constant_parts
 
             # now do the same with the charge of these phases
-            charge_c = self.network.network_impl.connected.ble_e_model_c_get_charge_constant_parts()
+            charge_c = self.network.network_impl.profile.charge_constant_parts
 
             # charge_c is in [C], so we should divide by dc to get the current
             current_c = charge_c / dc
 
-            u.add_to_time_spent(dc)
-            iot_device_time_consumed += dc
-            u.add_to_power_consumed(current_c)
-            iot_device_power_consumed += current_c
+            outcome.user_time.append(dc)
+            outcome.owner_time.append(dc)
+            outcome.user_power.append(current_c)
+            outcome.owner_power.append(current_c)
 
             # Calculate the latency and energy consumption of device discovery. The values are taken from:
             # https://www.researchgate.net/publication/335808941_Connection-less_BLE_Performance_Evaluation_on_Smartphones
-            if u.consent == 1:
-                result = (self.network.network_impl.discovery.ble_model_discovery_get_result_alanezi
-                          (100, 0.9999, 0.25, 5, 2, 0.01, 1000, owner_pp_size))
+            if task.consent == 1:
+                result = self.network.network_impl.get_discovery_result(owner_pp_size)
             else:
-                result = (self.network.network_impl.discovery.ble_model_discovery_get_result
-                          (100, 0.9999, 0.25, 5, 2, 0.01, 1000))
+                result = self.network.network_impl.get_discovery_result()
 
-            u.add_to_time_spent(result.discoveryLatency)
-            iot_device_time_consumed += result.discoveryLatency
+            outcome.user_time.append(result.discoveryLatency)
+            outcome.owner_time.append(result.discoveryLatency)
             # charge_c is in [C], so we should divide by dc to get the current
             current_c = result.chargeAdv / result.discoveryLatency
-            u.add_to_power_consumed(current_c)
-            iot_device_power_consumed += current_c
+            outcome.user_power.append(current_c)
+            outcome.owner_power.append(current_c)
 
             # TODO: think about this
             connection_established = False
 
-        if u.consent == 2:
+        if task.consent == 2:
 
             if not connection_established:
                 # at the end of discovery the device go through connection establishment
                 # as per documentation there is no duration, since it is accounted in the discovery
                 # For user we set periodic scan type
 
-                duration = \
-                    (
-                        self.network.network_impl.connection_establishment.ble_e_model_ce_get_duration_for_connection_procedure
-                        (1, 0, 1,
-                         0,
-                         0.1))
-                u.add_to_time_spent(duration)
-
-                u.add_to_power_consumed(
-                    self.network.network_impl.connection_establishment.ble_e_model_ce_get_charge_for_connection_procedure
-                    (1, 0, 1,
-                     0,
-                     0.1) / duration)
-
-                duration = \
-                    (
-                        self.network.network_impl.connection_establishment.ble_e_model_ce_get_duration_for_connection_procedure
-                        (1, 0, 0,
-                         0,
-                         0.1))
-                iot_device_time_consumed += duration
-                iot_device_power_consumed += (
-                        self.network.network_impl.connection_establishment.ble_e_model_ce_get_charge_for_connection_procedure
-                        (1, 0, 0,
-                         0,
-                         0.1) / duration)
+                duration = self.network.network_impl.profile.duration_connection_procedure(1, 0, 1, 0, 0.1)
+                outcome.user_time.append(duration)
+
+                outcome.user_power.append(
+                    self.network.network_impl.profile.charge_connection_procedure(1, 0, 1, 0, 0.1) / duration)
+
+                duration = self.network.network_impl.profile.duration_connection_procedure(1, 0, 0, 0, 0.1)
+                outcome.owner_time.append(duration)
+                outcome.owner_power.append(
+                    self.network.network_impl.profile.charge_connection_procedure(1, 0, 0, 0, 0.1) / duration)
 
                 connection_established = True
 
@@ -238,241 +222,202 @@ class Cunche:
             # the owner then forwards "modified" PP to the user which is either accepted
             # or user has to leave the environment so no need for acceptance
             # we just assume it is the same as the PP sent to the user
-            duration = self.network.network_impl.connected.ble_e_model_c_get_duration_sequences(1, 0.1, 1,
-                                                                                                [0],
-                                                                                                [user_pp_size], 3)
-            u.add_to_time_spent(duration)
-
-            u.add_to_power_consumed(
-                self.network.network_impl.connected.ble_e_model_c_get_charge_sequences(1, 0.1, 1,
-                                                                                       [0],
-                                                                                       [user_pp_size],
-                                                                                       3) / duration)
-
-            duration = self.network.network_impl.connected.ble_e_model_c_get_duration_sequences(1, 0.1, 1,
-                                                                                                [user_pp_size],
-                                                                                                [0],
-                                                                                                3)
-            iot_device_time_consumed += duration
-
-            iot_device_power_consumed += self.network.network_impl.connected.ble_e_model_c_get_charge_sequences(0,
-                                                                                                                0.1,
-                                                                                                                1,
-                                                                                                                [
-                                                                                                                    user_pp_size],
-                                                                                                                [
-                                                                                                                    0],
-                                                                                                                3) / duration
-            duration = self.network.network_impl.connected.ble_e_model_c_get_duration_sequences(1, 0.1, 1,
-                                                                                                [owner_pp_size],
-                                                                                                [0], 3)
-            u.add_to_time_spent(duration)
-
-            u.add_to_power_consumed(
-                self.network.network_impl.connected.ble_e_model_c_get_charge_sequences(1, 0.1, 1,
-                                                                                       [owner_pp_size],
-                                                                                       [0],
-                                                                                       3) / duration)
-
-            duration = self.network.network_impl.connected.ble_e_model_c_get_duration_sequences(1, 0.1, 1,
-                                                                                                [0],
-                                                                                                [owner_pp_size],
-                                                                                                3)
-            iot_device_time_consumed += duration
-
-            iot_device_power_consumed += self.network.network_impl.connected.ble_e_model_c_get_charge_sequences(0,
-                                                                                                                0.1,
-                                                                                                                1,
-                                                                                                                [
-                                                                                                                    0],
-                                                                                                                [
-                                                                                                                    owner_pp_size],
-                                                                                                                3) / duration
-        elif u.consent > 2:
+            duration = self.network.network_impl.profile.duration_sequences(1, 0.1, [0], [user_pp_size])
+            outcome.user_time.append(duration)
+
+            outcome.user_power.append(
+                self.network.network_impl.profile.charge_sequences(1, 0.1, [0], [user_pp_size]) / duration)
+
+            duration = self.network.network_impl.profile.duration_sequences(1, 0.1, [user_pp_size], [0])
+            outcome.owner_time.append(duration)
+
+            outcome.owner_power.append(
+                self.network.network_impl.profile.charge_sequences(0, 0.1, [user_pp_size], [0]) / duration)
+            duration = self.network.network_impl.profile.duration_sequences(1, 0.1, [owner_pp_size], [0])
+            outcome.user_time.append(duration)
+
+            outcome.user_power.append(
+                self.network.network_impl.profile.charge_sequences(1, 0.1, [owner_pp_size], [0]) / duration)
+
+            duration = self.network.network_impl.profile.duration_sequences(1, 0.1, [0], [owner_pp_size])
+            outcome.owner_time.append(duration)
+
+            outcome.owner_power.append(
+                self.network.network_impl.profile.charge_sequences(0, 0.1, [0], [owner_pp_size]) / duration)
+        elif task.consent > 2:
             logging.error("Invalid consent value in cunche.py.")
             sys.exit(1)
 
-        # convert from As to Ws
-        u.power_consumed = u.power_consumed * self.network.network_impl.voltage
-        iot_device.add_to_power_consumed(iot_device_power_consumed * self.network.network_impl.voltage)
-        iot_device.add_to_time_spent(iot_device_time_consumed)
+        return outcome
 
-    def zigbee_negotiation(self, user_pp_size, owner_pp_size, u, iot_device):
+    def zigbee_negotiation(self, user_pp_size, owner_pp_size, task):
         """
         ZigBee-based Cunche negotiation implementation.
         :param user_pp_size: User privacy policy size in bytes.
         :param owner_pp_size: User privacy policy size in bytes.
-        :param u: Current user under negotiation.
-        :param iot_device: IoT Device.
-        :return: Power and time consumption of user and iot device.
+        :param task: NegotiationTask of the current user.
+        :return: NegotiationOutcome with the power and time consumption of the user and the IoT device.
         """
 
-        # has to be local not to double count
-        iot_device_power_consumed = 0
-        iot_device_time_consumed = 0
+        outcome = NegotiationOutcome.for_task(task)
 
         # if 0 phases (won't consent) we don't do anything
         # if 1 phase
-        if u.consent > 0:
+        if task.consent > 0:
             # get the duration and power consumption of startup for the device (Ws, s)
             charge_c, dc = self.network.network_impl.startup()
 
-            u.add_to_time_spent(dc)
-            iot_device_time_consumed += dc
-            u.add_to_power_consumed(charge_c)
-            iot_device_power_consumed += charge_c
+            outcome.user_time.append(dc)
+            outcome.owner_time.append(dc)
+            outcome.user_power.append(charge_c)
+            outcome.owner_power.append(charge_c)
 
             # Association duration and power consumption (Ws, s)
 
             charge_a, da = self.network.network_impl.association()
 
-            u.add_to_time_spent(da)
-            iot_device_time_consumed += da
-            u.add_to_power_consumed(charge_a)
-            iot_device_power_consumed += charge_a
+            outcome.user_time.append(da)
+            outcome.owner_time.append(da)
+            outcome.user_power.append(charge_a)
+            outcome.owner_power.append(charge_a)
 
             # at the end of association the mote sends its request to the coordinator
             charge_tx, d_tx = self.network.network_impl.send(owner_pp_size)
             charge_rx, d_rx = self.network.network_impl.receive(owner_pp_size)
 
-            u.add_to_time_spent(d_rx)
-            iot_device_time_consumed += d_tx
-            u.add_to_power_consumed(charge_rx)
-            iot_device_power_consumed += charge_tx
+            outcome.user_time.append(d_rx)
+            outcome.owner_time.append(d_tx)
+            outcome.user_power.append(charge_rx)
+            outcome.owner_power.append(charge_tx)
 
             # Send ACK
             charge_tx, d_tx = self.network.network_impl.send(self.network.network_impl.ack_size)
             charge_rx, d_rx = self.network.network_impl.receive(self.network.network_impl.ack_size)
 
-            u.add_to_time_spent(d_tx)
-            iot_device_time_consumed += d_rx
-            u.add_to_power_consumed(charge_tx)
-            iot_device_power_consumed += charge_rx
+            outcome.user_time.append(d_tx)
+            outcome.owner_time.append(d_rx)
+            outcome.user_power.append(charge_tx)
+            outcome.owner_power.append(charge_rx)
 
-            if u.consent == 1:
+            if task.consent == 1:
                 # the Coordinator sends its consent to the mote
                 # indicated by reply of the same PP
                 charge_tx, d_tx = self.network.network_impl.send(owner_pp_size)
                 charge_rx, d_rx = self.network.network_impl.receive(owner_pp_size)
 
-                u.add_to_time_spent(d_tx)
-                iot_device_time_consumed += d_rx
-                u.add_to_power_consumed(charge_tx)
-                iot_device_power_consumed += charge_rx
+                outcome.user_time.append(d_tx)
+                outcome.owner_time.append(d_rx)
+                outcome.user_power.append(charge_tx)
+                outcome.owner_power.append(charge_rx)
 
                 # Send ACK
                 charge_tx, d_tx = self.network.network_impl.send(self.network.network_impl.ack_size)
                 charge_rx, d_rx = self.network.network_impl.receive(self.network.network_impl.ack_size)
 
-                u.add_to_time_spent(d_rx)
-                iot_device_time_consumed += d_tx
-                u.add_to_power_consumed(charge_rx)
-                iot_device_power_consumed += charge_tx
+                outcome.user_time.append(d_rx)
+                outcome.owner_time.append(d_tx)
+                outcome.user_power.append(charge_rx)
+                outcome.owner_power.append(charge_tx)
 
-        elif u.consent == 2:
+        elif task.consent == 2:
             # the Coordinator sends its PP to the mote
             charge_tx, d_tx = self.network.network_impl.send(user_pp_size)
             charge_rx, d_rx = self.network.network_impl.receive(user_pp_size)
 
-            u.add_to_time_spent(d_tx)
-            iot_device_time_consumed += d_rx
-            u.add_to_power_consumed(charge_tx)
-            iot_device_power_consumed += charge_rx
+            outcome.user_time.append(d_tx)
+            outcome.owner_time.append(d_rx)
+            outcome.user_power.append(charge_tx)
+            outcome.owner_power.append(charge_rx)
 
             # Send ACK
             charge_tx, d_tx = self.network.network_impl.send(self.network.network_impl.ack_size)
             charge_rx, d_rx = self.network.network_impl.receive(self.network.network_impl.ack_size)
 
-            u.add_to_time_spent(d_rx)
-            iot_device_time_consumed += d_tx
-            u.add_to_power_consumed(charge_rx)
-            iot_device_power_consumed += charge_tx
+            outcome.user_time.append(d_rx)
+            outcome.owner_time.append(d_tx)
+            outcome.user_power.append(charge_rx)
+            outcome.owner_power.append(charge_tx)
 
             # the mote responds with the owner PP to indicate consent
             charge_tx, d_tx = self.network.network_impl.send(owner_pp_size)
             charge_rx, d_rx = self.network.network_impl.receive(owner_pp_size)
 
-            u.add_to_time_spent(d_rx)
-            iot_device_time_consumed += d_tx
-            u.add_to_power_consumed(charge_rx)
-            iot_device_power_consumed += charge_tx
+            outcome.user_time.append(d_rx)
+            outcome.owner_time.append(d_tx)
+            outcome.user_power.append(charge_rx)
+            outcome.owner_power.append(charge_tx)
 
             # Send ACK
             charge_tx, d_tx = self.network.network_impl.send(self.network.network_impl.ack_size)
             charge_rx, d_rx = self.network.network_impl.receive(self.network.network_impl.ack_size)
 
-            u.add_to_time_spent(d_tx)
-            iot_device_time_consumed += d_rx
-            u.add_to_power_consumed(charge_tx)
-            iot_device_power_consumed += charge_rx
+            outcome.user_time.append(d_tx)
+            outcome.owner_time.append(d_rx)
+            outcome.user_power.append(charge_tx)
+            outcome.owner_power.append(charge_rx)
 
-        elif u.consent > 2:
+        elif task.consent > 2:
             logging.info("Invalid consent value in cunche.py.")
             sys.exit(1)
 
-        iot_device.add_to_time_spent(iot_device_time_consumed)
-        iot_device.add_to_power_consumed(iot_device_power_consumed)
+        return outcome
 
-    def lora_negotiation(self, user_pp_size, owner_pp_size, u, iot_device):
+    def lora_negotiation(self, user_pp_size, owner_pp_size, task):
         """
         LoRa-based Cunche negotiation implementation.
         :param user_pp_size: User privacy policy size in bytes.
         :param owner_pp_size: User privacy policy size in bytes.
-        :param u: Current user under negotiation.
-        :param iot_device: IoT Device.
-        :return: Power and time consumption of user and iot device.
+        :param task: NegotiationTask of the current user.
+        :return: NegotiationOutcome with the power and time consumption of the user and the IoT device.
         """
 
-        # has to be local not to double count
-        iot_device_power_consumed = 0
-        iot_device_time_consumed = 0
+        outcome = NegotiationOutcome.for_task(task)
 
         # if 0 phases (won't consent) we don't do anything
         # if 1 phase
-        if u.consent > 0:
+        if task.consent > 0:
             # IoT device (owner) sends PP to the LoRa node (user)
 
             power_tx, d_tx = self.network.network_impl.send(owner_pp_size)
             power_rx, d_rx = self.network.network_impl.receive(owner_pp_size)
 
-            u.add_to_time_spent(d_rx)
-            iot_device_time_consumed += d_tx
-            u.add_to_power_consumed(power_rx)
-            iot_device_power_consumed += power_tx
+            outcome.user_time.append(d_rx)
+            outcome.owner_time.append(d_tx)
+            outcome.user_power.append(power_rx)
+            outcome.owner_power.append(power_tx)
 
-            if u.consent == 1:
+            if task.consent == 1:
                 # the LoRa node replies with consent (owner/received PP)
                 power_tx, d_tx = self.network.network_impl.send(owner_pp_size)
                 power_rx, d_rx = self.network.network_impl.receive(owner_pp_size)
 
-                u.add_to_time_spent(d_tx)
-                iot_device_time_consumed += d_rx
-                u.add_to_power_consumed(power_tx)
-                iot_device_power_consumed += power_rx
+                outcome.user_time.append(d_tx)
+                outcome.owner_time.append(d_rx)
+                outcome.user_power.append(power_tx)
+                outcome.owner_power.append(power_rx)
 
-            elif u.consent == 2:
+            elif task.consent == 2:
                 # the LoRa node replies with its PP
                 power_tx, d_tx = self.network.network_impl.send(user_pp_size)
                 power_rx, d_rx = self.network.network_impl.receive(user_pp_size)
 
-                u.add_to_time_spent(d_tx)
-                iot_device_time_consumed += d_rx
-                u.add_to_power_consumed(power_tx)
-                iot_device_power_consumed += power_rx
+                outcome.user_time.append(d_tx)
+                outcome.owner_time.append(d_rx)
+                outcome.user_power.append(power_tx)
+                outcome.owner_power.append(power_rx)
 
                 # the IoT device replies with "modified" PP
                 # for now we simply keep it same as owner PP size
                 power_tx, d_tx = self.network.network_impl.send(owner_pp_size)
                 power_rx, d_rx = self.network.network_impl.receive(owner_pp_size)
 
-                u.add_to_time_spent(d_rx)
-                iot_device_time_consumed += d_tx
-                u.add_to_power_consumed(power_rx)
-                iot_device_power_consumed += power_tx
+                outcome.user_time.append(d_rx)
+                outcome.owner_time.append(d_tx)
+                outcome.user_power.append(power_rx)
+                outcome.owner_power.append(power_tx)
 
-            elif u.consent > 2:
+            elif task.consent > 2:
                 logging.error("Invalid consent value in cunche.py.")
                 sys.exit(1)
 
-        iot_device.add_to_power_consumed(iot_device_power_consumed)
-        iot_device.add_to_time_spent(iot_device_time_consumed)
+        return outcome
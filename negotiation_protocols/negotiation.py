@@ -1,18 +1,60 @@
-from negotiation_protocols.cunche import Cunche
-from negotiation_protocols.alanezi import Alanezi
-from negotiation_protocols.concession import Concession
-from negotiation_protocols.padome import Padome
 import sys
 import logging
 
+import numpy as np
+
+from registry import Registry
+
+# Negotiation protocols by name, imported on first use. Protocol classes are constructed once per simulation run with
+# the network object, the protocol-level numpy Generator and the execution backend, and provide
+# run(curr_users_list, iot_device), called for every event, and optionally reset(), called at the end of the run.
+PROTOCOLS = Registry("gepard.negotiation_protocols", {
+    "alanezi": "negotiation_protocols.alanezi:Alanezi",
+    "cunche": "negotiation_protocols.cunche:Cunche",
+    "concession": "negotiation_protocols.concession:Concession",
+    "padome": "negotiation_protocols.padome:Padome",
+})
+
 
 class NegotiationProtocol:
     """
     Metaclass for Negotiation Protocols. Used to unify and call different negotiation protocols.
     """
-    def __init__(self, protocol, network):
+    def __init__(self, protocol, network, rng=None, executor=None):
+        """
+        :param protocol: Negotiation protocol name (e.g., alanezi).
+        :param network: Network object.
+        :param rng: numpy Generator for protocol-level (not user-specific) random draws.
+        If None, an unseeded one is used.
+        :param executor: ExecutionBackend shared by the negotiations (set by the driver, inline if None).
+        """
         self.protocol = protocol
         self.network = network
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.executor = executor
+        # protocol engine (e.g., Alanezi object), created for the first event and kept until reset()
+        self.engine = None
+
+    def get_engine(self):
+        """
+        :return: Protocol engine of the current simulation run, created on first use.
+        """
+        if self.engine is None:
+            protocol_class = PROTOCOLS.get(self.protocol)
+            if protocol_class is None:
+                logging.info("Negotiation protocol not supported")
+                sys.exit(1)
+            self.engine = protocol_class(self.network, self.rng, self.executor)
+        return self.engine
+
+    def reset(self):
+        """
+        Called between simulation runs (by the driver at the end of a run). Releases the protocol engine and the state
+        it holds for the run; the next event creates a new engine, e.g., with the execution backend of the next run.
+        """
+        if self.engine is not None and hasattr(self.engine, "reset"):
+            self.engine.reset()
+        self.engine = None
 
     def run(self, list_of_users, iot_device):
         """
@@ -21,18 +63,6 @@ class NegotiationProtocol:
         :param iot_device: IoT device object.
         :return: Returns the calculated power and time consumption for users and IoT device.
         """
-        if self.protocol == "alanezi":
-            alanezi = Alanezi(self.network)
-            alanezi.run(list_of_users, iot_device)
-        elif self.protocol == "cunche":
-            cunche = Cunche(self.network)
-            return cunche.run(list_of_users, iot_device)
-        elif self.protocol == "concession":
-            concession = Concession(self.network)
-            return concession.run(list_of_users, iot_device)
-        elif self.protocol == "padome":
-            padome = Padome(self.network)
-            return padome.run(list_of_users, iot_device)
-        else:
-            logging.info("Negotiation protocol not supported")
-            sys.exit(1)
+        engine = self.get_engine()
+        self.network.begin_event(list_of_users)
+        return engine.run(list_of_users, iot_device)
@@ -0,0 +1,99 @@
+import logging
+from dataclasses import dataclass, field, replace
+
+'''
+Outcome records of the per-user negotiations. The protocols compute every user's negotiation with a pure function
+(it only reads the network cost models and returns a NegotiationOutcome) and then merge the outcomes into the users and
+the IoT device in the parent process, one after the other in user order. The pure part can therefore run in worker
+processes (see executor.py) and the results do not depend on the execution mode. The outcomes of users with the
+same consent are the same, so they are compiled once (see CostTemplates).
+'''
+
+
+@dataclass(frozen=True)
+class NegotiationTask:
+    """
+    Picklable input of a per-user negotiation. Stands in for the user in the network cost queries, which only use the
+    user id (e.g., the BLE contention model).
+    """
+    index: int
+    id_: int
+    consent: int
+
+
+@dataclass
+class NegotiationOutcome:
+    """
+    Result of a per-user negotiation: the consent (number of phases/rounds) and the power and time consumption of
+    every step for the user and the IoT device, in the order they are charged (see Network.charge()).
+    """
+    index: int
+    id_: int
+    consent: int
+    user_power: list = field(default_factory=list)
+    user_time: list = field(default_factory=list)
+    owner_power: list = field(default_factory=list)
+    owner_time: list = field(default_factory=list)
+
+    @classmethod
+    def for_task(cls, task):
+        """
+        :param task: NegotiationTask object.
+        :return: Empty outcome of the task.
+        """
+        return cls(task.index, task.id_, task.consent)
+
+
+class CostTemplates:
+    """
+    Precompiled negotiation costs of a protocol (cost templates). On a given network, the costs of a user's
+    negotiation only depend on the consent (number of phases/rounds), so the outcome is computed for one user per
+    consent and reused for all users with the same consent. Every template lists the power and time consumption of
+    each step for the user and the IoT device (see NegotiationOutcome).
+
+    With the contention/channel models, the costs also depend on the per-event state of the network technology
+    (event_state), so the templates are compiled again when it changes, and with the BLE contention model on the
+    advertising user, which is then part of the template key (per_user).
+    """
+    def __init__(self, network, per_user=False):
+        """
+        :param network: Network object.
+        :param per_user: Whether the protocol's cost queries depend on the user with the BLE contention model (the
+        user advertises).
+        """
+        self.network = network
+        self.per_user = per_user
+        self.templates = {}
+        self.event_state = None
+
+    def outcomes(self, tasks, compile_outcomes):
+        """
+        :param tasks: NegotiationTask objects.
+        :param compile_outcomes: Function computing the NegotiationOutcome objects (or None) of a list of tasks, called
+        once with one task per missing template.
+        :return: NegotiationOutcome objects (or None, as compiled) of the tasks, in task order.
+        """
+        network_impl = self.network.network_impl
+        event_state = getattr(network_impl, "event_state", None)
+        if event_state != self.event_state:
+            # the templates of other events no longer apply
+            self.templates = {}
+            self.event_state = event_state
+        per_user = self.per_user and getattr(network_impl, "contention", None) is not None
+
+        keys = [(task.consent, task.id_ if per_user else None) for task in tasks]
+        missing = {}
+        for key, task in zip(keys, tasks):
+            if key not in self.templates:
+                missing.setdefault(key, task)
+        if missing:
+            for key, outcome in zip(missing, compile_outcomes(list(missing.values()))):
+                self.templates[key] = outcome
+                if outcome is not None:
+                    logging.debug("Compiled %s cost template for consent %d: user %s %s, owner %s %s",
+                                  self.network.network_type, outcome.consent, outcome.user_power, outcome.user_time,
+                                  outcome.owner_power, outcome.owner_time)
+
+        # the templates are shared by the outcomes, which are only read when they are merged
+        return [None if self.templates[key] is None else replace(self.templates[key], index=task.index, id_=task.id_)
+                for key, task in zip(keys, tasks)]
@@ -1,16 +1,15 @@
-from concurrent.futures import ThreadPoolExecutor
-
+from executor import ExecutionBackend
+from negotiation_protocols.outcome import NegotiationTask, NegotiationOutcome, CostTemplates
 from util import check_distance, get_distance
-import random
 import sys
 import logging
 import numpy as np
 import itertools
-from util import solve_for_z
+from util import solve_for_z_batch
 from scipy.stats import uniform
 import math
 
-from util import get_config
+from util import get_settings
 
 
 class Padome:
@@ -18,22 +17,29 @@ class Padome:
     Implements Padome negotiation protocol. Includes BLE, ZigBee and LoRa based negotiations.
     """
 
-    def __init__(self, network):
+    def __init__(self, network, rng=None, executor=None):
         """
         Initializes Padome class.
         :param network: network type (e.g., BLE)
+        :param rng: numpy Generator for the offer space draws (user-specific draws use the user's own generator).
+        :param executor: ExecutionBackend the per-user negotiations run in (inline if None).
         """
         self.network = network
-        self.config = get_config()['Padome']  # load padome config
-        self.reservation_value = self.config['reservation_value']
-        self.user_pp_size = self.config['user_pp_size']
-        self.owner_pp_size = self.config['owner_pp_size']
-        self.neg_value = self.config['neg_value']
-        self.neg_range = self.config['neg_range']
-        self.deadline_factors = {}
-        self.privacy_type_distribution = {}
-        self.response_likelihood = {}
-        self.privacy_weights = {}
+        self.executor = executor if executor is not None else ExecutionBackend()
+        # negotiation costs per number of rounds, compiled on first use and kept for the run (with the BLE
+        # contention model the users advertise, so the costs are compiled per user)
+        self.cost_templates = CostTemplates(network, per_user=True)
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.config = get_settings().padome  # load padome config
+        self.reservation_value = self.config.reservation_value
+        self.user_pp_size = self.config.user_pp_size
+        self.owner_pp_size = self.config.owner_pp_size
+        self.neg_value = self.config.neg_value
+        self.neg_range = self.config.neg_range
+        self.deadline_factors = self.config.deadline_factors
+        self.privacy_type_distribution = self.config.privacy_type_distribution
+        self.response_likelihood = self.config.response_likelihood
+        self.privacy_weights = self.config.privacy_weights
 
     def run(self, curr_users_list, iot_device):
         """
@@ -45,13 +51,13 @@ class Padome:
         :return: Returns total device power and time consumption, as well as the updated user lists.
         """
 
-        a, b = np.random.uniform(0, 1, 2)
+        a, b = self.rng.uniform(0, 1, 2)
         a, b = min(a, b), max(a, b)
 
         # Assume 3 negotiable values, each in range (1-5)
         # (offer, estimated_offer_utility (if elicited then the true utility), probability of acceptance by opponent,
         # elicitation from user state)
-        offers = [(o, uniform(loc=a, scale=b - a), np.random.uniform(0, 1), 0)
+        offers = [(o, uniform(loc=a, scale=b - a), self.rng.uniform(0, 1), 0)
                   for o in list(itertools.product((range(1, self.neg_range + 1)), repeat=self.neg_value))]
 
         # For now, we assume that the IoT owner precisely knows the user's privacy preferences and
@@ -85,26 +91,23 @@ class Padome:
 
         logging.debug("Applicable users: %s", [u.id_ for u in applicable_users])
 
+        if applicable_users:
+            tasks = [NegotiationTask(index, u.id_, u.consent) for index, u in enumerate(applicable_users)]
+
+            # The costs come from the cost templates, the missing templates are computed with the shared execution
+            # backend. The per-user negotiations only compute the costs, so they can run in worker processes (unless
+            # the network cost queries are recorded or replayed, which has to happen in this process). The costs are
+            # the same in every pass below, so they are computed once.
+            outcomes = self.cost_templates.outcomes(
+                tasks, lambda missing: self.executor.map(self.consumption_for_user, missing,
+                                                         pure=self.network.replay is None))
+
         for _ in applicable_users:
             logging.debug("Applicable users that will consent: %s", [u.id_ for u in applicable_users])
 
-            if applicable_users:
-                # Create a list of dictionaries containing arguments for the function
-                user_data_list = [{"user_data": user_data, "user_pp_size": self.user_pp_size,
-                                   "owner_pp_size": self.owner_pp_size,
-                                   "applicable_users": applicable_users,
-                                   "iot_device": iot_device}
-                                  for user_data in enumerate(applicable_users)]
-
-                # Use multithreading to parallelize the for loop
-                # Couldn't use the ProcessPoolExecutor as it clones the objects and does not return the results
-                # Can still be easily replaced if necessary
-                # Reference:
-                # https://stackoverflow.com/questions/41164606/altering-different-python-objects-in-parallel-processes-respectively
-                with ThreadPoolExecutor() as executor:
-                    # Map the function over the user data list
-                    list(executor.map(self.consumption_for_user, user_data_list))
-                    executor.shutdown(wait=True, cancel_futures=False)
+            # merge the outcomes in user order, so that the results do not depend on the execution mode
+            for u, outcome in zip(applicable_users, outcomes):
+                self.merge_outcome(u, iot_device, outcome)
 
     def calculate_dynamic_deadline(self, applicable_users, iot_device, user_pp_size, owner_pp_size):
         """
@@ -115,16 +118,13 @@ class Padome:
         :param owner_pp_size: Owner PP size.
         :return: Returns a dynamically calculated deadline.
         """
-        self.deadline_factors = self.config['deadline_factors']
         # Scale deadline by the number of applicable users
-        user_count_factor = len(applicable_users) * self.deadline_factors['user_count_factor_multiplier']
+        user_count_factor = len(applicable_users) * self.deadline_factors.user_count_factor_multiplier
 
         # Network factor based on communication speed
-        network_factor = self.deadline_factors['network_factors'].get(self.network,
-                                                                      self.deadline_factors['network_factors'][
-                                                                          'default'])
+        network_factor = self.deadline_factors.network_factor(self.network)
 
-        base_deadline = self.deadline_factors['base_deadline']
+        base_deadline = self.deadline_factors.base_deadline
 
         # Distance factor: Add more rounds if the average user distance is high
         avg_distance = np.mean([get_distance(u.curr_loc, iot_device.device_location) for u in applicable_users])
@@ -193,7 +193,7 @@ class Padome:
             # Step 4: Determine best offer
             # compute the function over values for each variable
             function_values = [
-                self.calculate_offer_value(value if elicited else value.rvs(), probability)
+                self.calculate_offer_value(value if elicited else value.rvs(random_state=user.rng), probability)
                 for _, value, probability, elicited in user.offers
             ]
             # Find the index of the maximum value
@@ -234,8 +234,8 @@ class Padome:
                 user.neg_attempted = True
                 # check if the offer will be accepted
                 # find best_offer in iot.offers, get its probability and see if will be accepted or rejected
-                # (using random.random)
-                offer_accepted = self.check_offer(iot_device, best_offer)
+                # (using the user's random generator)
+                offer_accepted = self.check_offer(iot_device, best_offer, user.rng)
                 # Here you could add logic to modify or refine the offer based on the negotiation strategy
                 if offer_accepted:
                     if hasattr(best_offer[1], 'rvs') and hasattr(best_offer[1], 'mean'):
@@ -271,18 +271,19 @@ class Padome:
         """
         return probability * value + (1 - probability) * self.reservation_value
 
-    def check_offer(self, iot_device, best_offer):
+    def check_offer(self, iot_device, best_offer, rng):
         """
         Function to check if the offer is accepted
         :param iot_device: IoT Device object.
         :param best_offer: Current best offer.
+        :param rng: numpy Generator of the user under negotiation.
         :return: Check if offer is accepted given the offer probability and a random value.
         """
         # Find best_offer in iot.offers, get its probability and check acceptance
         for offer in iot_device.offers:
             offer_value, offer_probability, offer_elicited = offer
             if offer_value == best_offer:
-                if random.random() < offer_probability:
+                if rng.random() < offer_probability:
                     return True
                 else:
                     return False
@@ -313,8 +314,7 @@ class Padome:
             # We use device discovery for broadcast. The values are taken from:
             # https://www.researchgate.net/publication/335808941_Connection-less_BLE_Performance_Evaluation_on_Smartphones
             # Request/Response is assumed to be pp size
-            result = (self.network.network_impl.discovery.ble_model_discovery_get_result_alanezi
-                      (100, 0.9999, 0.25, 5, 2, 0.01, 1000, user_pp_size))
+            result = self.network.network_impl.get_discovery_result(user_pp_size, user)
 
             estimated_time_cost = result.discoveryLatency
             # charge_c is in [C], so we should divide by dc to get the current
@@ -334,20 +334,16 @@ class Padome:
             # we need to add other potential responses
             for u in curr_user_list:
                 # for each potential PA determine the response probability based on their user privacy label
-                pa_response_probability = random.uniform(0.1, 0.3) if u.privacy_label == 1 \
-                    else random.uniform(0.4, 0.6) if u.privacy_label == 2 \
-                    else random.uniform(0.7, 0.9)
+                pa_response_probability = user.rng.uniform(0.1, 0.3) if u.privacy_label == 1 \
+                    else user.rng.uniform(0.4, 0.6) if u.privacy_label == 2 \
+                    else user.rng.uniform(0.7, 0.9)
 
-                if pa_response_probability > random.random() and u.neg_attempted:
+                if pa_response_probability > user.rng.random() and u.neg_attempted:
                     pas_responded.append(u)
 
-                    duration = self.network.network_impl.connected.ble_e_model_c_get_duration_sequences(1, 0.1, 1,
-                                                                                                        [user_pp_size],
-                                                                                                        [0], 3)
+                    duration = self.network.network_impl.profile.duration_sequences(1, 0.1, [user_pp_size], [0])
 
-                    power_spent = self.network.network_impl.connected.ble_e_model_c_get_charge_sequences(1, 0.1, 1,
-                                                                                                         [user_pp_size],
-                                                                                                         [0], 3)
+                    power_spent = self.network.network_impl.profile.charge_sequences(1, 0.1, [user_pp_size], [0])
                     if not pa_accounted_for:
                         # send response
                         estimated_power_cost_pas += power_spent
@@ -391,10 +387,10 @@ class Padome:
             charge_rx, d_rx = self.network.network_impl.receive(user_pp_size)
 
             for u in curr_user_list:
-                pa_response_probability = random.uniform(0.1, 0.3) if u.privacy_label == 1 \
-                    else random.uniform(0.4, 0.6) if u.privacy_label == 2 \
-                    else random.uniform(0.7, 0.9)
-                if pa_response_probability > random.random() and u.neg_attempted:
+                pa_response_probability = user.rng.uniform(0.1, 0.3) if u.privacy_label == 1 \
+                    else user.rng.uniform(0.4, 0.6) if u.privacy_label == 2 \
+                    else user.rng.uniform(0.7, 0.9)
+                if pa_response_probability > user.rng.random() and u.neg_attempted:
                     if not pa_accounted_for:
                         pa_accounted_for = True
 
@@ -418,10 +414,10 @@ class Padome:
 
             # Reception
             for u in curr_user_list:
-                pa_response_probability = random.uniform(0.1, 0.3) if u.privacy_label == 1 \
-                    else random.uniform(0.4, 0.6) if u.privacy_label == 2 \
-                    else random.uniform(0.7, 0.9)
-                if pa_response_probability > random.random() and u.neg_attempted:
+                pa_response_probability = user.rng.uniform(0.1, 0.3) if u.privacy_label == 1 \
+                    else user.rng.uniform(0.4, 0.6) if u.privacy_label == 2 \
+                    else user.rng.uniform(0.7, 0.9)
+                if pa_response_probability > user.rng.random() and u.neg_attempted:
                     pas_responded.append(u)
                     power_rx, d_rx = self.network.network_impl.receive(user_pp_size)
                     if not pa_accounted_for:
@@ -490,24 +486,18 @@ class Padome:
         :param pas_may_respond: List of PAs that may respond (only length matters here)
         :return: Expected information gain
         """
-        # Privacy type distribution (fundamentalist, pragmatist, unconcerned)
-        self.privacy_type_distribution = self.config['privacy_type_distribution']
-
-        # Likelihood of responding for each privacy group (follows same distribution as consent probabilities)
-        self.response_likelihood = self.config['response_likelihood']
-
         # Retrieve the privacy type distribution for fundamentalists, pragmatists, unconcerned
         privacy_type_probs = [
-            self.privacy_type_distribution['fundamentalist'],
-            self.privacy_type_distribution['pragmatist'],
-            self.privacy_type_distribution['unconcerned']
+            self.privacy_type_distribution.fundamentalist,
+            self.privacy_type_distribution.pragmatist,
+            self.privacy_type_distribution.unconcerned
         ]
 
         # Retrieve the response likelihood for fundamentalists, pragmatists, unconcerned
         response_likelihood = [
-            self.response_likelihood['fundamentalist'],
-            self.response_likelihood['pragmatist'],
-            self.response_likelihood['unconcerned']
+            self.response_likelihood.fundamentalist,
+            self.response_likelihood.pragmatist,
+            self.response_likelihood.unconcerned
         ]
 
         # Step 1: Calculate initial entropy based on privacy type distribution
@@ -593,25 +583,24 @@ class Padome:
         :param user: current user in the environment (Users object).
         """
 
-        c_w = self.config['user_elicitation_cost']
+        c_w = self.config.user_elicitation_cost
 
         unelicited_offers = [offer for offer in user.offers if not offer[3]]  # Only offers that haven't been elicited
         elicitation_cost = 0
         v = float('-inf')  # Initialize max utility
 
         # Step 1: Solve for z for each unelicited offer
-        z_values = {}
-        for offer, offer_values, probability_of_acceptance, elicitation_status in unelicited_offers:
-            # Assuming you calculate the utility based on the offer values (you may need to adjust this)
-            z = solve_for_z(offer_values.a, offer_values.b, c_w)  # Adjust 'solve_for_z' as per your logic
-            z_values[(offer, offer_values, probability_of_acceptance, elicitation_status)] = z
+        # Uniform priors have a closed-form solution, so solve for all unelicited offers at once
+        z_solutions = solve_for_z_batch([offer[1].a for offer in unelicited_offers],
+                                        [offer[1].b for offer in unelicited_offers], c_w)
+        z_values = dict(zip(unelicited_offers, np.atleast_1d(z_solutions).tolist()))
 
             # Step 2: Compute initial v value
         for offer, offer_values, probability_of_acceptance, elicitation_status in user.offers:
             # Assuming utility is derived from offer_values; adjust this part if needed
             if hasattr(offer_values, 'rvs'):
                 # If it's a distribution (it has .rvs() method)
-                utility = offer_values.rvs()
+                utility = offer_values.rvs(random_state=user.rng)
             else:
                 # If it's a float or already elicited value
                 utility = offer_values
@@ -625,7 +614,7 @@ class Padome:
 
             # Extract probability_of_acceptance and utility for best_offer[0]
             probability_of_acceptance = best_offer[2]  # This is the second element in the tuple
-            utility = best_offer[1].rvs()  # Calculate utility based on offer_values (best_offer[0])
+            utility = best_offer[1].rvs(random_state=user.rng)  # Calculate utility based on offer_values (best_offer[0])
 
             # Compute the negotiation value based on the given formula
             negotiation_value = probability_of_acceptance * utility + (1 - probability_of_acceptance) * c_w
@@ -650,7 +639,8 @@ class Padome:
 
             # Update v with the new elicited preference
             probability_of_acceptance, utility = best_offer[2], best_offer[1]
-            v = max(v, probability_of_acceptance * utility.rvs() + (1 - probability_of_acceptance) * c_w)
+            v = max(v, probability_of_acceptance * utility.rvs(random_state=user.rng)
+                    + (1 - probability_of_acceptance) * c_w)
 
             # check if it is "worth" eliciting further
             if elicitation_cost > self.reservation_value:
@@ -667,11 +657,10 @@ class Padome:
         # For now, we'll assume it returns a random utility value or mock value
         # Example: Return some mock value (in a real scenario, you would elicit from the user)
         # Weights for the privacy factors [data_collection, data_retention, data_sharing] based on user type
-        self.privacy_weights = self.config['privacy_weights']
         weights = {
-            3: self.privacy_weights['unconcerned'],  # Privacy label 3: Unconcerned
-            2: self.privacy_weights['pragmatist'],  # Privacy label 2: Pragmatist
-            1: self.privacy_weights['fundamentalist']  # Privacy label 1: Fundamentalist
+            3: self.privacy_weights.unconcerned,  # Privacy label 3: Unconcerned
+            2: self.privacy_weights.pragmatist,  # Privacy label 2: Pragmatist
+            1: self.privacy_weights.fundamentalist  # Privacy label 1: Fundamentalist
         }
 
         # Extract the offer components
@@ -689,55 +678,62 @@ class Padome:
         return utility
 
     # Define a function to calculate power consumption and duration with a single user
-    def consumption_for_user(self, args):
+    def consumption_for_user(self, task):
         """
-        Used to parallelize the consumption calculations since BLE library takes a while to compute.
-        :param args: Arguments used to run the functions. Includes: user_data, user_pp_size, owner_pp_size,
-        user_consent_obj, user_consent, applicable_users, iot_device.
-        :return: Returns total device power and time consumption, as well as the updated user lists.
+        Used to parallelize the consumption calculations since BLE library takes a while to compute. Does not change
+        the user or the IoT device, the outcome is merged by merge_outcome().
+        :param task: NegotiationTask of the user.
+        :return: NegotiationOutcome of the user, or None if the user does not negotiate.
         """
 
-        index, u = args["user_data"]
-        user_pp_size = args["user_pp_size"]
-        owner_pp_size = args["owner_pp_size"]
-        iot_device = args["iot_device"]
-
         # check if the current user is going to negotiate:
-        if u.consent > 0:
+        if task.consent > 0:
             if self.network.network_type == "ble":
                 # Calculate the power consumption and duration for BLE
-                self.ble_negotiation(user_pp_size, owner_pp_size, u, iot_device)
+                return self.ble_negotiation(self.user_pp_size, self.owner_pp_size, task)
             elif self.network.network_type == "zigbee":
                 # Calculate the power consumption and duration for Zigbee
-                self.zigbee_negotiation(user_pp_size, owner_pp_size, u, iot_device)
+                return self.zigbee_negotiation(self.user_pp_size, self.owner_pp_size, task)
             elif self.network.network_type == "lora":
                 # Calculate the power consumption and duration for LoRa
-                self.lora_negotiation(user_pp_size, owner_pp_size, u, iot_device)
+                return self.lora_negotiation(self.user_pp_size, self.owner_pp_size, task)
             else:
                 # raise error and exit
                 logging.error("Invalid network type in padome.py.")
                 sys.exit(1)
+        return None
 
-            # Calculate user and owner utility
-            # u.add_to_utility(calc_utility(calc_time_remaining(u), u.power_consumed,
-            #                               u.weights))
-            # Use the user remaining time to calculate the IoT device utility,
-            # since the user is moving away (not the device)
-            # iot_device.add_to_utility(calc_utility(calc_time_remaining(u),
-            #                                        iot_device.power_consumed, iot_device.weights))
-            if iot_device.utility == float("inf"):
-                # raise error and exit
-                logging.error("Got infinite utility for IoT device in padome.py.")
-                sys.exit(-1)
+    def merge_outcome(self, u, iot_device, outcome):
+        """
+        Charges the negotiation outcome of a user to the user and the IoT device.
+        :param u: User object.
+        :param iot_device: IoT device object.
+        :param outcome: NegotiationOutcome of the user (None if the user does not negotiate).
+        """
+        if outcome is None:
+            return
+        self.network.charge(u, iot_device, outcome.user_power, outcome.user_time, outcome.owner_power,
+                            outcome.owner_time)
+
+        # Calculate user and owner utility
+        # u.add_to_utility(calc_utility(calc_time_remaining(u), u.power_consumed,
+        #                               u.weights))
+        # Use the user remaining time to calculate the IoT device utility,
+        # since the user is moving away (not the device)
+        # iot_device.add_to_utility(calc_utility(calc_time_remaining(u),
+        #                                        iot_device.power_consumed, iot_device.weights))
+        if iot_device.utility == float("inf"):
+            # raise error and exit
+            logging.error("Got infinite utility for IoT device in padome.py.")
+            sys.exit(-1)
 
-    def ble_negotiation(self, user_pp_size, owner_pp_size, u, iot_device):
+    def ble_negotiation(self, user_pp_size, owner_pp_size, task):
         """
         BLE-based Padome negotiation implementation.
         :param user_pp_size: User privacy policy size in bytes.
         :param owner_pp_size: User privacy policy size in bytes.
-        :param u: Current user under negotiation.
-        :param iot_device: IoT device object.
-        :return: Power and time consumption of user and iot device.
+        :param task: NegotiationTask of the current user.
+        :return: NegotiationOutcome with the power and time consumption of the user and the IoT device.
         """
 
         # Padome's proposed negotiation follows the following flow:
@@ -748,40 +744,36 @@ class Padome:
         # at least 1 connection packet always occurs
         # We use the values directly provided by Kindt et al.
 
-        # has to be local not to double count
-        iot_device_power_consumed = 0
-        iot_device_time_consumed = 0
+        outcome = NegotiationOutcome.for_task(task)
 
         # get the duration of all constant parts of a connection event. (Preprocessing, Postprocessing,...)
-        dc = self.network.network_impl.connected.ble_e_model_c_get_duration_constant_parts()
+        dc = self.network.network_impl.profile.duration_constant_parts
 
         # now do the same with the charge of these phases
-        charge_c = self.network.network_impl.connected.ble_e_model_c_get_charge_constant_parts()
+        charge_c = self.network.network_impl.profile.charge_constant_parts
 
         # charge_c is in [C], so we should divide by dc to get the current
         current_c = charge_c / dc
 
-        u.add_to_time_spent(dc)
-        iot_device_time_consumed += dc
-        u.add_to_power_consumed(current_c)
-        iot_device_power_consumed += current_c
+        outcome.user_time.append(dc)
+        outcome.owner_time.append(dc)
+        outcome.user_power.append(current_c)
+        outcome.owner_power.append(current_c)
 
         # Calculate the latency and energy consumption of device discovery. The values are taken from:
         # https://www.researchgate.net/publication/335808941_Connection-less_BLE_Performance_Evaluation_on_Smartphones
         # the discovery includes PP exchange as the first round
-        if u.consent == 1:
-            result = (self.network.network_impl.discovery.ble_model_discovery_get_result_alanezi
-                      (100, 0.9999, 0.25, 5, 2, 0.01, 1000, user_pp_size))
+        if task.consent == 1:
+            result = self.network.network_impl.get_discovery_result(user_pp_size, task)
         else:
-            result = (self.network.network_impl.discovery.ble_model_discovery_get_result
-                      (100, 0.9999, 0.25, 5, 2, 0.01, 1000))
+            result = self.network.network_impl.get_discovery_result(advertiser=task)
 
-        u.add_to_time_spent(result.discoveryLatency)
-        iot_device_time_consumed += result.discoveryLatency
+        outcome.user_time.append(result.discoveryLatency)
+        outcome.owner_time.append(result.discoveryLatency)
         # charge_c is in [C], so we should divide by dc to get the current
         current_c = result.chargeAdv / result.discoveryLatency
-        u.add_to_power_consumed(current_c)
-        iot_device_power_consumed += current_c
+        outcome.user_power.append(current_c)
+        outcome.owner_power.append(current_c)
 
         connection_established = False
 
@@ -790,58 +782,34 @@ class Padome:
         # if negotiation is more phases
         # if negotiation has more phases
         num_rounds = 1
-        if u.consent > 1:
-            while u.consent >= num_rounds:
+        if task.consent > 1:
+            while task.consent >= num_rounds:
                 if not connection_established:
-                    duration = \
-                        (
-                            self.network.network_impl.connection_establishment.ble_e_model_ce_get_duration_for_connection_procedure
-                            (1, 0, 1,
-                             0,
-                             0.1))
-                    u.add_to_time_spent(duration)
-
-                    u.add_to_power_consumed(
-                        self.network.network_impl.connection_establishment.ble_e_model_ce_get_charge_for_connection_procedure
-                        (1, 0, 1,
-                         0,
-                         0.1) / duration)
-
-                    duration = \
-                        (
-                            self.network.network_impl.connection_establishment.ble_e_model_ce_get_duration_for_connection_procedure
-                            (1, 0, 0,
-                             0,
-                             0.1))
-                    iot_device_time_consumed += duration
-                    iot_device_power_consumed += (
-                            self.network.network_impl.connection_establishment.ble_e_model_ce_get_charge_for_connection_procedure
-                            (1, 0, 0,
-                             0,
-                             0.1) / duration)
+                    duration = self.network.network_impl.profile.duration_connection_procedure(1, 0, 1, 0, 0.1)
+                    outcome.user_time.append(duration)
+
+                    outcome.user_power.append(
+                        self.network.network_impl.profile.charge_connection_procedure(1, 0, 1, 0, 0.1) / duration)
+
+                    duration = self.network.network_impl.profile.duration_connection_procedure(1, 0, 0, 0, 0.1)
+                    outcome.owner_time.append(duration)
+                    outcome.owner_power.append(
+                        self.network.network_impl.profile.charge_connection_procedure(1, 0, 0, 0, 0.1) / duration)
 
                     connection_established = True
                 # in other phases we start exactly the same way as in 1 phase
                 # however now the owner responds with an alternative proposal and waits for the user to reply
                 # so two more steps are added
                 if num_rounds % 2 != 0:
-                    duration = self.network.network_impl.connected.ble_e_model_c_get_duration_sequences(1, 0.1, 1,
-                                                                                                        [0],
-                                                                                                        [user_pp_size], 3)
-                    u.add_to_time_spent(duration)
-
-                    power_spent = self.network.network_impl.connected.ble_e_model_c_get_charge_sequences(1, 0.1, 1,
-                                                                                                         [0],
-                                                                                                         [user_pp_size], 3)
-                    u.add_to_power_consumed(power_spent / duration)
-                    duration = self.network.network_impl.connected.ble_e_model_c_get_duration_sequences(1, 0.1, 1,
-                                                                                                        [user_pp_size],
-                                                                                                        [0], 3)
-                    power_spent = self.network.network_impl.connected.ble_e_model_c_get_charge_sequences(1, 0.1, 1,
-                                                                                                         [user_pp_size],
-                                                                                                         [0], 3)
-                    iot_device_time_consumed += duration
-                    iot_device_power_consumed += (power_spent / duration)
+                    duration = self.network.network_impl.profile.duration_sequences(1, 0.1, [0], [user_pp_size])
+                    outcome.user_time.append(duration)
+
+                    power_spent = self.network.network_impl.profile.charge_sequences(1, 0.1, [0], [user_pp_size])
+                    outcome.user_power.append(power_spent / duration)
+                    duration = self.network.network_impl.profile.duration_sequences(1, 0.1, [user_pp_size], [0])
+                    power_spent = self.network.network_impl.profile.charge_sequences(1, 0.1, [user_pp_size], [0])
+                    outcome.owner_time.append(duration)
+                    outcome.owner_power.append(power_spent / duration)
 
                 else:
                     # in 2 phase negotiation we start exactly the same way as in 1 phase
@@ -852,26 +820,18 @@ class Padome:
                     # after connection establishment the owner sends the proposal and the user receives it
                     # We assume that the user reply is the received PP
                     # we call from master point of view because it has Tx first and then Rx which better simulates the behaviour
-                    duration = self.network.network_impl.connected.ble_e_model_c_get_duration_sequences(1, 0.1, 1,
-                                                                                                        [0],
-                                                                                                        [owner_pp_size], 3)
-
-                    iot_device_time_consumed += duration
-
-                    power_spent = self.network.network_impl.connected.ble_e_model_c_get_charge_sequences(1, 0.1, 1,
-                                                                                                         [0],
-                                                                                                         [owner_pp_size], 3)
-                    iot_device_power_consumed += (power_spent / duration)
-                    duration = self.network.network_impl.connected.ble_e_model_c_get_duration_sequences(1, 0.1, 1,
-                                                                                                        [owner_pp_size],
-                                                                                                        [0], 3)
-                    power_spent = self.network.network_impl.connected.ble_e_model_c_get_charge_sequences(1, 0.1, 1,
-                                                                                                         [owner_pp_size],
-                                                                                                         [0], 3)
-                    u.add_to_power_consumed(power_spent / duration)
-                    u.add_to_time_spent(duration)
-
-                if u.consent >= num_rounds + 1:
+                    duration = self.network.network_impl.profile.duration_sequences(1, 0.1, [0], [owner_pp_size])
+
+                    outcome.owner_time.append(duration)
+
+                    power_spent = self.network.network_impl.profile.charge_sequences(1, 0.1, [0], [owner_pp_size])
+                    outcome.owner_power.append(power_spent / duration)
+                    duration = self.network.network_impl.profile.duration_sequences(1, 0.1, [owner_pp_size], [0])
+                    power_spent = self.network.network_impl.profile.charge_sequences(1, 0.1, [owner_pp_size], [0])
+                    outcome.user_power.append(power_spent / duration)
+                    outcome.user_time.append(duration)
+
+                if task.consent >= num_rounds + 1:
                     num_rounds += 1
                 else:
                     break
@@ -879,57 +839,37 @@ class Padome:
         # Acceptance
 
             if num_rounds % 2 != 0:
-                duration = self.network.network_impl.connected.ble_e_model_c_get_duration_sequences(1, 0.1, 1,
-                                                                                                    [0],
-                                                                                                    [user_pp_size], 3)
-
-                iot_device_time_consumed += duration
-
-                power_spent = self.network.network_impl.connected.ble_e_model_c_get_charge_sequences(1, 0.1, 1,
-                                                                                                     [0],
-                                                                                                     [user_pp_size], 3)
-                iot_device_power_consumed += (power_spent / duration)
-                duration = self.network.network_impl.connected.ble_e_model_c_get_duration_sequences(1, 0.1, 1,
-                                                                                                    [user_pp_size],
-                                                                                                    [0], 3)
-                power_spent = self.network.network_impl.connected.ble_e_model_c_get_charge_sequences(1, 0.1, 1,
-                                                                                                     [user_pp_size],
-                                                                                                     [0], 3)
-                u.add_to_power_consumed(power_spent / duration)
-                u.add_to_time_spent(duration)
+                duration = self.network.network_impl.profile.duration_sequences(1, 0.1, [0], [user_pp_size])
+
+                outcome.owner_time.append(duration)
+
+                power_spent = self.network.network_impl.profile.charge_sequences(1, 0.1, [0], [user_pp_size])
+                outcome.owner_power.append(power_spent / duration)
+                duration = self.network.network_impl.profile.duration_sequences(1, 0.1, [user_pp_size], [0])
+                power_spent = self.network.network_impl.profile.charge_sequences(1, 0.1, [user_pp_size], [0])
+                outcome.user_power.append(power_spent / duration)
+                outcome.user_time.append(duration)
 
             else:
-                duration = self.network.network_impl.connected.ble_e_model_c_get_duration_sequences(1, 0.1, 1,
-                                                                                                    [0],
-                                                                                                    [owner_pp_size], 3)
-                u.add_to_time_spent(duration)
-
-                power_spent = self.network.network_impl.connected.ble_e_model_c_get_charge_sequences(1, 0.1, 1,
-                                                                                                     [0],
-                                                                                                     [owner_pp_size], 3)
-                u.add_to_power_consumed(power_spent / duration)
-                duration = self.network.network_impl.connected.ble_e_model_c_get_duration_sequences(1, 0.1, 1,
-                                                                                                    [owner_pp_size],
-                                                                                                    [0], 3)
-                power_spent = self.network.network_impl.connected.ble_e_model_c_get_charge_sequences(1, 0.1, 1,
-                                                                                                     [owner_pp_size],
-                                                                                                     [0], 3)
-                iot_device_power_consumed += (power_spent / duration)
-                iot_device_time_consumed += duration
-
-        # convert from As to Ws
-        u.power_consumed = u.power_consumed * self.network.network_impl.voltage
-        iot_device.add_to_power_consumed(iot_device_power_consumed * self.network.network_impl.voltage)
-        iot_device.add_to_time_spent(iot_device_time_consumed)
-
-    def zigbee_negotiation(self, user_pp_size, owner_pp_size, u, iot_device):
+                duration = self.network.network_impl.profile.duration_sequences(1, 0.1, [0], [owner_pp_size])
+                outcome.user_time.append(duration)
+
+                power_spent = self.network.network_impl.profile.charge_sequences(1, 0.1, [0], [owner_pp_size])
+                outcome.user_power.append(power_spent / duration)
+                duration = self.network.network_impl.profile.duration_sequences(1, 0.1, [owner_pp_size], [0])
+                power_spent = self.network.network_impl.profile.charge_sequences(1, 0.1, [owner_pp_size], [0])
+                outcome.owner_power.append(power_spent / duration)
+                outcome.owner_time.append(duration)
+
+        return outcome
+
+    def zigbee_negotiation(self, user_pp_size, owner_pp_size, task):
         """
         ZigBee-based Padome negotiation implementation.
         :param user_pp_size: User privacy policy size in bytes.
         :param owner_pp_size: User privacy policy size in bytes.
-        :param u: Current user under negotiation.
-        :param iot_device: IoT device object.
-        :return: Power and time consumption of user and iot device.
+        :param task: NegotiationTask of the current user.
+        :return: NegotiationOutcome with the power and time consumption of the user and the IoT device.
         """
 
         # Padome's proposed negotiation follows the following flow:
@@ -941,35 +881,33 @@ class Padome:
         # -> Mote associates with the Coordinator (IoT device) -> Mote sends data request information to Coordinator
         # -> Coordinator accepts/negotiation -> ...done?
 
-        # has to be local not to double count
-        iot_device_power_consumed = 0
-        iot_device_time_consumed = 0
+        outcome = NegotiationOutcome.for_task(task)
 
         # get the duration and power consumption of startup for the device (Ws, s)
         charge_c, dc = self.network.network_impl.startup()
 
-        u.add_to_time_spent(dc)
-        iot_device_time_consumed += dc
-        u.add_to_power_consumed(charge_c)
-        iot_device_power_consumed += charge_c
+        outcome.user_time.append(dc)
+        outcome.owner_time.append(dc)
+        outcome.user_power.append(charge_c)
+        outcome.owner_power.append(charge_c)
 
         # Association duration and power consumption (Ws, s)
 
         charge_a, da = self.network.network_impl.association()
 
-        u.add_to_time_spent(da)
-        iot_device_time_consumed += da
-        u.add_to_power_consumed(charge_a)
-        iot_device_power_consumed += charge_a
+        outcome.user_time.append(da)
+        outcome.owner_time.append(da)
+        outcome.user_power.append(charge_a)
+        outcome.owner_power.append(charge_a)
 
         # at the end of association the mote sends its request to the coordinator
         charge_tx, d_tx = self.network.network_impl.send(user_pp_size)
         charge_rx, d_rx = self.network.network_impl.receive(user_pp_size)
 
-        u.add_to_time_spent(d_tx)
-        iot_device_time_consumed += d_rx
-        u.add_to_power_consumed(charge_tx)
-        iot_device_power_consumed += charge_rx
+        outcome.user_time.append(d_tx)
+        outcome.owner_time.append(d_rx)
+        outcome.user_power.append(charge_tx)
+        outcome.owner_power.append(charge_rx)
 
         # the owner also needs to send an ACK to the mote
         # as per: https://github.com/Koenkk/zigbee2mqtt/issues/1455
@@ -978,17 +916,17 @@ class Padome:
         charge_tx, d_tx = self.network.network_impl.send(self.network.network_impl.ack_size)
         charge_rx, d_rx = self.network.network_impl.receive(self.network.network_impl.ack_size)
 
-        u.add_to_time_spent(d_rx)
-        iot_device_time_consumed += d_tx
-        u.add_to_power_consumed(charge_rx)
-        iot_device_power_consumed += charge_tx
+        outcome.user_time.append(d_rx)
+        outcome.owner_time.append(d_tx)
+        outcome.user_power.append(charge_rx)
+        outcome.owner_power.append(charge_tx)
 
         # if owner accepts in 1-phase then owner starts sending/collecting the data, and we are done
         # the PP exchange occurred during device discovery
 
         # if negotiation has more phases
         num_rounds = 2
-        while u.consent >= num_rounds:
+        while task.consent >= num_rounds:
             # in other phases we start exactly the same way as in 1 phase
             # however now the owner responds with an alternative proposal and waits for the user to reply
             # so two more steps are added
@@ -997,19 +935,19 @@ class Padome:
                 charge_tx, d_tx = self.network.network_impl.send(user_pp_size)
                 charge_rx, d_rx = self.network.network_impl.receive(user_pp_size)
 
-                u.add_to_time_spent(d_tx)
-                iot_device_time_consumed += d_rx
-                u.add_to_power_consumed(charge_tx)
-                iot_device_power_consumed += charge_rx
+                outcome.user_time.append(d_tx)
+                outcome.owner_time.append(d_rx)
+                outcome.user_power.append(charge_tx)
+                outcome.owner_power.append(charge_rx)
 
                 # Send ACK
                 charge_tx, d_tx = self.network.network_impl.send(self.network.network_impl.ack_size)
                 charge_rx, d_rx = self.network.network_impl.receive(self.network.network_impl.ack_size)
 
-                u.add_to_time_spent(d_rx)
-                iot_device_time_consumed += d_tx
-                u.add_to_power_consumed(charge_rx)
-                iot_device_power_consumed += charge_tx
+                outcome.user_time.append(d_rx)
+                outcome.owner_time.append(d_tx)
+                outcome.user_power.append(charge_rx)
+                outcome.owner_power.append(charge_tx)
             else:
                 # in other phases we start exactly the same way as in 1 phase
                 # however now the owner responds with an alternative proposal and waits for the user to reply
@@ -1021,72 +959,70 @@ class Padome:
                 charge_tx, d_tx = self.network.network_impl.send(owner_pp_size)
                 charge_rx, d_rx = self.network.network_impl.receive(owner_pp_size)
 
-                u.add_to_time_spent(d_rx)
-                iot_device_time_consumed += d_tx
-                u.add_to_power_consumed(charge_rx)
-                iot_device_power_consumed += charge_tx
+                outcome.user_time.append(d_rx)
+                outcome.owner_time.append(d_tx)
+                outcome.user_power.append(charge_rx)
+                outcome.owner_power.append(charge_tx)
 
                 # Send ACK
                 charge_tx, d_tx = self.network.network_impl.send(self.network.network_impl.ack_size)
                 charge_rx, d_rx = self.network.network_impl.receive(self.network.network_impl.ack_size)
 
-                u.add_to_time_spent(d_tx)
-                iot_device_time_consumed += d_rx
-                u.add_to_power_consumed(charge_tx)
-                iot_device_power_consumed += charge_rx
+                outcome.user_time.append(d_tx)
+                outcome.owner_time.append(d_rx)
+                outcome.user_power.append(charge_tx)
+                outcome.owner_power.append(charge_rx)
 
-            if u.consent >= num_rounds + 1:
+            if task.consent >= num_rounds + 1:
                 num_rounds += 1
             else:
                 break
 
         # Acceptance
-        if num_rounds % 2 != 0 or u.consent == 1:
+        if num_rounds % 2 != 0 or task.consent == 1:
             charge_tx, d_tx = self.network.network_impl.send(user_pp_size)
             charge_rx, d_rx = self.network.network_impl.receive(user_pp_size)
 
-            u.add_to_time_spent(d_rx)
-            iot_device_time_consumed += d_tx
-            u.add_to_power_consumed(charge_rx)
-            iot_device_power_consumed += charge_tx
+            outcome.user_time.append(d_rx)
+            outcome.owner_time.append(d_tx)
+            outcome.user_power.append(charge_rx)
+            outcome.owner_power.append(charge_tx)
 
             # Send ACK
             charge_tx, d_tx = self.network.network_impl.send(self.network.network_impl.ack_size)
             charge_rx, d_rx = self.network.network_impl.receive(self.network.network_impl.ack_size)
 
-            u.add_to_time_spent(d_tx)
-            iot_device_time_consumed += d_rx
-            u.add_to_power_consumed(charge_tx)
-            iot_device_power_consumed += charge_rx
+            outcome.user_time.append(d_tx)
+            outcome.owner_time.append(d_rx)
+            outcome.user_power.append(charge_tx)
+            outcome.owner_power.append(charge_rx)
         else:
             charge_tx, d_tx = self.network.network_impl.send(owner_pp_size)
             charge_rx, d_rx = self.network.network_impl.receive(owner_pp_size)
 
-            u.add_to_time_spent(d_tx)
-            iot_device_time_consumed += d_rx
-            u.add_to_power_consumed(charge_tx)
-            iot_device_power_consumed += charge_rx
+            outcome.user_time.append(d_tx)
+            outcome.owner_time.append(d_rx)
+            outcome.user_power.append(charge_tx)
+            outcome.owner_power.append(charge_rx)
 
             # Send ACK
             charge_tx, d_tx = self.network.network_impl.send(self.network.network_impl.ack_size)
             charge_rx, d_rx = self.network.network_impl.receive(self.network.network_impl.ack_size)
 
-            u.add_to_time_spent(d_rx)
-            iot_device_time_consumed += d_tx
-            u.add_to_power_consumed(charge_rx)
-            iot_device_power_consumed += charge_tx
+            outcome.user_time.append(d_rx)
+            outcome.owner_time.append(d_tx)
+            outcome.user_power.append(charge_rx)
+            outcome.owner_power.append(charge_tx)
 
-        iot_device.add_to_time_spent(iot_device_time_consumed)
-        iot_device.add_to_power_consumed(iot_device_power_consumed)
+        return outcome
 
-    def lora_negotiation(self, user_pp_size, owner_pp_size, u, iot_device):
+    def lora_negotiation(self, user_pp_size, owner_pp_size, task):
         """
         LoRa-based Padome negotiation implementation.
         :param user_pp_size: User privacy policy size in bytes.
         :param owner_pp_size: User privacy policy size in bytes.
-        :param u: Current user under negotiation.
-        :param iot_device: IoT device object.
-        :return: Power and time consumption of user and iot device.
+        :param task: NegotiationTask of the current user.
+        :return: NegotiationOutcome with the power and time consumption of the user and the IoT device.
         """
 
         # Padome's proposed negotiation follows the following flow:
@@ -1097,9 +1033,7 @@ class Padome:
         # Class A LoRa node sends data request information to the Gateway
         # -> Gateway accepts/negotiation -> ...done?
 
-        # has to be local not to double count
-        iot_device_power_consumed = 0
-        iot_device_time_consumed = 0
+        outcome = NegotiationOutcome.for_task(task)
 
         # LoRa device (user) sends its request to the Gateway (owner)
         power_tx, d_tx = self.network.network_impl.send(user_pp_size)
@@ -1107,16 +1041,16 @@ class Padome:
         # Gateway reception
         power_rx, d_rx = self.network.network_impl.receive(user_pp_size)
 
-        u.add_to_time_spent(d_tx)
-        iot_device_time_consumed += d_rx
-        u.add_to_power_consumed(power_tx)
-        iot_device_power_consumed += power_rx
+        outcome.user_time.append(d_tx)
+        outcome.owner_time.append(d_rx)
+        outcome.user_power.append(power_tx)
+        outcome.owner_power.append(power_rx)
 
         # if owner accepts in 1-phase then owner starts sending/collecting the data and we are done
 
         # if negotiation has more phases
         num_rounds = 2
-        while u.consent >= num_rounds:
+        while task.consent >= num_rounds:
             # in other phases we start exactly the same way as in 1 phase
             # however now the owner responds with an alternative proposal and waits for the user to reply
             # so two more steps are added
@@ -1128,10 +1062,10 @@ class Padome:
                 # Gateway (owner) receives
                 power_tx, d_tx = self.network.network_impl.send(user_pp_size)
 
-                u.add_to_time_spent(d_tx)
-                iot_device_time_consumed += d_rx
-                u.add_to_power_consumed(power_tx)
-                iot_device_power_consumed += power_rx
+                outcome.user_time.append(d_tx)
+                outcome.owner_time.append(d_rx)
+                outcome.user_power.append(power_tx)
+                outcome.owner_power.append(power_rx)
 
             else:
                 # Gateway (owner) sends alternative offer
@@ -1140,28 +1074,28 @@ class Padome:
                 # LoRa node reception
                 power_rx, d_rx = self.network.network_impl.receive(owner_pp_size)
 
-                u.add_to_time_spent(d_rx)
-                iot_device_time_consumed += d_tx
-                u.add_to_power_consumed(power_rx)
-                iot_device_power_consumed += power_tx
+                outcome.user_time.append(d_rx)
+                outcome.owner_time.append(d_tx)
+                outcome.user_power.append(power_rx)
+                outcome.owner_power.append(power_tx)
 
-            if u.consent >= num_rounds+1:
+            if task.consent >= num_rounds+1:
                 num_rounds += 1
             else:
                 break
 
         # Acceptance
-        if num_rounds % 2 != 0 or u.consent == 1:
+        if num_rounds % 2 != 0 or task.consent == 1:
             # LoRa device reception
             power_tx, d_tx = self.network.network_impl.send(user_pp_size)
 
             # Gateway sends same PP
             power_rx, d_rx = self.network.network_impl.receive(user_pp_size)
 
-            u.add_to_time_spent(d_rx)
-            iot_device_time_consumed += d_tx
-            u.add_to_power_consumed(power_rx)
-            iot_device_power_consumed += power_tx
+            outcome.user_time.append(d_rx)
+            outcome.owner_time.append(d_tx)
+            outcome.user_power.append(power_rx)
+            outcome.owner_power.append(power_tx)
 
         else:
             # LoRa device (user) sends back the same PP it received
@@ -1170,10 +1104,9 @@ class Padome:
             # Gateway reception
             power_rx, d_rx = self.network.network_impl.receive(owner_pp_size)
 
-            u.add_to_time_spent(d_tx)
-            iot_device_time_consumed += d_rx
-            u.add_to_power_consumed(power_tx)
-            iot_device_power_consumed += power_rx
+            outcome.user_time.append(d_tx)
+            outcome.owner_time.append(d_rx)
+            outcome.user_power.append(power_tx)
+            outcome.owner_power.append(power_rx)
 
-        iot_device.add_to_power_consumed(iot_device_power_consumed)
-        iot_device.add_to_time_spent(iot_device_time_consumed)
+        return outcome
@@ -1,6 +1,7 @@
 import numpy as np
 from networks.bleemod_python.ble_model_params import *
 from networks.bleemod_python.ble_model_scanning import BLEScanner
+from networks.bleemod_python import ble_model_jit
 
 
 # maximum number of communication sequences possible
@@ -57,6 +58,10 @@ class BLEConnected:
             print(f"Invalid tx power level: {tx_power}")
             return 0
 
+        if ble_model_jit.ENABLED:
+            return ble_model_jit.charge_sequences(master_or_slave, float(Tc), n_seq, np.asarray(n_rx), np.asarray(n_tx),
+                                                  i_tx)
+
         # Go through all sequences
         for cnt in range(n_seq):
             # Charge consumed by RX-phase overheads (dPreRx + windowWidening)
@@ -128,6 +133,10 @@ class BLEConnected:
         :param tx_power: Tx-Power setting of the device
         :return: Time taken by the communication sequences [s]
         """
+        if ble_model_jit.ENABLED:
+            return ble_model_jit.duration_sequences(master_or_slave, float(Tc), n_seq, np.asarray(n_rx),
+                                                    np.asarray(n_tx))
+
         cnt = 0
         duration = 0
 
@@ -9,6 +9,12 @@ class BLEConnectionEstablishment:
     Energy model for BLE connection request procedures and for connection update procedures
     Implements a model for connection parameter update procedures and for connection request procedures
     """
+    def __init__(self):
+        # the model objects are stateless, so they are created once instead of on every call
+        self.ble_scan = BLEScanner()
+        self.ble_connected = BLEConnected()
+        self.ble_conn_est_params = BLEConnectionEstablishmentParams()
+
     def ble_e_model_ce_get_charge_for_connection_procedure(self, establishment_or_update, scan_type, master_or_slave,
                                                            Tc_old, Tc_new):
         """
@@ -37,9 +43,9 @@ class BLEConnectionEstablishment:
         """
         charge = 0
         duration_event = 0
-        ble_scan = BLEScanner()
-        ble_connected = BLEConnected()
-        ble_conn_est_params = BLEConnectionEstablishmentParams()
+        ble_scan = self.ble_scan
+        ble_connected = self.ble_connected
+        ble_conn_est_params = self.ble_conn_est_params
 
         if master_or_slave:
             # Master
@@ -118,9 +124,9 @@ class BLEConnectionEstablishment:
         """
         duration = 0
         duration_event = 0
-        ble_scan = BLEScanner()
-        ble_connected = BLEConnected()
-        ble_conn_est_params = BLEConnectionEstablishmentParams()
+        ble_scan = self.ble_scan
+        ble_connected = self.ble_connected
+        ble_conn_est_params = self.ble_conn_est_params
 
         if master_or_slave:
             # Master
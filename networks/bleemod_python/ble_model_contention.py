@@ -0,0 +1,118 @@
+import numpy as np
+
+from networks.bleemod_python.ble_model_discovery import DiscoveryModelResult
+from networks.bleemod_python.ble_model_params_connection_establishment import BLE_E_MOD_CE_ADV_IND_PKG_LEN
+
+'''
+Contention between concurrently advertising devices. The device discovery model (ble_model_discovery.py) assumes that
+the advertiser has the advertising channels to itself. With many privacy assistants advertising at the same time
+(e.g., in a shopping mall), advertising packets collide at the scanner.
+
+Every advertiser sends one packet per advertising event on each of the channels 37-39. Thanks to the random
+advertising delay, the advertising events of different devices are not synchronized, so on every channel the packets
+of the others arrive as in pure ALOHA: a packet of airtime a_i sent by device i collides with a packet of device j
+(airtime a_j, mean advertising event interval T_j) with probability (a_i + a_j) / T_j. With independent devices, a
+packet is received with probability
+    p_i = exp(-sum_{j != i} (a_i + a_j) / T_j) = exp(-(a_i * R_i + L_i)),
+where R_i = sum_{j != i} 1 / T_j is the packet rate and L_i = sum_{j != i} a_j / T_j the channel load of the other
+devices. R_i and L_i are computed for the whole group at once, so that collision-adjusted discovery results of any
+group member cost O(1).
+
+Every lost packet is a missed discovery opportunity. As the discovery model counts the advertising events until the
+first successful one, losing packets independently with probability 1 - p_i stretches the discovery (and the energy
+spent by advertiser and scanner on it) by 1 / p_i.
+'''
+
+
+def get_airtime(n_bytes_tx):
+    """
+    :param n_bytes_tx: Privacy policy bytes included in the advertisement (scalar or array).
+    :return: Airtime of one advertising packet [s] (1 Mbit/s PHY, as in the discovery model)
+    """
+    return 8e-6 * (BLE_E_MOD_CE_ADV_IND_PKG_LEN + np.asarray(n_bytes_tx, dtype=float))
+
+
+class BLEContention:
+    """
+    Collision model for a group of concurrently advertising devices (see the module description).
+    """
+    def __init__(self, adv_interval, rho_max, adv_payload=0):
+        """
+        :param adv_interval: Advertising interval Ta of the group members [s]
+        :param rho_max: Maximum advertising delay [s], the mean advertising event interval is Ta + rho_max / 2
+        :param adv_payload: Privacy policy bytes the group members include in their advertisements.
+        """
+        self.interval = adv_interval + rho_max / 2.0
+        self.adv_payload = adv_payload
+
+        # Group state of the current event
+        self.members = {}  # user id -> index in the arrays below
+        self.others_rate = np.zeros(0)  # R_i [1/s]
+        self.others_load = np.zeros(0)  # L_i
+        self.group_rate = 0.0  # sum of 1 / T_j over the whole group
+        self.group_load = 0.0  # sum of a_j / T_j over the whole group
+
+    def set_group(self, user_ids, adv_payloads=None, intervals=None):
+        """
+        Set the group of devices advertising during the current event.
+        :param user_ids: Ids of the advertising users.
+        :param adv_payloads: Optional per-user privacy policy bytes in the advertisements (default: adv_payload).
+        :param intervals: Optional per-user mean advertising event intervals [s] (default: Ta + rho_max / 2).
+        """
+        n = len(user_ids)
+        airtimes = get_airtime(np.full(n, self.adv_payload) if adv_payloads is None else adv_payloads)
+        rates = np.full(n, 1.0 / self.interval) if intervals is None else 1.0 / np.asarray(intervals, dtype=float)
+        loads = airtimes * rates
+
+        self.members = {user_id: index for index, user_id in enumerate(user_ids)}
+        self.group_rate = float(rates.sum())
+        self.group_load = float(loads.sum())
+        self.others_rate = self.group_rate - rates
+        self.others_load = self.group_load - loads
+
+    def success_probability(self, n_bytes_tx=0, advertiser=None):
+        """
+        :param n_bytes_tx: Privacy policy bytes included in the advertisement (scalar or array).
+        :param advertiser: Id of the advertising group member, or None for a device outside the group (e.g., the
+        IoT device), whose packets compete with all group members.
+        :return: Probability that an advertising packet is not lost in a collision.
+        """
+        index = self.members.get(advertiser)
+        if index is None:
+            rate, load = self.group_rate, self.group_load
+        else:
+            rate, load = self.others_rate[index], self.others_load[index]
+        return np.exp(-(get_airtime(n_bytes_tx) * rate + load))
+
+    def group_success_probabilities(self, n_bytes_tx=None):
+        """
+        Vectorized success_probability() for all group members.
+        :param n_bytes_tx: Optional per-member privacy policy bytes included in the advertisement
+        (default: adv_payload).
+        :return: Array of success probabilities in group order.
+        """
+        n_bytes_tx = np.full(len(self.members), self.adv_payload) if n_bytes_tx is None else n_bytes_tx
+        return np.exp(-(get_airtime(n_bytes_tx) * self.others_rate + self.others_load))
+
+    @staticmethod
+    def adjust(result, success):
+        """
+        Collision-adjusted discovery result.
+        :param result: DiscoveryModelResult without contention.
+        :param success: Success probability of the advertising packets.
+        :return: New DiscoveryModelResult (latency and charges stretched by 1 / success).
+        """
+        adjusted = DiscoveryModelResult()
+        adjusted.discoveryLatency = result.discoveryLatency / success
+        adjusted.chargeAdv = result.chargeAdv / success
+        adjusted.chargeScan = result.chargeScan / success
+        return adjusted
+
+    def get_result(self, result, n_bytes_tx=0, advertiser=None):
+        """
+        :param result: DiscoveryModelResult without contention.
+        :param n_bytes_tx: Privacy policy bytes included in the advertisement.
+        :param advertiser: Id of the advertising group member (see success_probability()).
+        :return: Collision-adjusted DiscoveryModelResult.
+        """
+        return self.adjust(result, float(self.success_probability(n_bytes_tx, advertiser)))
@@ -1,8 +1,12 @@
+import logging
 import math
 
+import numpy as np
+
 from networks.bleemod_python.ble_model_scanning import *
 from networks.bleemod_python.ble_model_connected import BLEConnected
 from networks.bleemod_python.ble_model_scanning import BLEScanner
+from networks.bleemod_python import ble_model_jit
 
 '''
 Call ble_model_discovery_getResult() to get an estimate for the device-discovery latency and the corresponding energies
@@ -27,6 +31,47 @@ class BLEDiscovery:
     """
     BLE device discovery implementation.
     """
+    def __init__(self, cache=None, table=None, adaptive=None):
+        """
+        :param cache: Optional DiscoveryCache (see ble_model_discovery_cache.py) used to memoize the model results.
+        :param table: Optional DiscoveryTable (see ble_model_discovery_table.py). If given, queries inside its grid are
+        answered by interpolation and only the others are computed exactly.
+        :param adaptive: Optional DiscoveryAdaptiveSettings (see util.py). If given, the fixed number of phi offsets
+        passed by the callers is ignored and the phi sampling is refined until the requested tolerance is reached
+        (see ble_model_discovery_get_result_adaptive()).
+        """
+        self.cache = cache
+        self.table = table
+        self.adaptive = adaptive
+        # parameter sets the adaptive model did not converge for (warned about once)
+        self._adaptive_warned = set()
+        self.scanner = BLEScanner()
+        self.connected = BLEConnected()
+
+    def _cached_result(self, params):
+        """
+        Look up the model result for the given parameter tuple in the cache.
+        :param params: Full parameter tuple of the model call.
+        :return: DiscoveryModelResult or None if there is no cache or the result is not cached.
+        """
+        if self.cache is None:
+            return None
+        cached = self.cache.get(params)
+        if cached is None:
+            return None
+        result = DiscoveryModelResult()
+        result.discoveryLatency, result.chargeAdv, result.chargeScan = cached
+        return result
+
+    def _store_result(self, params, result):
+        """
+        Store the model result for the given parameter tuple in the cache (if any).
+        :param params: Full parameter tuple of the model call.
+        :param result: DiscoveryModelResult.
+        """
+        if self.cache is not None:
+            self.cache.put(params, (result.discoveryLatency, result.chargeAdv, result.chargeScan))
+
     def _ble_model_discovery_normcdf(self, x, mu, sigma):
         """
         Calculates cumulative density function (CDF) of a (mu, sigma)-normal distribution by transforming the Gaussian CDF
@@ -95,6 +140,272 @@ class BLEDiscovery:
         else:
             return self._ble_model_discovery_normcdf(t, mu, sigma)
 
+    def _ble_model_discovery_gausscdf_array(self, x):
+        """
+        Array version of _ble_model_discovery_gausscdf()
+        :param x: Array of values to evaluate
+        :return: Array of CDF values
+        """
+        a1 = 0.254829592
+        a2 = -0.284496736
+        a3 = 1.421413741
+        a4 = -1.453152027
+        a5 = 1.061405429
+        p = 0.3275911
+
+        sign = np.where(x < 0, -1, 1)
+        x = np.abs(x) / math.sqrt(2.0)
+
+        t = 1.0 / (1.0 + p * x)
+        y = 1.0 - (((((a5 * t + a4) * t) + a3) * t + a2) * t + a1) * t * np.exp(-x * x)
+        return 0.5 * (1.0 + sign * y)
+
+    def _ble_model_discovery_get_approx_probab_array(self, mu, n, sigma, t, Ta_ideal, rho_max):
+        """
+        Array version of _ble_model_discovery_get_approx_probab() for one advertising event number n
+        and arrays of advertising event starting times.
+        :param mu: Array of mean values of the starting time of the advertising event (=TaReal)
+        :param n: Number of the advertising event (scalar).
+        :param sigma: Standard deviation of the starting time of the advertising event
+        :param t: Array of times to evaluate the CDF
+        :param Ta_ideal: Array of ideal points in time the advertising event starts
+        :param rho_max: Maximum random advDelay
+        :return: Array of approximate probabilities that the advertising event starts before t
+        """
+        if n == 0:
+            return np.where(t < Ta_ideal, 0.0, 1.0)
+        elif n == 1:
+            return np.where((Ta_ideal < t) & (t < Ta_ideal + rho_max), (t - Ta_ideal) / rho_max,
+                            np.where(t < Ta_ideal, 0.0, 1.0))
+        elif n == 2:
+            rising = (t - Ta_ideal) * (t - Ta_ideal) / (2.0 * rho_max * rho_max)
+            falling = 1 - (Ta_ideal + 2.0 * rho_max - t) * (Ta_ideal + 2.0 * rho_max - t) / (2.0 * rho_max * rho_max)
+            return np.where(t >= Ta_ideal,
+                            np.where((Ta_ideal < t) & (t < Ta_ideal + rho_max), rising,
+                                     np.where(t < Ta_ideal + 2.0 * rho_max, falling, 1.0)),
+                            0.0)
+        else:
+            return self._ble_model_discovery_gausscdf_array((t - mu) / sigma)
+
+    def _ble_model_discovery_advertising_charges(self, n_bytes_tx):
+        """
+        Phi-independent advertising charges used by the discovery model: the charge of an advertising event that ends
+        on channel 37, 38 or 39 (i.e., is received there) and duration and charge of an idle advertising event.
+        :param n_bytes_tx: Additional bytes in the advertising packets (0 for the standard model).
+        :return: Array of charges (q37, q38, q39), t39_idle, q39_idle
+        """
+        # Added n_bytes_tx to the BLE_E_MOD_CE_ADV_IND_PKG_LEN, since the advertiser
+        # (user) in Alanezi includes its PP/request to access the IoT resources
+        t39_idle = self.connected.ble_e_model_c_get_duration_event_same_payload(1, 0, 3, 0,
+                                                                               BLE_E_MOD_CE_ADV_IND_PKG_LEN + n_bytes_tx,
+                                                                               3)
+        q39_idle = self.connected.ble_e_model_c_get_charge_event_same_payload(1, 0, 3, 0,
+                                                                             BLE_E_MOD_CE_ADV_IND_PKG_LEN + n_bytes_tx,
+                                                                             3)
+        q_channels = np.array([self.connected.ble_e_model_c_get_charge_event_same_payload(
+            1, 0, n_channels, BLE_E_MOD_CE_CON_REQ_LEN, BLE_E_MOD_CE_ADV_IND_PKG_LEN + n_bytes_tx, 3)
+            for n_channels in (1, 2, 3)])
+        return q_channels, t39_idle, q39_idle
+
+    def _ble_model_discovery_get_result_phis(self, epsilon_hit, Ta, Ts, ds, phis, rho_max, max_time, n_bytes_tx=0):
+        """
+        Vectorized version of _ble_model_discovery_get_result_one_phi() (n_bytes_tx = 0) and
+        _ble_model_discovery_get_result_one_phi_alanezi(), evaluating all offsets phi at once.
+        The advertising events n are stepped through in lockstep for all phi; a phi drops out as soon as its
+        own stopping condition is met, so every phi sees exactly the same sequence of operations as in the
+        scalar version.
+        :param epsilon_hit: The hit probability of all advertising events examined.
+        :param Ta: Advertising interval [s]
+        :param Ts: Scan interval [s]
+        :param ds: Scan window [s]
+        :param phis: Array of offsets of the first scan event (n=0) from the beginning of the scanning process
+        :param rho_max: Maximum advertising delay [s]. Should be 10 ms according to the BLE specification
+        :param max_time: The maximum discovery latency possible. After that, the algorithm stops.
+        :param n_bytes_tx: Privacy policy bytes included in the advertisement (0 for the standard model)
+        :return: Arrays of discovery latencies, advertiser charges and scanner charges (one entry per phi)
+        """
+        phis = np.asarray(phis, dtype=float)
+
+        # Phi-independent charges, hoisted out of the loops
+        q_channels, t39_idle, q39_idle = self._ble_model_discovery_advertising_charges(n_bytes_tx)
+
+        if ble_model_jit.ENABLED:
+            # the compiled scalar kernel is faster than stepping through the advertising events in lockstep
+            return ble_model_jit.discovery_phis(float(epsilon_hit), float(Ta), float(Ts), float(ds), phis,
+                                                float(rho_max), float(max_time), q_channels, t39_idle, q39_idle)
+        q_no_reception = self.scanner.ble_e_model_sc_get_charge_scan_event(
+            ds, BLEModelSCEventType.SC_EVENT_TYPE_NO_RECEPTION, BLEModelSCScanType.SC_SCAN_TYPE_PERIODIC, 0, 0, 0, 0)
+
+        def q_aborted(reception_after_time):
+            # array version of the SC_EVENT_TYPE_ABORTED scan event charge (see BLEScanner)
+            return BLE_E_MOD_SCAN_DCHCH * BLE_E_MOD_SCAN_ICHCH + \
+                (np.minimum(ds, reception_after_time) + BLE_E_MOD_SCAN_DWOFFSET) * BLE_E_MOD_SCAN_IRX
+
+        # Channel (37, 38, 39) dependent offsets of the reception within the advertising event
+        d_early = np.array([0, 8e-6 * BLE_E_MOD_CE_ADV_IND_PKG_LEN + 150e-6,
+                            2.0 * (8e-6 * BLE_E_MOD_CE_ADV_IND_PKG_LEN + 150e-6)])
+        d_late = np.array([8e-6 * BLE_E_MOD_CE_ADV_IND_PKG_LEN, 2.0 * 8e-6 * BLE_E_MOD_CE_ADV_IND_PKG_LEN + 150e-6,
+                           3.0 * 8e-6 * BLE_E_MOD_CE_ADV_IND_PKG_LEN + 2.0 * 150e-6])
+        t_channel = np.array([8e-6 * BLE_E_MOD_CE_ADV_IND_PKG_LEN, 2.0 * 8e-6 * BLE_E_MOD_CE_ADV_IND_PKG_LEN + 150e-6,
+                              3.0 * 8e-6 * BLE_E_MOD_CE_ADV_IND_PKG_LEN + 2.0 * 150e-6])
+
+        p_cumm_miss = np.ones_like(phis)
+        t_exp = np.zeros_like(phis)
+        charge_adv_exp = np.zeros_like(phis)
+        charge_scan_exp = np.zeros_like(phis)
+        active = (1 - p_cumm_miss < epsilon_hit) & (t_exp < max_time)
+        evaluated = active.copy()
+
+        n = 0
+        while active.any():
+            Ta_ideal = phis + float(n) * Ta
+            Ta_real = Ta_ideal + float(n) * rho_max / 2.0
+            sigma = math.sqrt(float(n) / 12.0) * rho_max
+
+            k_min = np.floor(Ta_ideal / Ts)
+            k_max = np.floor((Ta_ideal + float(n) * rho_max) / Ts)
+
+            p_hit = np.zeros_like(phis)
+
+            for j in range(int((k_max - k_min)[active].max()) + 1):
+                k = k_min + j
+                valid = active & (k <= k_max)
+                channel = k.astype(int) % 3
+
+                p_k = self._ble_model_discovery_get_approx_probab_array(Ta_real, n, sigma,
+                                                                        k * Ts + ds - d_late[channel],
+                                                                        Ta_ideal, rho_max) - \
+                    self._ble_model_discovery_get_approx_probab_array(Ta_real, n, sigma,
+                                                                      k * Ts - d_early[channel],
+                                                                      Ta_ideal, rho_max)
+                p_k = np.where(valid, p_k, 0.0)
+                p_hit += p_k
+
+                current_t = float(n) * (Ta + rho_max / 2.0) + t_channel[channel]
+                weight = p_cumm_miss * p_k
+
+                t_exp += weight * current_t
+
+                if n >= 1:
+                    charge_adv_exp += weight * (float(n) - 1) * q39_idle
+                    charge_adv_exp += weight * (float(n) - 1) * (Ta - t39_idle) * BLE_E_MOD_G_ISL
+                charge_adv_exp += weight * q_channels[channel]
+
+                n_full_scan_events = np.floor((current_t + phis) / Ts)
+                time_left = (phis + current_t) - n_full_scan_events * Ts
+                charge_scan_exp += weight * n_full_scan_events * q_no_reception
+                # note: as in the scalar model, the aborted scan event is not weighted by its probability
+                charge_scan_exp += np.where(time_left > ds, weight * q_no_reception,
+                                            np.where(valid, q_aborted(time_left), 0.0))
+
+            p_cumm_miss = np.where(active, p_cumm_miss * (1 - p_hit), p_cumm_miss)
+
+            over_time = active & (t_exp > max_time)
+            t_exp = np.where(over_time, max_time, t_exp)
+            active = active & ~over_time & (1 - p_cumm_miss < epsilon_hit) & (t_exp < max_time)
+
+            n += 1
+
+        t_exp = np.minimum(t_exp, max_time)
+
+        # Scan energy spent before the first advertising event (depends on phi only)
+        n_scan_events_before_advertising = np.floor(phis / Ts)
+        scan_energy_before_advertising = n_scan_events_before_advertising * q_no_reception
+        scan_time_on_edge = phis - n_scan_events_before_advertising * Ts
+        scan_energy_before_advertising += np.where(scan_time_on_edge > ds, q_no_reception,
+                                                   q_aborted(ds - scan_time_on_edge))
+        scan_energy_before_advertising = np.where(evaluated, scan_energy_before_advertising, 0.0)
+
+        return t_exp, charge_adv_exp, charge_scan_exp - scan_energy_before_advertising
+
+    def _ble_model_discovery_get_result_joined(self, n_points, epsilon_hit, Ta, Ts, ds, rho_max, max_time,
+                                               n_bytes_tx=0):
+        """
+        Average the vectorized per-phi results over n_points offsets phi (see ble_model_discovery_get_result()).
+        :return: DiscoveryModelResult
+        """
+        delta = (3.0 * Ts) / float(n_points)
+        # phi = 0, delta, 2 * delta, ... accumulated in the same order as phi += delta
+        phis = np.cumsum(np.concatenate(([0.0], np.full(n_points - 1, delta))))
+
+        latencies, charges_adv, charges_scan = self._ble_model_discovery_get_result_phis(epsilon_hit, Ta, Ts, ds,
+                                                                                         phis, rho_max, max_time,
+                                                                                         n_bytes_tx)
+
+        # sum up sequentially, as the scalar version does
+        result_joined = DiscoveryModelResult()
+        result_joined.discoveryLatency = sum(latencies.tolist(), 0) / float(n_points)
+        result_joined.chargeAdv = sum(charges_adv.tolist(), 0) / float(n_points)
+        result_joined.chargeScan = sum(charges_scan.tolist(), 0) / float(n_points)
+        return result_joined
+
+    def ble_model_discovery_get_result_adaptive(self, epsilon_hit, Ta, Ts, ds, rho_max, max_time, n_bytes_tx=0,
+                                                rel_tol=1e-3, abs_tol=0.0, n_initial=8, n_max=1024):
+        """
+        Returns the model results averaged over the offsets phi (like ble_model_discovery_get_result_alanezi()), but
+        chooses the number of offsets adaptively: starting with n_initial equidistant offsets in [0, 3 * Ts), the
+        sampling is refined by inserting the midpoints (doubling the number of offsets, reusing all previous
+        evaluations) until the averages of successive levels differ by less than the tolerance for the latency and
+        both charges twice in a row (a single small difference can be a coincidence of the sampling). The larger of
+        the last two differences is returned as the error estimate. It is a heuristic, not a bound: the averages do not
+        converge monotonically, and the actual error can be a few times larger.
+        :param epsilon_hit: The hit probability of all advertising events examined for a particular phi.
+        :param Ta: Advertising interval [s]
+        :param Ts: Scan interval [s]
+        :param ds: Scan window [s]
+        :param rho_max: Maximum advertising delay [s]. Should be 10 ms according to the BLE specification
+        :param max_time: The maximum discovery latency possible. After that, the algorithm stops.
+        :param n_bytes_tx: Privacy policy bytes to include in the advertisement/broadcast (0 for the standard model)
+        :param rel_tol: Requested relative error of every result.
+        :param abs_tol: Requested absolute error of every result (a result is accurate enough if either holds).
+        :param n_initial: Number of offsets phi of the first level.
+        :param n_max: Maximum number of offsets phi. If reached, the results are returned with the achieved error
+        estimate, which may then exceed the tolerance.
+        :return: DiscoveryModelResult with the results and DiscoveryModelResult with the estimated absolute errors
+        """
+        if n_initial < 1 or n_max < n_initial:
+            raise ValueError("Adaptive discovery model requires 1 <= n_initial <= n_max")
+
+        params = ("adaptive", epsilon_hit, Ta, Ts, ds, rho_max, max_time, n_bytes_tx, rel_tol, abs_tol, n_initial,
+                  n_max)
+        cached = self._cached_result(params)
+        cached_error = self._cached_result(params + ("error",))
+        if cached is not None and cached_error is not None:
+            return cached, cached_error
+
+        n = n_initial
+        phis = np.arange(n) * (3.0 * Ts / float(n))
+        values = np.array(self._ble_model_discovery_get_result_phis(epsilon_hit, Ta, Ts, ds, phis, rho_max, max_time,
+                                                                    n_bytes_tx))
+        estimate = values.mean(axis=1)
+        difference = np.full(3, np.inf)
+        error = np.full(3, np.inf)
+
+        while n < n_max:
+            # insert the midpoints between the current offsets
+            new_phis = phis + 3.0 * Ts / float(2 * n)
+            new_values = np.array(self._ble_model_discovery_get_result_phis(epsilon_hit, Ta, Ts, ds, new_phis,
+                                                                            rho_max, max_time, n_bytes_tx))
+            phis = np.stack((phis, new_phis), axis=-1).reshape(-1)
+            values = np.stack((values, new_values), axis=-1).reshape(3, -1)
+            n *= 2
+
+            refined = values.mean(axis=1)
+            last_difference = difference
+            difference = np.abs(refined - estimate)
+            error = np.maximum(difference, last_difference)
+            estimate = refined
+            if np.all(error <= np.maximum(abs_tol, rel_tol * np.abs(estimate))):
+                break
+
+        result = DiscoveryModelResult()
+        result.discoveryLatency, result.chargeAdv, result.chargeScan = estimate.tolist()
+        result_error = DiscoveryModelResult()
+        result_error.discoveryLatency, result_error.chargeAdv, result_error.chargeScan = error.tolist()
+        self._store_result(params, result)
+        self._store_result(params + ("error",), result_error)
+        return result, result_error
+
     def _ble_model_discovery_get_result_one_phi(self, epsilon_hit, Ta, Ts, ds, phi, rho_max, max_time):
         """
         Returns the model results (discovery-latency and discover-energy both for advertiser and scanner)
@@ -119,6 +430,13 @@ class BLEDiscovery:
         result.chargeScan = 0
         result.discoveryLatency = 0
 
+        if ble_model_jit.ENABLED:
+            q_channels, t39_idle, q39_idle = self._ble_model_discovery_advertising_charges(0)
+            result.discoveryLatency, result.chargeAdv, result.chargeScan = \
+                ble_model_jit.discovery_one_phi(float(epsilon_hit), float(Ta), float(Ts), float(ds), float(phi),
+                                                float(rho_max), float(max_time), q_channels, t39_idle, q39_idle)
+            return result
+
         n = 0
         p_hit = 0
         p_cumm_miss = 1
@@ -307,6 +625,13 @@ class BLEDiscovery:
         result.chargeScan = 0
         result.discoveryLatency = 0
 
+        if ble_model_jit.ENABLED:
+            q_channels, t39_idle, q39_idle = self._ble_model_discovery_advertising_charges(n_bytes_tx)
+            result.discoveryLatency, result.chargeAdv, result.chargeScan = \
+                ble_model_jit.discovery_one_phi(float(epsilon_hit), float(Ta), float(Ts), float(ds), float(phi),
+                                                float(rho_max), float(max_time), q_channels, t39_idle, q39_idle)
+            return result
+
         n = 0
         p_hit = 0
         p_cumm_miss = 1
@@ -471,6 +796,27 @@ class BLEDiscovery:
         result.chargeScan = charge_scan_exp - scan_energy_before_advertising
         return result
 
+    def _ble_model_discovery_get_result_adaptive_mode(self, epsilon_hit, Ta, Ts, ds, rho_max, max_time, n_bytes_tx):
+        """
+        Adaptive precision results with the tolerances this object was configured with. Warns (once per parameter
+        set) if the tolerance was not reached with the maximum number of offsets.
+        :return: DiscoveryModelResult
+        """
+        result, error = self.ble_model_discovery_get_result_adaptive(epsilon_hit, Ta, Ts, ds, rho_max, max_time,
+                                                                     n_bytes_tx, self.adaptive.rel_tol,
+                                                                     self.adaptive.abs_tol, self.adaptive.n_initial,
+                                                                     self.adaptive.n_max)
+        values = np.array([result.discoveryLatency, result.chargeAdv, result.chargeScan])
+        errors = np.array([error.discoveryLatency, error.chargeAdv, error.chargeScan])
+        params = (epsilon_hit, Ta, Ts, ds, rho_max, max_time, n_bytes_tx)
+        if np.any(errors > np.maximum(self.adaptive.abs_tol, self.adaptive.rel_tol * np.abs(values))) \
+                and params not in self._adaptive_warned:
+            self._adaptive_warned.add(params)
+            logging.warning("BLE discovery model did not reach the tolerance with %d offsets for Ta=%s, Ts=%s, ds=%s, "
+                            "%d bytes: estimated relative errors %s", self.adaptive.n_max, Ta, Ts, ds, n_bytes_tx,
+                            (errors / np.abs(values)).tolist())
+        return result
+
     def ble_model_discovery_get_result(self, n_points, epsilon_hit, Ta, Ts, ds, rho_max, max_time):
         """
         Returns the model results (discovery-latency and discover-energy both for advertiser and scanner)
@@ -491,25 +837,23 @@ class BLEDiscovery:
         :param max_time: The maxmimum discovery latency possible. After that, the algorithm stops due to performance reasons
         :return: Discovery latency and the discovery energy spent by the advertiser and the scanner
         """
-        delta = (3.0 * Ts) / float(n_points)
-        phi = 0
-        result_single = DiscoveryModelResult()
-        result_joined = DiscoveryModelResult()
-        result_joined.chargeAdv = 0
-        result_joined.chargeScan = 0
-        result_joined.discoveryLatency = 0
-
-        for cnt in range(n_points):
-            result_single = self._ble_model_discovery_get_result_one_phi(epsilon_hit, Ta, Ts, ds, phi, rho_max,
-                                                                         max_time)
-            result_joined.discoveryLatency += result_single.discoveryLatency
-            result_joined.chargeAdv += result_single.chargeAdv
-            result_joined.chargeScan += result_single.chargeScan
-            phi += delta
-
-        result_joined.discoveryLatency /= float(n_points)
-        result_joined.chargeAdv /= float(n_points)
-        result_joined.chargeScan /= float(n_points)
+        if self.table is not None:
+            # the standard model equals the Alanezi one without additional payload
+            result = self.table.lookup(n_points, epsilon_hit, Ta, Ts, ds, rho_max, max_time, 0)
+            if result is not None:
+                return result
+
+        if self.adaptive is not None:
+            return self._ble_model_discovery_get_result_adaptive_mode(epsilon_hit, Ta, Ts, ds, rho_max, max_time, 0)
+
+        params = ("standard", n_points, epsilon_hit, Ta, Ts, ds, rho_max, max_time)
+        cached = self._cached_result(params)
+        if cached is not None:
+            return cached
+
+        result_joined = self._ble_model_discovery_get_result_joined(n_points, epsilon_hit, Ta, Ts, ds, rho_max,
+                                                                    max_time)
+        self._store_result(params, result_joined)
         return result_joined
 
     def ble_model_discovery_get_result_alanezi(self, n_points, epsilon_hit, Ta, Ts, ds, rho_max, max_time, n_bytes_tx):
@@ -534,23 +878,21 @@ class BLEDiscovery:
             :param n_bytes_tx: Privacy policy bytes to include in the advertisement/broadcast
             :return: Discovery latency and the discovery energy spent by the advertiser and the scanner
             """
-        delta = (3.0 * Ts) / float(n_points)
-        phi = 0
-        result_single = DiscoveryModelResult()
-        result_joined = DiscoveryModelResult()
-        result_joined.chargeAdv = 0
-        result_joined.chargeScan = 0
-        result_joined.discoveryLatency = 0
-
-        for cnt in range(n_points):
-            result_single = self._ble_model_discovery_get_result_one_phi_alanezi(epsilon_hit, Ta, Ts, ds, phi, rho_max,
-                                                                         max_time, n_bytes_tx)
-            result_joined.discoveryLatency += result_single.discoveryLatency
-            result_joined.chargeAdv += result_single.chargeAdv
-            result_joined.chargeScan += result_single.chargeScan
-            phi += delta
-
-        result_joined.discoveryLatency /= float(n_points)
-        result_joined.chargeAdv /= float(n_points)
-        result_joined.chargeScan /= float(n_points)
+        if self.table is not None:
+            result = self.table.lookup(n_points, epsilon_hit, Ta, Ts, ds, rho_max, max_time, n_bytes_tx)
+            if result is not None:
+                return result
+
+        if self.adaptive is not None:
+            return self._ble_model_discovery_get_result_adaptive_mode(epsilon_hit, Ta, Ts, ds, rho_max, max_time,
+                                                                      n_bytes_tx)
+
+        params = ("alanezi", n_points, epsilon_hit, Ta, Ts, ds, rho_max, max_time, n_bytes_tx)
+        cached = self._cached_result(params)
+        if cached is not None:
+            return cached
+
+        result_joined = self._ble_model_discovery_get_result_joined(n_points, epsilon_hit, Ta, Ts, ds, rho_max,
+                                                                    max_time, n_bytes_tx)
+        self._store_result(params, result_joined)
         return result_joined
@@ -0,0 +1,186 @@
+import atexit
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+'''
+Result cache for the BLE device discovery model. The discovery model is deterministic in its arguments, but expensive
+to evaluate (see ble_model_discovery.py), while the negotiation protocols query it with the same handful of
+parameter tuples over and over. Results are kept in an in-memory LRU and, optionally, in a JSON file on disk so that
+they survive across runs and processes. New results are written to disk in one go by flush(), at the end of a run
+(Network.end_run()) and at exit, so that sweeps do not rewrite the store on every new result.
+'''
+
+# Bump when the discovery model changes in a way that is not visible in the model source files below
+# (e.g., a different way of averaging over phi). Entries with a different stamp are discarded.
+DISCOVERY_MODEL_VERSION = 1
+
+# Modules whose source determines the discovery model results
+_MODEL_SOURCES = ("ble_model_discovery.py", "ble_model_scanning.py", "ble_model_connected.py",
+                  "ble_model_params_general.py", "ble_model_params_connected.py", "ble_model_params_scanning.py",
+                  "ble_model_params_connection_establishment.py", "ble_model_jit.py")
+
+
+def discovery_model_stamp():
+    """
+    Model-version stamp of the discovery model: the version number plus a digest of the model source files
+    (including all numerical parameters), so that cached results are invalidated whenever the model changes.
+    :return: Stamp string.
+    """
+    digest = hashlib.sha256()
+    model_dir = os.path.dirname(os.path.abspath(__file__))
+    for source in _MODEL_SOURCES:
+        with open(os.path.join(model_dir, source), 'rb') as source_file:
+            digest.update(source_file.read())
+    return f"{DISCOVERY_MODEL_VERSION}-{digest.hexdigest()[:16]}"
+
+
+class DiscoveryCache:
+    """
+    Thread-safe cache of discovery model results, keyed by the full parameter tuple of the model call.
+    Values are (discoveryLatency, chargeAdv, chargeScan) tuples.
+    """
+    def __init__(self, max_entries=256, path=None):
+        """
+        :param max_entries: Maximum number of results kept in memory (least recently used ones are evicted).
+        :param path: Path of the on-disk JSON store. If None, results are only kept in memory.
+        """
+        self.max_entries = max_entries
+        self.path = path
+        self.stamp = discovery_model_stamp()
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_entries = self._load() if path is not None else {}
+        # results not written to disk yet
+        self._pending = {}
+        if path is not None:
+            atexit.register(self.flush)
+
+    @staticmethod
+    def _key(params):
+        """
+        :param params: Parameter tuple of the model call.
+        :return: String key (also used as JSON object key on disk).
+        """
+        return repr(tuple(params))
+
+    def _load(self):
+        """
+        Load the on-disk store. Missing, unreadable or outdated (different model stamp) stores are ignored.
+        :return: Dictionary of stored results.
+        """
+        try:
+            with open(self.path, 'r') as cache_file:
+                data = json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+
+        if not isinstance(data, dict) or data.get("stamp") != self.stamp:
+            logging.debug("Discarding outdated BLE discovery cache %s", self.path)
+            return {}
+        return {key: tuple(value) for key, value in data.get("entries", {}).items()}
+
+    def _save(self):
+        """
+        Write the on-disk store atomically (write to a temporary file, then replace). Entries written in the meantime
+        by other processes are merged in first.
+        """
+        self._disk_entries = {**self._load(), **self._disk_entries}
+        directory = os.path.dirname(self.path) or '.'
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.discovery-', suffix='.json')
+            with os.fdopen(fd, 'w') as tmp_file:
+                json.dump({"stamp": self.stamp, "entries": self._disk_entries}, tmp_file)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.path)
+        except OSError as error:
+            # the cache is only an optimization, so do not fail the simulation
+            logging.warning("Could not write BLE discovery cache %s: %s", self.path, error)
+
+    def get(self, params):
+        """
+        Look up a result.
+        :param params: Parameter tuple of the model call.
+        :return: (discoveryLatency, chargeAdv, chargeScan) tuple or None if the result is not cached.
+        """
+        key = self._key(params)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            if key in self._disk_entries:
+                self.hits += 1
+                self._remember(key, self._disk_entries[key])
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, params, value):
+        """
+        Store a result (the on-disk store is only written by flush()).
+        :param params: Parameter tuple of the model call.
+        :param value: (discoveryLatency, chargeAdv, chargeScan) tuple.
+        """
+        key = self._key(params)
+        value = tuple(float(v) for v in value)
+        with self._lock:
+            self._remember(key, value)
+            if self.path is not None and self._disk_entries.get(key) != value:
+                self._disk_entries[key] = value
+                self._pending[key] = value
+
+    def flush(self):
+        """
+        Write the results stored since the last flush to the on-disk store (nothing to do for memory-only caches).
+        """
+        with self._lock:
+            if self._pending:
+                self._save()
+                logging.debug("Wrote %d new BLE discovery results to %s", len(self._pending), self.path)
+                self._pending = {}
+
+    def _remember(self, key, value):
+        """
+        Insert into the in-memory LRU (the lock must be held).
+        :param key: String key.
+        :param value: Result tuple.
+        """
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Drop all in-memory entries (the on-disk store is kept).
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# Caches shared by all BLEDiscovery instances (a new network object is created for every simulation run)
+_shared_caches = {}
+_shared_caches_lock = threading.Lock()
+
+
+def get_shared_cache(max_entries=256, path=None):
+    """
+    Get the process-wide cache for the given on-disk store path, creating it on first use.
+    :param max_entries: Maximum number of results kept in memory.
+    :param path: Path of the on-disk JSON store (None for memory only).
+    :return: DiscoveryCache object.
+    """
+    with _shared_caches_lock:
+        if path not in _shared_caches:
+            _shared_caches[path] = DiscoveryCache(max_entries, path)
+        return _shared_caches[path]
@@ -0,0 +1,251 @@
+import argparse
+import itertools
+import logging
+import os
+import threading
+
+import numpy as np
+from scipy.interpolate import RegularGridInterpolator
+from tqdm import tqdm
+
+from networks.bleemod_python.ble_model_discovery import BLEDiscovery, DiscoveryModelResult
+from networks.bleemod_python.ble_model_discovery_cache import discovery_model_stamp
+
+'''
+Precomputed lookup tables for the BLE device discovery model. The model is evaluated once over a regular grid of
+(advertising interval Ta, scan interval Ts, scan window ds, payload bytes n_bytes_tx) and the latency and charge
+surfaces are stored in a compressed .npz file. Queries inside the grid are answered by multilinear interpolation,
+queries outside the grid (or with different model settings) are left to the exact model. Like the parameter search
+(see ble_model_optimizer.py), the table leaves out scan windows that are not shorter than the scan interval: these
+nodes are not evaluated (NaN) and queries in their cells are left to the exact model as well.
+
+Error bound: when a table is built, the exact model is additionally evaluated at the midpoints of a sample of grid
+cells (the points furthest away from the grid nodes) and the largest relative error of the interpolated values is
+stored with the table (see DiscoveryTable.error_bound). The surfaces are piecewise smooth in Ta, Ts and ds (the
+model uses floor() of Ta/Ts), so the bound is empirical and only as good as the grid resolution: refine the axes
+where it is too large. The charges are affine in n_bytes_tx, so that axis interpolates (up to rounding) exactly.
+The bound is logged when a table is loaded, and a table whose bound exceeds the configured tolerance is not used
+(see DiscoveryTableSettings in util.py). With the default number of phi offsets, the scan charge varies by several
+percent between neighbouring parameter values (the offset sampling), so it limits the attainable bound. Queries at
+the grid nodes are exact, so the default grid of the build below is centred on the configured parameters.
+'''
+
+# Order of the stored surfaces along the last axis of DiscoveryTable.values
+QUANTITIES = ("discoveryLatency", "chargeAdv", "chargeScan")
+
+# Fixed model settings the table is built for (must match the query to use the table), see BLEDiscovery
+MODEL_SETTINGS = ("n_points", "epsilon_hit", "rho_max", "max_time")
+
+
+class DiscoveryTable:
+    """
+    Interpolation table of discovery model results over (Ta, Ts, ds, n_bytes_tx).
+    """
+    def __init__(self, axes, values, settings, error_bound, stamp):
+        """
+        :param axes: Tuple of the four strictly increasing grid axes (Ta, Ts, ds, n_bytes_tx).
+        :param values: Array of shape (len(Ta), len(Ts), len(ds), len(n_bytes_tx), 3) with the model results
+        (see QUANTITIES).
+        :param settings: Dictionary of the fixed model settings (see MODEL_SETTINGS).
+        :param error_bound: Dictionary of the largest relative interpolation error measured per quantity.
+        :param stamp: Discovery model stamp the table was built with (see ble_model_discovery_cache.py).
+        """
+        self.axes = tuple(np.asarray(axis, dtype=float) for axis in axes)
+        self.values = np.asarray(values, dtype=float)
+        self.settings = settings
+        self.error_bound = error_bound
+        self.stamp = stamp
+        self.hits = 0
+        self.misses = 0
+
+        # Axes with a single node cannot be interpolated along, the table is only valid exactly at that node
+        self._interpolated_axes = [i for i, axis in enumerate(self.axes) if len(axis) > 1]
+        self._interpolator = RegularGridInterpolator(tuple(self.axes[i] for i in self._interpolated_axes),
+                                                     np.squeeze(self.values, axis=tuple(
+                                                         i for i in range(4) if i not in self._interpolated_axes)),
+                                                     method='linear', bounds_error=False, fill_value=None)
+
+    def covers(self, Ta, Ts, ds, n_bytes_tx):
+        """
+        :return: True if the query point lies inside the grid.
+        """
+        return all(axis[0] <= value <= axis[-1] for axis, value in zip(self.axes, (Ta, Ts, ds, n_bytes_tx)))
+
+    def interpolate(self, Ta, Ts, ds, n_bytes_tx):
+        """
+        Interpolate the model results at a point inside the grid.
+        :return: Array of the interpolated values (see QUANTITIES).
+        """
+        point = (Ta, Ts, ds, n_bytes_tx)
+        return self._interpolator([[point[i] for i in self._interpolated_axes]])[0]
+
+    def lookup(self, n_points, epsilon_hit, Ta, Ts, ds, rho_max, max_time, n_bytes_tx=0):
+        """
+        Look up the model result (same arguments as BLEDiscovery.ble_model_discovery_get_result_alanezi()).
+        :return: DiscoveryModelResult or None if the query is outside the grid, in a cell with a left out node or
+        uses different model settings.
+        """
+        query_settings = {"n_points": n_points, "epsilon_hit": epsilon_hit, "rho_max": rho_max, "max_time": max_time}
+        if query_settings != self.settings or not self.covers(Ta, Ts, ds, n_bytes_tx):
+            self.misses += 1
+            return None
+        values = self.interpolate(Ta, Ts, ds, n_bytes_tx)
+        if not np.all(np.isfinite(values)):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        result = DiscoveryModelResult()
+        result.discoveryLatency, result.chargeAdv, result.chargeScan = (float(v) for v in values)
+        return result
+
+    def save(self, path):
+        """
+        Write the table to a compressed .npz file.
+        :param path: File path.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        np.savez_compressed(path, Ta=self.axes[0], Ts=self.axes[1], ds=self.axes[2], n_bytes_tx=self.axes[3],
+                            values=self.values,
+                            settings=np.array([self.settings[name] for name in MODEL_SETTINGS], dtype=float),
+                            error_bound=np.array([self.error_bound[name] for name in QUANTITIES], dtype=float),
+                            stamp=np.array(self.stamp))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read a table written by save().
+        :param path: File path.
+        :return: DiscoveryTable object.
+        """
+        with np.load(path) as data:
+            settings = dict(zip(MODEL_SETTINGS, data['settings'].tolist()))
+            settings["n_points"] = int(settings["n_points"])
+            return cls((data['Ta'], data['Ts'], data['ds'], data['n_bytes_tx']), data['values'], settings,
+                       dict(zip(QUANTITIES, data['error_bound'].tolist())), str(data['stamp']))
+
+    @classmethod
+    def build(cls, Ta_axis, Ts_axis, ds_axis, n_bytes_axis, n_points=100, epsilon_hit=0.9999, rho_max=0.01,
+              max_time=1000, n_check=64, seed=0):
+        """
+        Evaluate the exact discovery model over the grid (except for the nodes with ds >= Ts) and measure the
+        interpolation error.
+        :param Ta_axis: Advertising intervals [s].
+        :param Ts_axis: Scan intervals [s].
+        :param ds_axis: Scan windows [s].
+        :param n_bytes_axis: Additional advertising payload bytes (privacy policy size).
+        :param n_points: Number of phi offsets (see BLEDiscovery).
+        :param epsilon_hit: Hit probability the model iterates to (see BLEDiscovery).
+        :param rho_max: Maximum advertising delay [s].
+        :param max_time: Maximum discovery latency [s].
+        :param n_check: Number of grid cells whose midpoint is used to measure the interpolation error.
+        :param seed: Seed for selecting the checked cells.
+        :return: DiscoveryTable object.
+        """
+        axes = tuple(np.unique(np.asarray(axis, dtype=float)) for axis in (Ta_axis, Ts_axis, ds_axis, n_bytes_axis))
+        settings = {"n_points": int(n_points), "epsilon_hit": epsilon_hit, "rho_max": rho_max, "max_time": max_time}
+
+        # exact model without any cache
+        discovery = BLEDiscovery()
+
+        def evaluate(Ta, Ts, ds, n_bytes_tx):
+            result = discovery.ble_model_discovery_get_result_alanezi(n_points, epsilon_hit, Ta, Ts, ds, rho_max,
+                                                                      max_time, n_bytes_tx)
+            return [result.discoveryLatency, result.chargeAdv, result.chargeScan]
+
+        values = np.full(tuple(len(axis) for axis in axes) + (len(QUANTITIES),), np.nan)
+        nodes = [index for index in itertools.product(*(range(len(axis)) for axis in axes))
+                 if axes[2][index[2]] < axes[1][index[1]]]
+        for index in tqdm(nodes, desc="Building table"):
+            values[index] = evaluate(*(float(axis[i]) for axis, i in zip(axes, index)))
+
+        table = cls(axes, values, settings, dict.fromkeys(QUANTITIES, 0.0), discovery_model_stamp())
+
+        # Measure the interpolation error at the midpoints of the cells the table answers queries in
+        midpoints = [[float((axis[i] + axis[i + 1]) / 2.0) if len(axis) > 1 else float(axis[0])
+                      for axis, i in zip(axes, cell)]
+                     for cell in itertools.product(*(range(max(len(axis) - 1, 1)) for axis in axes))]
+        midpoints = [midpoint for midpoint in midpoints if np.all(np.isfinite(table.interpolate(*midpoint)))]
+        rng = np.random.default_rng(seed)
+        if len(midpoints) > n_check:
+            midpoints = [midpoints[i] for i in rng.choice(len(midpoints), size=n_check, replace=False)]
+        max_error = np.zeros(len(QUANTITIES))
+        for midpoint in tqdm(midpoints, desc="Measuring error"):
+            exact = np.array(evaluate(*midpoint))
+            interpolated = table.interpolate(*midpoint)
+            error = np.abs(interpolated - exact) / np.maximum(np.abs(exact), np.finfo(float).tiny)
+            max_error = np.maximum(max_error, error)
+        table.error_bound = dict(zip(QUANTITIES, max_error.tolist()))
+        return table
+
+
+# Tables shared by all BLEDiscovery instances, by path
+_shared_tables = {}
+_shared_tables_lock = threading.Lock()
+
+
+def get_shared_table(path, max_error=0.05):
+    """
+    Get the process-wide table stored at the given path, loading it on first use.
+    :param path: Path of the .npz table.
+    :param max_error: Largest accepted relative interpolation error of every quantity (see DiscoveryTable.error_bound),
+    None to accept any table.
+    :return: DiscoveryTable object or None if the table does not exist, was built for a different model or is not
+    accurate enough.
+    """
+    with _shared_tables_lock:
+        if (path, max_error) not in _shared_tables:
+            table = None
+            try:
+                table = DiscoveryTable.load(path)
+            except (OSError, ValueError, KeyError) as error:
+                logging.warning("Could not load BLE discovery table %s (%s), using the exact model", path, error)
+            if table is not None and table.stamp != discovery_model_stamp():
+                logging.warning("BLE discovery table %s was built for a different model version, "
+                                "using the exact model", path)
+                table = None
+            if table is not None:
+                logging.info("BLE discovery table %s: max. relative interpolation error %s", path, table.error_bound)
+                if max_error is not None and max(table.error_bound.values()) > max_error:
+                    logging.warning("BLE discovery table %s exceeds the max. relative interpolation error %s, using "
+                                    "the exact model", path, max_error)
+                    table = None
+            _shared_tables[(path, max_error)] = table
+        return _shared_tables[(path, max_error)]
+
+
+def _parse_axis(text):
+    """
+    Parse a grid axis given either as comma separated values or as start:stop:num (inclusive, linearly spaced).
+    :param text: Axis string.
+    :return: List of values.
+    """
+    if ':' in text:
+        start, stop, num = text.split(':')
+        return np.linspace(float(start), float(stop), int(num)).tolist()
+    return [float(value) for value in text.split(',')]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a BLE discovery lookup table.")
+    parser.add_argument("output", help="Path of the .npz table to write.")
+    # by default, a dense grid around the discovery parameters of config.yaml (Ta 0.25 s, Ts 5 s, ds 2 s)
+    parser.add_argument("--ta", default="0.2:0.3:9", help="Advertising intervals [s] (a,b,c or start:stop:num).")
+    parser.add_argument("--ts", default="4:6:9", help="Scan intervals [s] (a,b,c or start:stop:num).")
+    parser.add_argument("--ds", default="1.5:2.5:9", help="Scan windows [s] (a,b,c or start:stop:num).")
+    parser.add_argument("--bytes", default="0,217,639,1000", help="Payload bytes (a,b,c or start:stop:num).")
+    parser.add_argument("--n-points", type=int, default=100)
+    parser.add_argument("--epsilon-hit", type=float, default=0.9999)
+    parser.add_argument("--rho-max", type=float, default=0.01)
+    parser.add_argument("--max-time", type=float, default=1000)
+    parser.add_argument("--n-check", type=int, default=64, help="Number of cell midpoints used for the error bound.")
+    args = parser.parse_args()
+
+    discovery_table = DiscoveryTable.build(_parse_axis(args.ta), _parse_axis(args.ts), _parse_axis(args.ds),
+                                           _parse_axis(args.bytes), n_points=args.n_points,
+                                           epsilon_hit=args.epsilon_hit, rho_max=args.rho_max,
+                                           max_time=args.max_time, n_check=args.n_check)
+    discovery_table.save(args.output)
+    print(f"Wrote {args.output}, max. relative interpolation error: {discovery_table.error_bound}")
@@ -0,0 +1,311 @@
+import math
+
+import numpy as np
+
+from networks.bleemod_python.ble_model_params import *
+
+'''
+Optional compiled backend for the hottest BLE model kernels. If numba is installed, the functions below are compiled
+to machine code and used by BLEConnected, BLEScanner and BLEDiscovery; otherwise (or after set_enabled(False)) the
+model classes use their own Python code. The kernels are straight ports of the corresponding methods operating on
+plain numbers and arrays (no objects or enums), so that numba can compile them in nopython mode.
+misc/ble_jit_parity_testing.py checks that both backends agree.
+'''
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Whether numba is installed
+AVAILABLE = njit is not None
+
+# Whether the compiled kernels are used
+ENABLED = AVAILABLE
+
+# Event type numbers of the scan events (BLEModelSCEventType values)
+SC_EVENT_TYPE_NO_RECEPTION = 0
+SC_EVENT_TYPE_PASSIVE_SCANNING = 1
+SC_EVENT_TYPE_ACTIVE_SCANNING = 2
+SC_EVENT_TYPE_CON_REQ = 3
+SC_EVENT_TYPE_CON_REQ_OFFSET = 4
+SC_EVENT_TYPE_ABORTED = 5
+
+
+def set_enabled(enabled):
+    """
+    Switch between the compiled kernels and the Python implementation.
+    :param enabled: True to use the compiled kernels (only possible if numba is installed).
+    :return: Whether the compiled kernels are used now.
+    """
+    global ENABLED
+    ENABLED = bool(enabled) and AVAILABLE
+    return ENABLED
+
+
+def _jit(function):
+    """
+    Compile a kernel with numba if available (the compiled code is cached on disk), otherwise keep the Python function.
+    :param function: Kernel function.
+    :return: Compiled or original function.
+    """
+    if njit is None:
+        return function
+    return njit(cache=True)(function)
+
+
+@_jit
+def charge_sequences(master_or_slave, Tc, n_seq, n_rx, n_tx, i_tx):
+    """
+    See BLEConnected.ble_e_model_c_get_charge_sequences().
+    :param i_tx: TX current of the Tx power level.
+    """
+    charge = 0.0
+
+    for cnt in range(n_seq):
+        if cnt == 0 and not master_or_slave:
+            charge += (BLE_E_MOD_C_DPRERX_SL1 + (BLE_E_MOD_G_SCA * 2.0 / 1.0e6) * Tc) * BLE_E_MOD_C_IRX
+        else:
+            charge += BLE_E_MOD_C_DPRERX * BLE_E_MOD_C_IRX
+
+        charge += 8.0e-6 * n_rx[cnt] * BLE_E_MOD_C_IRX
+        charge += (BLE_E_MOD_C_DPRETX + 8.0e-6 * n_tx[cnt]) * i_tx
+        charge += BLE_E_MOD_C_DRXTX * BLE_E_MOD_C_IRXTX
+        charge += BLE_E_MOD_C_DTXRX * BLE_E_MOD_C_ITXRX
+        charge += BLE_E_MOD_C_QTO
+
+    if master_or_slave:
+        charge -= BLE_E_MOD_C_DRXTX * BLE_E_MOD_C_IRXTX
+    else:
+        charge -= BLE_E_MOD_C_DTXRX * BLE_E_MOD_C_ITXRX
+
+    return charge
+
+
+@_jit
+def duration_sequences(master_or_slave, Tc, n_seq, n_rx, n_tx):
+    """
+    See BLEConnected.ble_e_model_c_get_duration_sequences().
+    """
+    duration = 0.0
+
+    for cnt in range(n_seq):
+        if cnt == 0 and not master_or_slave:
+            duration += BLE_E_MOD_C_DPRERX_SL1 + BLE_E_MOD_G_SCA * 2.0 / 1.0e6 * Tc
+        else:
+            duration += BLE_E_MOD_C_DPRERX
+
+        duration += 8.0e-6 * n_rx[cnt]
+        duration += BLE_E_MOD_C_DPRETX + 8.0e-6 * n_tx[cnt]
+        duration += BLE_E_MOD_C_DRXTX
+        duration += BLE_E_MOD_C_DTXRX
+
+    if master_or_slave:
+        duration -= BLE_E_MOD_C_DRXTX
+    else:
+        duration -= BLE_E_MOD_C_DTXRX
+
+    return duration
+
+
+@_jit
+def charge_scan_event(scan_window, event_type, n_bytes_tx, n_bytes_rx, reception_after_time):
+    """
+    See BLEScanner.ble_e_model_sc_get_charge_scan_event().
+    :param event_type: Event type number (BLEModelSCEventType value).
+    """
+    charge = BLE_E_MOD_SCAN_DCHCH * BLE_E_MOD_SCAN_ICHCH
+
+    if event_type == SC_EVENT_TYPE_NO_RECEPTION:
+        charge += (scan_window + BLE_E_MOD_SCAN_DWOFFSET) * BLE_E_MOD_SCAN_IRX
+
+    elif event_type == SC_EVENT_TYPE_ABORTED:
+        if scan_window < reception_after_time:
+            charge += (scan_window + BLE_E_MOD_SCAN_DWOFFSET) * BLE_E_MOD_SCAN_IRX
+        else:
+            charge += (reception_after_time + BLE_E_MOD_SCAN_DWOFFSET) * BLE_E_MOD_SCAN_IRX
+
+    elif event_type == SC_EVENT_TYPE_PASSIVE_SCANNING:
+        charge += (scan_window + BLE_E_MOD_SCAN_DWOFFSET) * BLE_E_MOD_SCAN_IRX
+
+    elif event_type == SC_EVENT_TYPE_ACTIVE_SCANNING:
+        charge += (scan_window + BLE_E_MOD_SCAN_DWOFFSET - BLE_E_MOD_SCAN_DRXTX - BLE_E_MOD_SCAN_DPRETX -
+                   8e-6 * n_bytes_tx - BLE_E_MOD_SCAN_DTXRX - BLE_E_MOD_SCAN_DPRERX - 8e-6 * n_bytes_rx -
+                   BLE_E_MOD_SCAN_DRXRX) * BLE_E_MOD_SCAN_IRX + BLE_E_MOD_SCAN_DRXTX * BLE_E_MOD_SCAN_IRXTX + (
+                          BLE_E_MOD_SCAN_DPRETX + 8e-6 * n_bytes_tx) * BLE_E_MOD_SCAN_ITX + \
+            BLE_E_MOD_SCAN_DTXRX * BLE_E_MOD_SCAN_ITXRX + (
+                          BLE_E_MOD_SCAN_DPRERX + 8e-6 * n_bytes_rx) * BLE_E_MOD_SCAN_IRXS + \
+            BLE_E_MOD_SCAN_DRXRX * BLE_E_MOD_SCAN_IRXRX + BLE_E_MOD_SCAN_QCRX + BLE_E_MOD_SCAN_QCTX
+
+    elif event_type == SC_EVENT_TYPE_CON_REQ:
+        charge += (scan_window - reception_after_time) * BLE_E_MOD_SCAN_IRX + \
+            BLE_E_MOD_SCAN_DRXTX * BLE_E_MOD_SCAN_IRXTX + \
+            (BLE_E_MOD_SCAN_DPRETX + 8e-6 * n_bytes_tx) * BLE_E_MOD_SCAN_ITX + BLE_E_MOD_SCAN_QCTX
+
+    elif event_type == SC_EVENT_TYPE_CON_REQ_OFFSET:
+        charge = (BLE_E_MOD_SCAN_DRXTX * BLE_E_MOD_SCAN_IRXTX + (
+                BLE_E_MOD_SCAN_DPRETX + 8e-6 * n_bytes_tx) * BLE_E_MOD_SCAN_ITX)
+
+    return charge
+
+
+@_jit
+def _gausscdf(x):
+    """
+    See BLEDiscovery._ble_model_discovery_gausscdf().
+    """
+    a1 = 0.254829592
+    a2 = -0.284496736
+    a3 = 1.421413741
+    a4 = -1.453152027
+    a5 = 1.061405429
+    p = 0.3275911
+
+    sign = 1
+    if x < 0:
+        sign = -1
+    x = abs(x) / math.sqrt(2.0)
+
+    t = 1.0 / (1.0 + p * x)
+    y = 1.0 - (((((a5 * t + a4) * t) + a3) * t + a2) * t + a1) * t * math.exp(-x * x)
+    return 0.5 * (1.0 + sign * y)
+
+
+@_jit
+def _approx_probab(mu, n, sigma, t, Ta_ideal, rho_max):
+    """
+    See BLEDiscovery._ble_model_discovery_get_approx_probab().
+    """
+    if n == 0:
+        return 0.0 if t < Ta_ideal else 1.0
+    elif n == 1:
+        if Ta_ideal < t < Ta_ideal + rho_max:
+            return (t - Ta_ideal) / rho_max
+        elif t < Ta_ideal:
+            return 0.0
+        else:
+            return 1.0
+    elif n == 2:
+        if t >= Ta_ideal:
+            if Ta_ideal < t < Ta_ideal + rho_max:
+                return (t - Ta_ideal) * (t - Ta_ideal) / (2.0 * rho_max * rho_max)
+            elif t < Ta_ideal + 2.0 * rho_max:
+                return 1 - (Ta_ideal + 2.0 * rho_max - t) * (Ta_ideal + 2.0 * rho_max - t) / (
+                        2.0 * rho_max * rho_max)
+            else:
+                return 1.0
+        else:
+            return 0.0
+    else:
+        return _gausscdf((t - mu) / sigma)
+
+
+@_jit
+def discovery_one_phi(epsilon_hit, Ta, Ts, ds, phi, rho_max, max_time, q_channels, t39_idle, q39_idle):
+    """
+    See BLEDiscovery._ble_model_discovery_get_result_one_phi[_alanezi]().
+    :param q_channels: Array of the charges of advertising events received on channel 37, 38 and 39
+    (see BLEDiscovery._ble_model_discovery_advertising_charges()).
+    :param t39_idle: Duration of an idle advertising event.
+    :param q39_idle: Charge of an idle advertising event.
+    :return: Discovery latency, advertiser charge and scanner charge
+    """
+    p_cumm_miss = 1.0
+    n = 0
+    t_exp = 0.0
+    charge_adv_exp = 0.0
+    charge_scan_exp = 0.0
+    scan_energy_before_advertising = 0.0
+
+    q_no_reception = charge_scan_event(ds, SC_EVENT_TYPE_NO_RECEPTION, 0, 0, 0.0)
+
+    while (1 - p_cumm_miss < epsilon_hit) and (t_exp < max_time):
+        Ta_ideal = phi + float(n) * Ta
+        Ta_real = Ta_ideal + float(n) * rho_max / 2.0
+
+        k_min = math.floor(Ta_ideal / Ts)
+        k_max = math.floor((Ta_ideal + float(n) * rho_max) / Ts)
+
+        p_hit = 0.0
+
+        n_scan_events_before_advertising = math.floor(phi / Ts)
+        scan_energy_before_advertising = float(n_scan_events_before_advertising) * q_no_reception
+
+        scan_time_on_edge = phi - float(n_scan_events_before_advertising) * Ts
+        if scan_time_on_edge > ds:
+            scan_energy_before_advertising += q_no_reception
+        else:
+            scan_energy_before_advertising += charge_scan_event(ds, SC_EVENT_TYPE_ABORTED, 0, 0,
+                                                                ds - scan_time_on_edge)
+
+        for k in range(k_min, k_max + 1):
+            channel = k % 3
+
+            if channel == 0:
+                d_early = 0.0
+                d_late = 8e-6 * BLE_E_MOD_CE_ADV_IND_PKG_LEN
+            elif channel == 1:
+                d_early = 8e-6 * BLE_E_MOD_CE_ADV_IND_PKG_LEN + 150e-6
+                d_late = 2.0 * 8e-6 * BLE_E_MOD_CE_ADV_IND_PKG_LEN + 150e-6
+            else:
+                d_early = 2.0 * (8e-6 * BLE_E_MOD_CE_ADV_IND_PKG_LEN + 150e-6)
+                d_late = 3.0 * 8e-6 * BLE_E_MOD_CE_ADV_IND_PKG_LEN + 2.0 * 150e-6
+
+            p_k = _approx_probab(Ta_real, n, math.sqrt(float(n) / 12.0) * rho_max,
+                                 float(k) * Ts + ds - d_late, Ta_ideal, rho_max) - \
+                _approx_probab(Ta_real, n, math.sqrt(float(n) / 12.0) * rho_max,
+                               float(k) * Ts - d_early, Ta_ideal, rho_max)
+
+            p_hit += p_k
+
+            if channel == 0:
+                current_t = float(n) * (Ta + rho_max / 2.0) + 8e-6 * BLE_E_MOD_CE_ADV_IND_PKG_LEN
+            elif channel == 1:
+                current_t = float(n) * (Ta + rho_max / 2.0) + 2.0 * 8e-6 * BLE_E_MOD_CE_ADV_IND_PKG_LEN + 150e-6
+            else:
+                current_t = float(n) * (
+                        Ta + rho_max / 2.0) + 3.0 * 8e-6 * BLE_E_MOD_CE_ADV_IND_PKG_LEN + 2.0 * 150e-6
+
+            t_exp += p_cumm_miss * p_k * current_t
+
+            if n >= 1:
+                charge_adv_exp += p_cumm_miss * p_k * (float(n) - 1) * q39_idle
+                charge_adv_exp += p_cumm_miss * p_k * (float(n) - 1) * (Ta - t39_idle) * BLE_E_MOD_G_ISL
+
+            charge_adv_exp += p_cumm_miss * p_k * q_channels[channel]
+
+            n_full_scan_events = math.floor((current_t + phi) / Ts)
+            time_left = (phi + current_t) - n_full_scan_events * Ts
+            charge_scan_exp += p_cumm_miss * p_k * float(n_full_scan_events) * q_no_reception
+            if time_left > ds:
+                charge_scan_exp += p_cumm_miss * p_k * q_no_reception
+            else:
+                charge_scan_exp += charge_scan_event(ds, SC_EVENT_TYPE_ABORTED, 0, 0, time_left)
+
+        p_cumm_miss *= (1 - p_hit)
+
+        if t_exp > max_time:
+            t_exp = max_time
+            break
+
+        n += 1
+
+    if t_exp > max_time:
+        t_exp = max_time
+
+    return t_exp, charge_adv_exp, charge_scan_exp - scan_energy_before_advertising
+
+
+@_jit
+def discovery_phis(epsilon_hit, Ta, Ts, ds, phis, rho_max, max_time, q_channels, t39_idle, q39_idle):
+    """
+    Evaluate discovery_one_phi() for an array of offsets phi.
+    :return: Arrays of discovery latencies, advertiser charges and scanner charges
+    """
+    latencies = np.empty(len(phis))
+    charges_adv = np.empty(len(phis))
+    charges_scan = np.empty(len(phis))
+    for i in range(len(phis)):
+        latencies[i], charges_adv[i], charges_scan[i] = discovery_one_phi(epsilon_hit, Ta, Ts, ds, phis[i], rho_max,
+                                                                          max_time, q_channels, t39_idle, q39_idle)
+    return latencies, charges_adv, charges_scan
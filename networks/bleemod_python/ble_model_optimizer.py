@@ -0,0 +1,234 @@
+import argparse
+import itertools
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import yaml
+
+from networks.bleemod_python.ble_model_connected import BLE_E_MODE_INT_MAXSEQUENCES
+from networks.bleemod_python.ble_model_discovery import BLEDiscovery
+from networks.bleemod_python.ble_model_discovery_table import get_shared_table
+from networks.bleemod_python.ble_model_profile import get_energy_profile
+
+from util import get_settings
+
+'''
+Search for BLE advertising/scan parameters (advertising interval Ta, scan interval Ts, scan window ds) and privacy
+policy (PP) fragmentation that minimize the combined energy of the privacy assistant (PA, the advertiser) and the
+owner's IoT device (the scanner) for exchanging a PP under a latency constraint.
+
+Cost model of one PP exchange with fragment size f and PP size S (n = ceil(S / f) fragments):
+ - The PA advertises the first fragment (f bytes, or S if smaller) until the owner discovers it
+   (discovery model: PA charge chargeAdv, owner charge chargeScan, latency discoveryLatency).
+ - If there are further fragments, the owner connects (connection establishment, owner = master, PA = slave) and the
+   PA sends the remaining fragments in connection events of up to BLE_E_MODE_INT_MAXSEQUENCES sequences each,
+   one connection interval per event.
+All candidates are evaluated in parallel processes with the (vectorized, optionally compiled or tabulated) discovery
+model. The best candidates are written as presets for the BLE section of config.yaml.
+
+Usage: python -m networks.bleemod_python.ble_model_optimizer presets.yaml --max-latency 1,2,5
+'''
+
+# Connection interval used for the connected-mode exchange (as in the negotiation protocols)
+CONNECTION_INTERVAL = 0.1  # s
+
+
+@dataclass(frozen=True)
+class Candidate:
+    """
+    Evaluated combination of advertising/scan parameters and PP fragment size.
+    """
+    adv_interval: float
+    scan_interval: float
+    scan_window: float
+    fragment_size: int
+    latency: float  # s
+    pa_energy: float  # Ws
+    owner_energy: float  # Ws
+
+    @property
+    def energy(self):
+        """
+        :return: Combined PA and owner energy [Ws]
+        """
+        return self.pa_energy + self.owner_energy
+
+
+# Per-process discovery model (created on first use in every worker)
+_discovery = None
+
+
+def _get_discovery(table_path):
+    """
+    :param table_path: Optional discovery table path (see ble_model_discovery_table.py).
+    :return: BLEDiscovery object of this process.
+    """
+    global _discovery
+    if _discovery is None:
+        _discovery = BLEDiscovery(table=get_shared_table(table_path) if table_path else None)
+    return _discovery
+
+
+def evaluate_candidate(adv_interval, scan_interval, scan_window, fragment_size, pp_size, voltage, discovery_settings,
+                       table_path=None):
+    """
+    Evaluate the PP exchange cost of one candidate (see the module description for the cost model).
+    :param adv_interval: Advertising interval Ta [s]
+    :param scan_interval: Scan interval Ts [s]
+    :param scan_window: Scan window ds [s]
+    :param fragment_size: PP fragment size [bytes]
+    :param pp_size: PP size [bytes]
+    :param voltage: Supply voltage [V]
+    :param discovery_settings: DiscoverySettings (n_points, epsilon_hit, rho_max and max_time are used).
+    :param table_path: Optional discovery table path.
+    :return: Candidate object.
+    """
+    profile = get_energy_profile()
+    n_fragments = max(1, math.ceil(pp_size / fragment_size))
+    first_fragment = min(pp_size, fragment_size)
+
+    result = _get_discovery(table_path).ble_model_discovery_get_result_alanezi(
+        discovery_settings.n_points, discovery_settings.epsilon_hit, adv_interval, scan_interval, scan_window,
+        discovery_settings.rho_max, discovery_settings.max_time, first_fragment)
+    latency = result.discoveryLatency
+    pa_charge = result.chargeAdv
+    owner_charge = result.chargeScan
+
+    if n_fragments > 1:
+        # owner (scanner) initiates the connection as master, the PA (advertiser) is the slave
+        pa_charge += profile.charge_connection_procedure(1, 0, 0, 0, CONNECTION_INTERVAL)
+        owner_charge += profile.charge_connection_procedure(1, 0, 1, 0, CONNECTION_INTERVAL)
+        latency += profile.duration_connection_procedure(1, 0, 1, 0, CONNECTION_INTERVAL)
+
+        remaining = [fragment_size] * (n_fragments - 2) + [pp_size - fragment_size * (n_fragments - 1)]
+        for start in range(0, len(remaining), BLE_E_MODE_INT_MAXSEQUENCES):
+            fragments = remaining[start:start + BLE_E_MODE_INT_MAXSEQUENCES]
+            no_payload = [0] * len(fragments)
+            pa_charge += profile.charge_constant_parts + profile.charge_sequences(0, CONNECTION_INTERVAL, no_payload,
+                                                                                  fragments)
+            owner_charge += profile.charge_constant_parts + profile.charge_sequences(1, CONNECTION_INTERVAL,
+                                                                                     fragments, no_payload)
+            latency += CONNECTION_INTERVAL
+
+    return Candidate(adv_interval, scan_interval, scan_window, fragment_size, latency, pa_charge * voltage,
+                     owner_charge * voltage)
+
+
+def _evaluate(arguments):
+    """
+    Process pool entry point.
+    :param arguments: Argument tuple of evaluate_candidate().
+    :return: Candidate object.
+    """
+    return evaluate_candidate(*arguments)
+
+
+def search(adv_intervals, scan_intervals, scan_windows, fragment_sizes, pp_size=None, voltage=None,
+           discovery_settings=None, table_path=None, workers=None):
+    """
+    Evaluate all combinations of the given parameter values. The discovery model describes periodic scanning, so
+    combinations with a scan window not shorter than the scan interval are skipped.
+    :param adv_intervals: Advertising intervals Ta [s]
+    :param scan_intervals: Scan intervals Ts [s]
+    :param scan_windows: Scan windows ds [s]
+    :param fragment_sizes: PP fragment sizes [bytes]
+    :param pp_size: PP size [bytes]. Defaults to the Alanezi user PP size from config.yaml.
+    :param voltage: Supply voltage [V]. Defaults to the BLE voltage from config.yaml.
+    :param discovery_settings: DiscoverySettings. Defaults to BLE.discovery from config.yaml.
+    :param table_path: Optional discovery table path (see ble_model_discovery_table.py).
+    :param workers: Number of worker processes (None: number of CPUs, 1: evaluate in this process).
+    :return: List of Candidate objects.
+    """
+    settings = get_settings()
+    pp_size = settings.alanezi.user_pp_size if pp_size is None else pp_size
+    voltage = settings.ble.voltage if voltage is None else voltage
+    discovery_settings = settings.ble.discovery if discovery_settings is None else discovery_settings
+
+    arguments = [(Ta, Ts, ds, fragment_size, pp_size, voltage, discovery_settings, table_path)
+                 for Ta, Ts, ds, fragment_size in itertools.product(adv_intervals, scan_intervals, scan_windows,
+                                                                    fragment_sizes)
+                 if ds < Ts]
+
+    if workers == 1:
+        return [_evaluate(argument) for argument in arguments]
+    chunk_size = max(1, len(arguments) // (4 * (workers or os.cpu_count() or 1)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_evaluate, arguments, chunksize=chunk_size))
+
+
+def best_candidate(candidates, max_latency):
+    """
+    :param candidates: List of Candidate objects.
+    :param max_latency: Maximum PP exchange latency [s].
+    :return: Feasible candidate with the minimum combined energy or None if no candidate meets the latency constraint.
+    """
+    # negative charges mean the discovery model is used outside its range of validity
+    feasible = [candidate for candidate in candidates
+                if candidate.latency <= max_latency and candidate.pa_energy >= 0 and candidate.owner_energy >= 0]
+    return min(feasible, key=lambda candidate: (candidate.energy, candidate.latency)) if feasible else None
+
+
+def presets(candidates, max_latencies, discovery_settings):
+    """
+    Build config presets for the BLE section, one per latency constraint.
+    :param candidates: List of Candidate objects.
+    :param max_latencies: Latency constraints [s].
+    :param discovery_settings: DiscoverySettings the candidates were evaluated with.
+    :return: Dictionary of presets (preset name -> BLE settings).
+    """
+    result = {}
+    for max_latency in max_latencies:
+        candidate = best_candidate(candidates, max_latency)
+        if candidate is None:
+            continue
+        result[f"max_latency_{max_latency:g}s"] = {
+            "discovery": {"n_points": discovery_settings.n_points, "epsilon_hit": discovery_settings.epsilon_hit,
+                          "adv_interval": candidate.adv_interval, "scan_interval": candidate.scan_interval,
+                          "scan_window": candidate.scan_window, "rho_max": discovery_settings.rho_max,
+                          "max_time": discovery_settings.max_time},
+            "pp_fragment_size": candidate.fragment_size,
+            # expected cost of one PP exchange (informational)
+            "expected": {"latency": candidate.latency, "pa_energy": candidate.pa_energy,
+                         "owner_energy": candidate.owner_energy},
+        }
+    return result
+
+
+def _parse_values(text, kind=float):
+    """
+    :param text: Comma separated values.
+    :param kind: Value type.
+    :return: List of values.
+    """
+    return [kind(value) for value in text.split(',')]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search BLE advertising/scan parameters and PP fragmentation.")
+    parser.add_argument("output", help="YAML file to write the BLE presets to.")
+    parser.add_argument("--max-latency", default="1,2,5,10", help="Latency constraints [s], one preset each.")
+    parser.add_argument("--ta", default="0.02,0.05,0.1,0.25,0.5,1.0", help="Advertising intervals [s].")
+    parser.add_argument("--ts", default="0.5,1,2,5", help="Scan intervals [s].")
+    parser.add_argument("--ds", default="0.05,0.1,0.25,0.5,1,2,5", help="Scan windows [s].")
+    parser.add_argument("--fragments", default="31,64,128,251", help="PP fragment sizes [bytes].")
+    parser.add_argument("--pp-size", type=int, default=None, help="PP size [bytes] (default: Alanezi user PP).")
+    parser.add_argument("--table", default=None, help="Discovery lookup table to use (see ble_model_discovery_table).")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes.")
+    args = parser.parse_args()
+
+    discovery_config = get_settings().ble.discovery
+    evaluated = search(_parse_values(args.ta), _parse_values(args.ts), _parse_values(args.ds),
+                       _parse_values(args.fragments, int), pp_size=args.pp_size, discovery_settings=discovery_config,
+                       table_path=args.table, workers=args.workers)
+    ble_presets = presets(evaluated, _parse_values(args.max_latency), discovery_config)
+
+    with open(args.output, 'w') as output_file:
+        output_file.write("# BLE presets generated by ble_model_optimizer.py; copy the 'discovery' settings of a "
+                          "preset into the BLE section of config.yaml\n")
+        yaml.safe_dump({"presets": ble_presets}, output_file, sort_keys=False)
+
+    for name, preset in ble_presets.items():
+        print(name, preset["discovery"], "fragment size:", preset["pp_fragment_size"], preset["expected"])
+    print(f"Evaluated {len(evaluated)} candidates, wrote {len(ble_presets)} presets to {args.output}")
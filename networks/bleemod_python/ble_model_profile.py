@@ -0,0 +1,185 @@
+import threading
+
+import numpy as np
+
+from networks.bleemod_python.ble_model_params import *
+from networks.bleemod_python.ble_model_connected import BLEConnected
+from networks.bleemod_python.ble_model_connection_establishment import BLEConnectionEstablishment
+
+'''
+BLE energy profile: the parts of the BLE energy model used by the negotiation protocols, compiled once from the model
+parameters (see ble_model_params*.py).
+ - The charge and duration of the constant parts of a connection event are constants.
+ - Connection establishment / update procedures only depend on a handful of numbers, their charge and duration are
+   computed once per argument combination.
+ - Communication sequences are evaluated with array arithmetic over any number of (rx, tx) byte counts at once.
+Every value is computed with the same floating point operations (in the same order) as the BLEConnected and
+BLEConnectionEstablishment methods, so the results are identical to calling those.
+Only the Tx power level supported by the model (3) is compiled in.
+'''
+
+
+class BLEEnergyProfile:
+    """
+    Precomputed BLE energy model for the connected state and connection procedures.
+    """
+    def __init__(self):
+        connected = BLEConnected()
+        self.connection_establishment = BLEConnectionEstablishment()
+
+        # Constant parts of a connection event (head, preprocessing, transient state, postprocessing, tail)
+        self.charge_constant_parts = connected.ble_e_model_c_get_charge_constant_parts()
+        self.duration_constant_parts = connected.ble_e_model_c_get_duration_constant_parts()
+
+        # Per-sequence terms of the communication sequences (see BLEConnected.ble_e_model_c_get_charge_sequences())
+        self._charge_prerx = BLE_E_MOD_C_DPRERX * BLE_E_MOD_C_IRX
+        self._charge_rxtx = BLE_E_MOD_C_DRXTX * BLE_E_MOD_C_IRXTX
+        self._charge_txrx = BLE_E_MOD_C_DTXRX * BLE_E_MOD_C_ITXRX
+
+        # Memoized connection procedures and scalar sequence results
+        self._procedure_charges = {}
+        self._procedure_durations = {}
+        self._sequence_charges = {}
+        self._sequence_durations = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _byte_counts(n_rx, n_tx):
+        """
+        :param n_rx: Bytes received per sequence (sequences along the last axis).
+        :param n_tx: Bytes sent per sequence (sequences along the last axis).
+        :return: Broadcast integer arrays with at least one dimension.
+        """
+        return np.broadcast_arrays(np.atleast_1d(np.asarray(n_rx)), np.atleast_1d(np.asarray(n_tx)))
+
+    def charge_sequences_array(self, master_or_slave, Tc, n_rx, n_tx):
+        """
+        Vectorized BLEConnected.ble_e_model_c_get_charge_sequences() (Tx power level 3).
+        :param master_or_slave: 1=>master, 0=>Slave.
+        :param Tc: Connection interval
+        :param n_rx: Array of bytes received, the last axis runs over the sequences of one connection event.
+        :param n_tx: Array of bytes sent, the last axis runs over the sequences of one connection event.
+        :return: Array of charges consumed by the sequences [C] (one per connection event, i.e., the last axis removed)
+        """
+        n_rx, n_tx = self._byte_counts(n_rx, n_tx)
+        charge = np.zeros(n_rx.shape[:-1])
+
+        for cnt in range(n_rx.shape[-1]):
+            if cnt == 0 and not master_or_slave:
+                charge += (BLE_E_MOD_C_DPRERX_SL1 + (BLE_E_MOD_G_SCA * 2.0 / 1.0e6) * Tc) * BLE_E_MOD_C_IRX
+            else:
+                charge += self._charge_prerx
+            charge += 8.0e-6 * n_rx[..., cnt] * BLE_E_MOD_C_IRX
+            charge += (BLE_E_MOD_C_DPRETX + 8.0e-6 * n_tx[..., cnt]) * BLE_E_MOD_C_ITX
+            charge += self._charge_rxtx
+            charge += self._charge_txrx
+            charge += BLE_E_MOD_C_QTO
+
+        # Remove leftover IFS
+        charge -= self._charge_rxtx if master_or_slave else self._charge_txrx
+        return charge
+
+    def duration_sequences_array(self, master_or_slave, Tc, n_rx, n_tx):
+        """
+        Vectorized BLEConnected.ble_e_model_c_get_duration_sequences().
+        :param master_or_slave: 1=>master, 0=>Slave.
+        :param Tc: Connection interval
+        :param n_rx: Array of bytes received, the last axis runs over the sequences of one connection event.
+        :param n_tx: Array of bytes sent, the last axis runs over the sequences of one connection event.
+        :return: Array of durations of the sequences [s] (one per connection event, i.e., the last axis removed)
+        """
+        n_rx, n_tx = self._byte_counts(n_rx, n_tx)
+        duration = np.zeros(n_rx.shape[:-1])
+
+        for cnt in range(n_rx.shape[-1]):
+            if cnt == 0 and not master_or_slave:
+                duration += BLE_E_MOD_C_DPRERX_SL1 + BLE_E_MOD_G_SCA * 2.0 / 1.0e6 * Tc
+            else:
+                duration += BLE_E_MOD_C_DPRERX
+            duration += 8.0e-6 * n_rx[..., cnt]
+            duration += BLE_E_MOD_C_DPRETX + 8.0e-6 * n_tx[..., cnt]
+            duration += BLE_E_MOD_C_DRXTX
+            duration += BLE_E_MOD_C_DTXRX
+
+        # Remove leftover IFS
+        duration -= BLE_E_MOD_C_DRXTX if master_or_slave else BLE_E_MOD_C_DTXRX
+        return duration
+
+    def charge_sequences(self, master_or_slave, Tc, n_rx, n_tx):
+        """
+        Charge of the communication sequences of one connection event (memoized).
+        :param master_or_slave: 1=>master, 0=>Slave.
+        :param Tc: Connection interval
+        :param n_rx: List of bytes received per sequence.
+        :param n_tx: List of bytes sent per sequence.
+        :return: Charge consumed by the sequences [C]
+        """
+        key = (master_or_slave, Tc, tuple(n_rx), tuple(n_tx))
+        charge = self._sequence_charges.get(key)
+        if charge is None:
+            charge = float(self.charge_sequences_array(master_or_slave, Tc, n_rx, n_tx))
+            with self._lock:
+                self._sequence_charges[key] = charge
+        return charge
+
+    def duration_sequences(self, master_or_slave, Tc, n_rx, n_tx):
+        """
+        Duration of the communication sequences of one connection event (memoized).
+        :param master_or_slave: 1=>master, 0=>Slave.
+        :param Tc: Connection interval
+        :param n_rx: List of bytes received per sequence.
+        :param n_tx: List of bytes sent per sequence.
+        :return: Time taken by the communication sequences [s]
+        """
+        key = (master_or_slave, Tc, tuple(n_rx), tuple(n_tx))
+        duration = self._sequence_durations.get(key)
+        if duration is None:
+            duration = float(self.duration_sequences_array(master_or_slave, Tc, n_rx, n_tx))
+            with self._lock:
+                self._sequence_durations[key] = duration
+        return duration
+
+    def charge_connection_procedure(self, establishment_or_update, scan_type, master_or_slave, Tc_old, Tc_new):
+        """
+        See BLEConnectionEstablishment.ble_e_model_ce_get_charge_for_connection_procedure() (computed once per
+        argument combination).
+        :return: Charge consumed by the procedure
+        """
+        key = (establishment_or_update, scan_type, master_or_slave, Tc_old, Tc_new)
+        charge = self._procedure_charges.get(key)
+        if charge is None:
+            charge = self.connection_establishment.ble_e_model_ce_get_charge_for_connection_procedure(*key)
+            with self._lock:
+                self._procedure_charges[key] = charge
+        return charge
+
+    def duration_connection_procedure(self, establishment_or_update, scan_type, master_or_slave, Tc_old, Tc_new):
+        """
+        See BLEConnectionEstablishment.ble_e_model_ce_get_duration_for_connection_procedure() (computed once per
+        argument combination).
+        :return: Time consumed by the procedure
+        """
+        key = (establishment_or_update, scan_type, master_or_slave, Tc_old, Tc_new)
+        duration = self._procedure_durations.get(key)
+        if duration is None:
+            duration = self.connection_establishment.ble_e_model_ce_get_duration_for_connection_procedure(*key)
+            with self._lock:
+                self._procedure_durations[key] = duration
+        return duration
+
+
+# Profile shared by all BLE network objects and protocols (the model parameters are module constants)
+_profile = None
+_profile_lock = threading.Lock()
+
+
+def get_energy_profile():
+    """
+    Get the process-wide BLE energy profile, compiling it on first use.
+    :return: BLEEnergyProfile object.
+    """
+    global _profile
+    with _profile_lock:
+        if _profile is None:
+            _profile = BLEEnergyProfile()
+        return _profile
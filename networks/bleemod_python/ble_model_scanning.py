@@ -1,5 +1,6 @@
 # ble_model_scanning.py
 from networks.bleemod_python.ble_model_params import *
+from networks.bleemod_python import ble_model_jit
 from enum import Enum
 
 '''
@@ -67,6 +68,10 @@ class BLEScanner:
         the beginning of the reception can be inserted
         :return: Charge consumed by the scan event [As]
         """
+        if ble_model_jit.ENABLED:
+            return ble_model_jit.charge_scan_event(float(scan_window), event_type.value, n_bytes_tx, n_bytes_rx,
+                                                   float(reception_after_time))
+
         # Charge for pre- and postprocessing
         charge = BLE_E_MOD_SCAN_DPRE * BLE_E_MOD_SCAN_IPRE + BLE_E_MOD_SCAN_DPOST * BLE_E_MOD_SCAN_IPOST
 
@@ -1,10 +1,30 @@
+import logging
+
+import numpy as np
+
 from networks.bleemod_python.ble_model_scanning import BLEScanner
 from networks.bleemod_python.ble_model_connected import BLEConnected
-from networks.bleemod_python.ble_model_discovery import BLEDiscovery
+from networks.bleemod_python.ble_model_discovery import BLEDiscovery, DiscoveryModelResult
+from networks.bleemod_python.ble_model_discovery_cache import get_shared_cache, discovery_model_stamp
+from networks.bleemod_python.ble_model_discovery_table import get_shared_table
 from networks.bleemod_python.ble_model_connection_establishment import BLEConnectionEstablishment
 from networks.bleemod_python.ble_model_params_connection_establishment import BLEConnectionEstablishmentParams
+from networks.bleemod_python.ble_model_profile import get_energy_profile
+from networks.bleemod_python.ble_model_contention import BLEContention
+from networks.cost_table import load_cost_table
+
+from util import get_settings, load_settings, check_distance
+
+# Connection interval of the connected-mode exchanges of the negotiation protocols
+CONNECTION_INTERVAL = 0.1  # s
 
-from util import get_config, load_config
+
+def discovery_payloads():
+    """
+    :return: Sorted privacy policy sizes (bytes) the negotiation protocols include in advertisements.
+    """
+    settings = get_settings()
+    return tuple(sorted({settings.alanezi.user_pp_size, settings.cunche.owner_pp_size, settings.padome.user_pp_size}))
 
 
 class BLEEMod:
@@ -18,20 +38,170 @@ class BLEEMod:
         We opted to implement the library as a set of classes for different BLE states.
         """
         self.scanner = BLEScanner()
-        self.discovery = BLEDiscovery()
         self.connected = BLEConnected()
         self.connection_establishment = BLEConnectionEstablishment()
         self.connection_establishment_params = BLEConnectionEstablishmentParams()
+        # precompiled energy profile shared by all BLE network objects (used by the negotiation protocols)
+        self.profile = get_energy_profile()
 
         if config is None:
-            self.config = get_config()['BLE']  # load BLE config
-            self.comm_distance = self.config['comm_distance']  # meters effective communication distance for BLE
-            self.voltage = self.config['voltage']  # Assume 3.3 volts
+            self.config = get_settings().ble  # load BLE config
+            self.comm_distance = self.config.comm_distance  # meters effective communication distance for BLE
+            self.voltage = self.config.voltage  # Assume 3.3 volts
         # to allow for optimization_testing.py
         else:
             # Load YAML file
-            config = load_config(file_path='../config.yaml')
-            self.config = config['BLE']  # load BLE config
-            self.comm_distance = self.config['comm_distance']  # meters effective communication distance for BLE
-            self.voltage = self.config['voltage']  # Assume 3.3 volts
+            config = load_settings(file_path='../config.yaml')
+            self.config = config.ble  # load BLE config
+            self.comm_distance = self.config.comm_distance  # meters effective communication distance for BLE
+            self.voltage = self.config.voltage  # Assume 3.3 volts
+
+        # the discovery model results are memoized in a cache shared by all BLE network objects
+        cache_config = self.config.discovery_cache
+        cache = get_shared_cache(cache_config.max_entries, cache_config.path) if cache_config.enabled else None
+        # optionally, discovery queries inside a precomputed grid are answered by interpolation
+        table_config = self.config.discovery_table
+        table = get_shared_table(table_config.path, table_config.max_error) \
+            if table_config.enabled and table_config.path else None
+        # optionally, the number of phi offsets is chosen adaptively for a requested precision
+        adaptive = self.config.discovery_adaptive if self.config.discovery_adaptive.enabled else None
+        self.discovery = BLEDiscovery(cache, table, adaptive)
 
+        # optionally, the discovery results of the privacy policy sizes of the negotiation protocols are read from a
+        # shared memory-mapped table (rows by payload, None for the standard model)
+        self.cost_table = None
+        self.discovery_rows = {}
+        if config is None:
+            payloads = discovery_payloads()
+            self.cost_table = load_cost_table("ble", lambda: self.cost_surfaces(payloads), self.config,
+                                              discovery_model_stamp(), payloads)
+        if self.cost_table is not None:
+            self.discovery_rows = {payload: row for row, payload in
+                                   enumerate([None] + self.cost_table["discovery_payloads"].tolist())}
+
+        # optionally, collisions with the advertisements of the other users present are accounted for
+        self.contention = None
+        # per-event state the discovery results depend on (see networks/cost_replay.py)
+        self.event_state = None
+        if self.config.contention.enabled:
+            self.contention = BLEContention(self.config.discovery.adv_interval, self.config.discovery.rho_max,
+                                            self.config.contention.adv_payload)
+
+    def end_run(self):
+        """
+        Called once at the end of a simulation run. Writes the new discovery model results to the on-disk cache.
+        """
+        if self.discovery.cache is not None:
+            self.discovery.cache.flush()
+
+    def begin_event(self, curr_users_list):
+        """
+        Called before the negotiations of every simulation event. Sets the group of users advertising concurrently
+        (the users within the communication range) for the contention model.
+        :param curr_users_list: List of current users in the environment (User object).
+        """
+        if self.contention is None:
+            return
+        self.contention.set_group([u.id_ for u in curr_users_list if check_distance(u.curr_loc, self.comm_distance)])
+        self.event_state = tuple(self.contention.members)
+        if self.contention.members:
+            logging.debug("BLE contention: %d advertisers, minimum packet success probability %f",
+                          len(self.contention.members), self.contention.group_success_probabilities().min())
+
+    def restore_event(self, event_state):
+        """
+        Restore the per-event state set by begin_event() in another process (e.g., in a worker process).
+        :param event_state: event_state of the other BLEEMod object (ids of the advertising users).
+        """
+        self.contention.set_group(list(event_state))
+        self.event_state = event_state
+
+    def cost_surfaces(self, payloads):
+        """
+        Discovery results of a shared cost table (see cost_table.py): the standard model in the first row, followed by
+        the model with the given payloads.
+        :param payloads: Privacy policy sizes (bytes).
+        :return: Dictionary of the arrays.
+        """
+        results = [self.model_discovery_result(None)] + [self.model_discovery_result(n) for n in payloads]
+        return {"discovery_payloads": np.array(payloads, dtype=np.int64),
+                "discovery": np.array([[r.discoveryLatency, r.chargeAdv, r.chargeScan] for r in results], dtype=float)}
+
+    def model_discovery_result(self, n_bytes_tx=None):
+        """
+        Device discovery model result for the discovery parameters configured in config.yaml (BLE.discovery),
+        without contention.
+        :param n_bytes_tx: Privacy policy bytes included in the advertisement. If None, the standard model is used.
+        :return: DiscoveryModelResult
+        """
+        row = self.discovery_rows.get(n_bytes_tx)
+        if row is not None:
+            result = DiscoveryModelResult()
+            result.discoveryLatency, result.chargeAdv, result.chargeScan = self.cost_table["discovery"][row].tolist()
+            return result
+        if n_bytes_tx is None:
+            return self.discovery.ble_model_discovery_get_result(*self.config.discovery.arguments())
+        return self.discovery.ble_model_discovery_get_result_alanezi(*self.config.discovery.arguments(), n_bytes_tx)
+
+    def get_discovery_result(self, n_bytes_tx=None, advertiser=None):
+        """
+        Device discovery model result for the discovery parameters configured in config.yaml (BLE.discovery).
+        :param n_bytes_tx: Privacy policy bytes included in the advertisement. If None, the standard model is used.
+        :param advertiser: The advertising user (User object), or None if the IoT device advertises. Only used by the
+        contention model.
+        :return: DiscoveryModelResult
+        """
+        result = self.model_discovery_result(n_bytes_tx)
+        if self.contention is None:
+            return result
+        return self.contention.get_result(result, n_bytes_tx or 0, None if advertiser is None else advertiser.id_)
+
+    def phase_costs(self, phase, payloads, role, users=None):
+        """
+        Costs of one negotiation phase for a batch of users, see Network.costs(). BLE phases:
+         - connection_event: constant parts of a connection event,
+         - discovery: device discovery, the payload (PP bytes) is included in the advertisements (0 for the standard
+           model), the role is the advertiser,
+         - connection: connection establishment initiated by the role (the role is the master),
+         - message: communication sequences of one connection event, the role sends the payload.
+        Power values are currents [A] (charge / duration), as the negotiation protocols convert the BLE power
+        consumption with the voltage at the end.
+        :param phase: Phase name.
+        :param payloads: Array of payload sizes (bytes), one per user.
+        :param role: Side that initiates the phase or sends the payload ("user" or "owner").
+        :param users: Optional list of the users (User objects), used by the contention model.
+        :return: ((power, time) of the role, (power, time) of the other side), scalars or arrays, or None if the
+        phase does not exist in BLE.
+        """
+        profile = self.profile
+        if phase == "connection_event":
+            dc = profile.duration_constant_parts
+            current_c = profile.charge_constant_parts / dc
+            return (current_c, dc), (current_c, dc)
+        if phase == "discovery":
+            # the advertiser and the scanner are both charged with the advertising current
+            latency, current_c = np.zeros(len(payloads)), np.zeros(len(payloads))
+            per_user = self.contention is not None and role == "user" and users is not None
+            results = {}
+            for i, payload in enumerate(payloads.tolist()):
+                key = (payload, users[i].id_) if per_user else payload
+                if key not in results:
+                    results[key] = self.get_discovery_result(payload or None, users[i] if per_user else None)
+                latency[i] = results[key].discoveryLatency
+                current_c[i] = results[key].chargeAdv / results[key].discoveryLatency
+            return (current_c, latency), (current_c, latency)
+        if phase == "connection":
+            master = profile.duration_connection_procedure(1, 0, 1, 0, CONNECTION_INTERVAL)
+            slave = profile.duration_connection_procedure(1, 0, 0, 0, CONNECTION_INTERVAL)
+            return ((profile.charge_connection_procedure(1, 0, 1, 0, CONNECTION_INTERVAL) / master, master),
+                    (profile.charge_connection_procedure(1, 0, 0, 0, CONNECTION_INTERVAL) / slave, slave))
+        if phase == "message":
+            # both sides are computed from the master's point of view (Tx first, then Rx)
+            n_bytes, no_bytes = payloads[:, None], np.zeros((len(payloads), 1), dtype=payloads.dtype)
+            tx_duration = profile.duration_sequences_array(1, CONNECTION_INTERVAL, no_bytes, n_bytes)
+            rx_duration = profile.duration_sequences_array(1, CONNECTION_INTERVAL, n_bytes, no_bytes)
+            return ((profile.charge_sequences_array(1, CONNECTION_INTERVAL, no_bytes, n_bytes) / tx_duration,
+                     tx_duration),
+                    (profile.charge_sequences_array(1, CONNECTION_INTERVAL, n_bytes, no_bytes) / rx_duration,
+                     rx_duration))
+        return None
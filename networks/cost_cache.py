@@ -0,0 +1,153 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+'''
+Memoization of the network primitive costs. startup(), association(), send(payload) and receive(payload) of the network
+technologies are pure functions of the payload size, the technology configuration and the per-event state of the
+optional channel models (set by begin_event()), while the negotiation protocols call them for every user and every
+negotiation round. The batch phase costs (phase_costs(), see Network.costs()), which the technologies compute from
+their own primitives, are memoized as well. The costs are kept in a process-wide LRU keyed by
+(technology, operation, payload, configuration digest, event state), so that network objects of different runs share
+it. Hit and miss counts are kept for reporting.
+'''
+
+# Operations that are memoized
+PRIMITIVES = ("startup", "association", "send", "receive", "phase_costs")
+
+# Marks a missing entry (phase_costs() returns None for phases a technology does not have)
+_MISSING = object()
+
+
+def config_digest(config):
+    """
+    :param config: Frozen settings object of a network technology (e.g., ZigbeeSettings).
+    :return: Digest of its parameters.
+    """
+    return hashlib.sha256(repr(config).encode()).hexdigest()[:16]
+
+
+class PrimitiveCostCache:
+    """
+    Thread-safe LRU cache of network primitive costs. Values are (power, time) tuples or phase_costs() results.
+    """
+    def __init__(self, max_entries=4096):
+        """
+        :param max_entries: Maximum number of costs kept (least recently used ones are evicted).
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        """
+        Look up a cost, computing and storing it on a miss.
+        :param key: (technology, operation, payload, configuration digest, event state) tuple.
+        :param compute: Function without arguments that computes the cost.
+        :return: Cost as computed.
+        """
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is not _MISSING:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        """
+        :return: Dictionary with the hit and miss counts, the hit rate and the number of cached costs.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+                    "entries": len(self._entries)}
+
+    def clear(self):
+        """
+        Drop all entries and reset the statistics.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+class CachedPrimitives:
+    """
+    Wraps a network technology object (BLEEMod, ZigBee or LoRa) and answers its primitive and phase cost calls from a
+    PrimitiveCostCache. All other attributes and methods are forwarded to the wrapped object.
+    """
+    def __init__(self, impl, network_type, cache):
+        """
+        :param impl: Network technology object.
+        :param network_type: Network technology name (e.g., zigbee).
+        :param cache: PrimitiveCostCache object.
+        """
+        self.impl = impl
+        self.network_type = network_type
+        self.cost_cache = cache
+        self.digest = config_digest(impl.config)
+
+    def __getattr__(self, name):
+        return getattr(self.impl, name)
+
+    def _cost(self, operation, payload, compute):
+        """
+        :param operation: Primitive name.
+        :param payload: Payload size (bytes), None for startup and association, or the phase_costs() arguments.
+        :param compute: Function without arguments that computes the cost.
+        :return: Cost as computed.
+        """
+        key = (self.network_type, operation, payload, self.digest, getattr(self.impl, "event_state", None))
+        return self.cost_cache.get(key, compute)
+
+    def startup(self):
+        return self._cost("startup", None, self.impl.startup)
+
+    def association(self):
+        return self._cost("association", None, self.impl.association)
+
+    def send(self, payload):
+        return self._cost("send", payload, lambda: self.impl.send(payload))
+
+    def receive(self, payload):
+        return self._cost("receive", payload, lambda: self.impl.receive(payload))
+
+    def phase_costs(self, phase, payloads, role, users=None):
+        # the technologies compute the phases from their own primitives, so the batch is memoized as a whole (the
+        # results are only read, see Network.costs()); the users only matter to the contention model
+        payloads = np.asarray(payloads)
+        user_ids = None
+        if users is not None and getattr(self.impl, "contention", None) is not None:
+            user_ids = tuple(u.id_ for u in users)
+        return self._cost("phase_costs", (phase, tuple(payloads.tolist()), role, user_ids),
+                          lambda: self.impl.phase_costs(phase, payloads, role, users))
+
+
+# Cache shared by all network objects (a new network object is created for every simulation run)
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cost_cache(max_entries=4096):
+    """
+    Get the process-wide primitive cost cache, creating it on first use.
+    :param max_entries: Maximum number of costs kept.
+    :return: PrimitiveCostCache object.
+    """
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = PrimitiveCostCache(max_entries)
+        return _shared_cache
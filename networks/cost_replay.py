@@ -0,0 +1,147 @@
+import gzip
+import logging
+import os
+import pickle
+import tempfile
+
+import numpy as np
+
+'''
+Record/replay of the network cost queries. In record mode, every cost query of the negotiation protocols (startup(),
+association(), send(), receive(), get_discovery_result() and phase_costs()) and its result are logged; the log is
+written to a compact (gzip-compressed pickle) file at the end of the run. In replay mode the queries are answered from
+the log, so that runs that only change the protocol decision logic (e.g., Alanezi thresholds) do not evaluate the
+network models again. Queries the log does not cover are computed (and counted as misses) or, in strict mode, raise
+ReplayMiss.
+
+Queries are keyed by the operation, its arguments (payload sizes, role and, with the BLE contention model, the ids of
+the users involved) and the per-event state of the optional channel/contention models (event_state of the
+technology). A log is only valid for the network settings it was recorded with (see CostReplay.stamp).
+'''
+
+# Bump when the log format changes
+REPLAY_FORMAT_VERSION = 1
+
+
+class ReplayMiss(LookupError):
+    """
+    Raised in strict replay mode for a network cost query the replay log does not cover.
+    """
+
+
+class CostReplay:
+    """
+    Wraps a network technology object (BLEEMod, ZigBee or LoRa) and records its cost queries or replays them from a
+    log. All other attributes and methods are forwarded to the wrapped object.
+    """
+    def __init__(self, impl, network_type, mode, path, strict=False):
+        """
+        :param impl: Network technology object.
+        :param network_type: Network technology name (e.g., ble).
+        :param mode: "record" or "replay".
+        :param path: Path of the log file.
+        :param strict: In replay mode, whether queries the log does not cover raise ReplayMiss instead of being
+        computed.
+        """
+        self.impl = impl
+        self.network_type = network_type
+        self.mode = mode
+        self.path = path
+        self.strict = strict
+        self.stamp = (REPLAY_FORMAT_VERSION, network_type, repr(impl.config))
+        self.hits = 0
+        self.misses = 0
+        self.entries = self._load() if mode == "replay" or os.path.exists(path) else {}
+        self.recorded = 0
+
+    def __getattr__(self, name):
+        return getattr(self.impl, name)
+
+    def _load(self):
+        """
+        Load the log. A missing log is an error in replay mode; a log recorded with other network settings is
+        discarded.
+        :return: Dictionary of query key -> result.
+        """
+        try:
+            with gzip.open(self.path, 'rb') as log_file:
+                stamp, entries = pickle.load(log_file)
+        except FileNotFoundError:
+            if self.mode == "replay":
+                raise
+            return {}
+        if stamp != self.stamp:
+            if self.mode == "replay":
+                raise ValueError(f"Network cost log {self.path} was recorded with different {self.network_type} "
+                                 f"settings")
+            logging.debug("Discarding outdated network cost log %s", self.path)
+            return {}
+        return entries
+
+    def save(self):
+        """
+        Write the log (record mode only), atomically so that a concurrently starting replay never reads a partial
+        file.
+        """
+        if self.mode != "record":
+            return
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.cost-log-', suffix='.pkl.gz')
+        with os.fdopen(fd, 'wb') as raw_file, gzip.GzipFile(fileobj=raw_file, mode='wb') as log_file:
+            pickle.dump((self.stamp, self.entries), log_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, self.path)
+        logging.debug("Recorded %d network cost queries (%d new) to %s", len(self.entries), self.recorded, self.path)
+
+    def stats(self):
+        """
+        :return: Dictionary with the replay hit and miss counts and the number of logged queries.
+        """
+        return {"mode": self.mode, "hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
+
+    def _query(self, key, compute):
+        """
+        :param key: Query key (without the event state).
+        :param compute: Function without arguments that evaluates the query with the network model.
+        :return: Query result.
+        """
+        key = key + (getattr(self.impl, "event_state", None),)
+        if key in self.entries:
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        if self.mode == "replay" and self.strict:
+            raise ReplayMiss(f"Network cost query {key} is not in the log {self.path}")
+        result = compute()
+        if self.mode == "record":
+            self.entries[key] = result
+            self.recorded += 1
+        return result
+
+    def startup(self):
+        return self._query(("startup",), self.impl.startup)
+
+    def association(self):
+        return self._query(("association",), self.impl.association)
+
+    def send(self, payload):
+        return self._query(("send", payload), lambda: self.impl.send(payload))
+
+    def receive(self, payload):
+        return self._query(("receive", payload), lambda: self.impl.receive(payload))
+
+    def get_discovery_result(self, n_bytes_tx=None, advertiser=None):
+        # the advertiser only matters to the contention model
+        advertiser_id = None if advertiser is None or self.impl.contention is None else advertiser.id_
+        return self._query(("get_discovery_result", n_bytes_tx, advertiser_id),
+                           lambda: self.impl.get_discovery_result(n_bytes_tx, advertiser))
+
+    def phase_costs(self, phase, payloads, role, users=None):
+        payloads = np.asarray(payloads)
+        # the users only matter to the contention model
+        user_ids = None
+        if users is not None and getattr(self.impl, "contention", None) is not None:
+            user_ids = tuple(u.id_ for u in users)
+        return self._query(("phase_costs", phase, tuple(payloads.tolist()), role, user_ids),
+                           lambda: self.impl.phase_costs(phase, payloads, role, users))
@@ -0,0 +1,193 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import struct
+import tempfile
+import threading
+
+import numpy as np
+
+from networks.network import NETWORKS
+from util import get_settings
+
+'''
+Shared, memory-mapped network cost tables. The cost surfaces of a network technology (e.g., the LoRa time on air of
+every mode and payload size, the ZigBee send/receive costs per payload size or the BLE discovery results for the
+privacy policy sizes of the negotiation protocols) are computed once by a warm-up step and written to a flat binary
+file that every process maps read-only. The operating system shares the mapped pages between the processes, so memory
+use stays flat as the number of worker processes grows, and the workers start without computing the surfaces again.
+
+File layout (all integers little-endian):
+    magic (8 bytes, b"GEPCOST1") | header length n (uint32) | header (n bytes, UTF-8 JSON) | padding | arrays
+The header holds the table stamp and, per array, its dtype, shape and byte offset from the start of the file. Every
+array starts at a multiple of ALIGNMENT bytes.
+
+The stamp identifies the technology settings (and model version) the table was computed for. A table with a different
+stamp is outdated and is rebuilt on first use.
+
+Build the tables of all technologies for the current config.yaml with
+    python -m networks.cost_table
+'''
+
+MAGIC = b"GEPCOST1"
+# Bump when the layout or the contents of the tables change
+COST_TABLE_VERSION = 1
+ALIGNMENT = 64
+
+
+def table_stamp(technology, *parts):
+    """
+    :param technology: Network technology name (e.g., lora).
+    :param parts: Objects the table contents depend on (e.g., the technology settings), identified by their repr().
+    :return: Stamp string.
+    """
+    digest = hashlib.sha256(repr((COST_TABLE_VERSION, technology) + parts).encode()).hexdigest()
+    return f"{technology}-{COST_TABLE_VERSION}-{digest[:16]}"
+
+
+def write_cost_table(path, stamp, arrays):
+    """
+    Write a cost table atomically (write to a temporary file, then replace), so that concurrently starting processes
+    never map a partially written file.
+    :param path: File path.
+    :param stamp: Table stamp (see table_stamp()).
+    :param arrays: Dictionary of array name -> numpy array.
+    """
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+
+    layout, size = {}, 0
+    for name, array in arrays.items():
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": size}
+        size += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+
+    # the header holds the absolute offsets, so move the arrays back until the header fits in front of them
+    data_start = 0
+    while True:
+        header = json.dumps({"stamp": stamp, "arrays": {name: {**entry, "offset": entry["offset"] + data_start}
+                                                        for name, entry in layout.items()}}).encode()
+        header_end = -(-(len(MAGIC) + 4 + len(header)) // ALIGNMENT) * ALIGNMENT
+        if header_end <= data_start:
+            break
+        data_start = header_end
+
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.cost-table-', suffix='.bin')
+    try:
+        with os.fdopen(fd, 'wb') as table_file:
+            table_file.write(MAGIC + struct.pack('<I', len(header)) + header)
+            for name, array in arrays.items():
+                table_file.seek(data_start + layout[name]["offset"])
+                table_file.write(array.tobytes())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except OSError:
+        os.unlink(tmp_path)
+        raise
+
+
+class CostTable:
+    """
+    Read-only, memory-mapped cost table.
+    """
+    def __init__(self, path):
+        """
+        :param path: Path of a file written by write_cost_table().
+        :raise ValueError: If the file is not a cost table.
+        """
+        self.path = path
+        self._map = np.memmap(path, dtype=np.uint8, mode='r')
+        if bytes(self._map[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path} is not a network cost table")
+        header_length = struct.unpack('<I', bytes(self._map[len(MAGIC):len(MAGIC) + 4]))[0]
+        header = json.loads(bytes(self._map[len(MAGIC) + 4:len(MAGIC) + 4 + header_length]))
+        self.stamp = header["stamp"]
+        # zero-copy views into the mapped file
+        self.arrays = {name: np.ndarray(tuple(entry["shape"]), dtype=np.dtype(entry["dtype"]), buffer=self._map,
+                                        offset=entry["offset"])
+                       for name, entry in header["arrays"].items()}
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def __contains__(self, name):
+        return name in self.arrays
+
+
+# Tables mapped by this process, by path
+_shared_tables = {}
+_shared_tables_lock = threading.Lock()
+
+
+def get_cost_table(path, stamp, build):
+    """
+    Get the process-wide mapping of a cost table, building and writing the table first if the file is missing or
+    outdated (different stamp).
+    :param path: File path.
+    :param stamp: Stamp of the table contents (see table_stamp()).
+    :param build: Function without arguments that computes the table arrays (dictionary of name -> array).
+    :return: CostTable object.
+    """
+    with _shared_tables_lock:
+        table = _shared_tables.get(path)
+        if table is not None and table.stamp == stamp:
+            return table
+
+        table = None
+        try:
+            table = CostTable(path)
+        except (OSError, ValueError, KeyError):
+            pass
+        if table is None or table.stamp != stamp:
+            logging.debug("Building network cost table %s", path)
+            write_cost_table(path, stamp, build())
+            table = CostTable(path)
+        _shared_tables[path] = table
+        return table
+
+
+def load_cost_table(technology, build, *stamp_parts):
+    """
+    Cost table of a network technology as configured in config.yaml (Network.cost_table).
+    :param technology: Network technology name (e.g., lora), also the file name of the table.
+    :param build: Function without arguments that computes the table arrays (dictionary of name -> array).
+    :param stamp_parts: Objects the table contents depend on (see table_stamp()).
+    :return: CostTable object, or None if cost tables are disabled.
+    """
+    table_config = get_settings().network.cost_table
+    if not table_config.enabled or not table_config.path:
+        return None
+    return get_cost_table(os.path.join(table_config.path, f"{technology}.bin"),
+                          table_stamp(technology, *stamp_parts), build)
+
+
+def warm_up(technologies=("ble", "zigbee", "lora")):
+    """
+    Build (or validate) the cost tables of the network technologies for the current config.yaml, e.g., before worker
+    processes are started.
+    :param technologies: Network technology names.
+    :return: Dictionary of technology name -> CostTable object (None for technologies without a table).
+    """
+    return {technology: getattr(NETWORKS.get(technology)(), "cost_table", None) for technology in technologies}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the memory-mapped network cost tables for config.yaml "
+                                                 "(Network.cost_table.path).")
+    parser.add_argument("technologies", nargs='*', default=["ble", "zigbee", "lora"],
+                        help="Network technologies (default: all)")
+    args = parser.parse_args()
+
+    if not get_settings().network.cost_table.enabled:
+        parser.error("Enable Network.cost_table in config.yaml first")
+    for technology, table in warm_up(args.technologies).items():
+        if table is None:
+            print(f"{technology}: no cost table")
+        else:
+            print(f"{technology}: {table.path} ({table.stamp}, {os.path.getsize(table.path)} bytes)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,278 @@
 import math
-from util import get_config
+
+import numpy as np
+
+from networks.cost_table import load_cost_table
+from util import get_settings, check_distance
+
+# Payload sizes (bytes) for which the time on air of every mode is precomputed. Larger payloads are computed on demand.
+TOA_TABLE_SIZE = 4096
+
+
+class LoRaEngine:
+    """
+    Stateless LoRa cost engine. The time on air (ToA) of every SF/BW mode is precomputed once for all payload sizes up
+    to TOA_TABLE_SIZE, so that a transmission costs a few table lookups. Nothing is changed on the engine after
+    construction, so it can be shared by concurrently running negotiations.
+    """
+    def __init__(self, config, table_size=TOA_TABLE_SIZE, cost_table=None):
+        """
+        :param config: LoraSettings (see util.py).
+        :param table_size: Largest payload size (bytes) in the precomputed tables.
+        :param cost_table: Optional memory-mapped CostTable with the surfaces() of an engine with the same config (see
+        cost_table.py). If given, the tables are read from it instead of being computed (table_size is ignored).
+        """
+        self.modes = config.mode_configs
+        self.cr = config.cr
+        self.voltage = config.voltage
+        self.i_rx = config.i_rx  # mA
+        self.table_size = table_size
+
+        self.sf = np.array([mode.sf for mode in self.modes])
+        self.max_payload = np.array([mode.lora_max_payload for mode in self.modes])
+        self.i_tx = np.array([mode.i_tx for mode in self.modes], dtype=float)  # mA
+        self.t_sym = (2 ** self.sf) / (np.array([mode.bw for mode in self.modes], dtype=float) * 1000)
+        self.t_pre = self.t_sym * 4.25  # assume N_pre = 0 and crc = 0
+
+        self.cost_table = cost_table
+        if cost_table is not None:
+            # zero-copy views into the shared table, the complete transmission costs are looked up as well
+            self.toa_table = cost_table["toa"]
+            self.mode_table = cost_table["mode"]
+            self.table_size = len(self.mode_table) - 1
+            self._toa_rows = self.toa_table
+            self._mode_list = self.mode_table
+            self._costs = {False: (cost_table["send_power"], cost_table["send_time"]),
+                           True: (cost_table["receive_power"], cost_table["receive_time"])}
+            return
+
+        # ToA of every mode (rows) and payload size (columns), and the mode with the lowest ToA per payload size
+        # (the first one in config.yaml order on ties)
+        payloads = np.arange(table_size + 1)
+        self.toa_table = self._toa(np.arange(len(self.modes))[:, None], payloads[None, :])
+        self.mode_table = np.argmin(self.toa_table, axis=0)
+
+        # Python copies for the scalar lookups
+        self._toa_rows = self.toa_table.tolist()
+        self._mode_list = self.mode_table.tolist()
+        self._costs = None
+
+    def surfaces(self):
+        """
+        Tables of a shared cost table (see cost_table.py): the ToA and mode tables and the send and receive costs of
+        every payload size up to table_size.
+        :return: Dictionary of the arrays.
+        """
+        payloads = np.arange(self.table_size + 1)
+        _, send_power, send_time = self.transmissions(payloads)
+        _, receive_power, receive_time = self.transmissions(payloads, receive=True)
+        return {"toa": self.toa_table, "mode": self.mode_table, "send_power": send_power, "send_time": send_time,
+                "receive_power": receive_power, "receive_time": receive_time}
+
+    def _toa(self, mode, payload):
+        """
+        Vectorized time on air of a single packet.
+        :param mode: Array of mode indices.
+        :param payload: Array of payload sizes (bytes).
+        :return: Array of ToAs [s]
+        """
+        sf = self.sf[mode]
+        n_phy = 8 + np.maximum(np.ceil((28 + 8 * payload + 4 * sf) / (4 * sf)) * (self.cr + 4), 0)
+        return self.t_pre[mode] + self.t_sym[mode] * n_phy
+
+    def _toa_scalar(self, mode, payload):
+        """
+        :param mode: Mode index.
+        :param payload: Payload size (bytes).
+        :return: ToA of a single packet [s]
+        """
+        if payload <= self.table_size:
+            return float(self._toa_rows[mode][payload])
+        sf = self.modes[mode].sf
+        n_phy = 8 + max(math.ceil((28 + 8 * payload + 4 * sf) / (4 * sf)) * (self.cr + 4), 0)
+        return float(self.t_pre[mode]) + float(self.t_sym[mode]) * n_phy
+
+    def best_mode(self, payload):
+        """
+        Simple implementation of Adaptive Data Rate (ADR): the mode with the lowest ToA for the payload.
+        :param payload: Payload size (bytes).
+        :return: Mode index into mode_configs.
+        """
+        if payload <= self.table_size:
+            return int(self._mode_list[payload])
+        toas = [self._toa_scalar(mode, payload) for mode in range(len(self.modes))]
+        return toas.index(min(toas))
+
+    def transmission(self, payload, receive=False):
+        """
+        Cost of sending or receiving a payload, split into packets of the maximum payload size of the selected mode.
+        :param payload: Payload size (bytes).
+        :param receive: Whether the payload is received (receive current) instead of sent (Tx current of the mode).
+        :return: (mode, power, time), where mode is the LoraMode used and power and time are in W and s.
+        """
+        if self._costs is not None and payload <= self.table_size:
+            power, duration = self._costs[receive]
+            return self.modes[self.mode_table[payload]], float(power[payload]), float(duration[payload])
+
+        mode = self.best_mode(payload)
+        max_payload = self.modes[mode].lora_max_payload
+
+        t_tx = 0
+        # does the payload fit into 1 packet?
+        if payload > max_payload:
+            if receive:
+                # all but the last packet are full, only the cost of one of them is counted
+                t_tx = self._toa_scalar(mode, max_payload)
+                payload -= (math.ceil(payload / max_payload) - 1) * max_payload
+            else:
+                # every packet is charged with the ToA of the payload left after it
+                while payload - max_payload > 0:
+                    payload = payload - max_payload
+                    t_tx += self._toa_scalar(mode, payload)
+        t_tx += self._toa_scalar(mode, payload)
+
+        current = self.i_rx if receive else self.modes[mode].i_tx
+        return self.modes[mode], (t_tx / 3600) * self.voltage * (current / 1000), t_tx
+
+    def transmissions(self, payloads, receive=False):
+        """
+        Vectorized transmission() over an array of payload sizes.
+        :param payloads: Array of payload sizes (bytes).
+        :param receive: Whether the payloads are received instead of sent.
+        :return: (mode, power, time) arrays, where mode holds indices into mode_configs.
+        """
+        payloads = np.asarray(payloads, dtype=np.int64)
+        in_table = payloads <= self.table_size
+        mode = self.mode_table[np.where(in_table, payloads, 0)]
+        if not in_table.all():
+            mode[~in_table] = np.argmin(self._toa(np.arange(len(self.modes))[:, None], payloads[None, ~in_table]),
+                                        axis=0)
+        max_payload = self.max_payload[mode]
+
+        t_tx = np.zeros(payloads.shape)
+        remaining = payloads.copy()
+        if receive:
+            multi = payloads > max_payload
+            t_tx[multi] += self._toa(mode[multi], max_payload[multi])
+            remaining[multi] -= (-(-payloads[multi] // max_payload[multi]) - 1) * max_payload[multi]
+        else:
+            # the packets are added in the same order as in transmission()
+            active = remaining - max_payload > 0
+            while active.any():
+                remaining[active] -= max_payload[active]
+                t_tx[active] += self._toa(mode[active], remaining[active])
+                active = remaining - max_payload > 0
+        t_tx += self._toa(mode, remaining)
+
+        current = self.i_rx if receive else self.i_tx[mode]
+        return mode, (t_tx / 3600) * self.voltage * (current / 1000), t_tx
+
+
+class LoRaChannel:
+    """
+    Channel-level LoRa model with collisions and duty-cycle limits. Transmissions on the same SF overlap as in pure
+    ALOHA (different SFs are treated as orthogonal): a transmission of ToA t_i collides with a transmission of ToA t_j
+    on the same SF, sent at a uniformly random time within the window W, with probability (t_i + t_j) / W, so it
+    gets through with probability
+        p_i = exp(-sum_{j != i, sf_j = sf_i} (t_i + t_j) / W).
+    A collided transmission is repeated, up to max_attempts times, giving (1 - (1 - p)^m) / p expected attempts.
+    Between attempts the device has to stay silent for the duty-cycle off-period t * (1 / d - 1) of the previous one.
+    Per-SF transmission counts and airtimes are aggregated with array operations, so batches of any size are handled
+    without per-packet loops.
+    """
+    def __init__(self, engine, window, duty_cycle, max_attempts):
+        """
+        :param engine: LoRaEngine.
+        :param window: Time window the transmissions of a batch are spread over [s]
+        :param duty_cycle: Regional duty-cycle limit d (e.g., 0.01 for 1 %)
+        :param max_attempts: Maximum number of attempts (first transmission and retransmissions) per payload.
+        """
+        self.engine = engine
+        self.window = window
+        self.duty_cycle = duty_cycle
+        self.max_attempts = max_attempts
+
+        # Background load: per mode, number of transmissions and their summed ToA [s]
+        self.background_count = np.zeros(len(engine.modes))
+        self.background_airtime = np.zeros(len(engine.modes))
+
+    def _load(self, payloads):
+        """
+        :param payloads: Array of payload sizes (bytes).
+        :return: Mode indices and ToAs of the payloads, and the per-mode transmission counts and summed ToAs.
+        """
+        mode, _, toa = self.engine.transmissions(payloads)
+        n_modes = len(self.engine.modes)
+        return (mode, toa, np.bincount(mode, minlength=n_modes).astype(float),
+                np.bincount(mode, weights=toa, minlength=n_modes))
+
+    def set_background(self, payloads):
+        """
+        Set the transmissions of the other devices sharing the channel during the current event.
+        :param payloads: Array of payload sizes (bytes).
+        """
+        _, _, self.background_count, self.background_airtime = self._load(np.asarray(payloads, dtype=np.int64))
+
+    def _attempts(self, toa, others_count, others_airtime):
+        """
+        :param toa: ToA(s) of the transmissions [s]
+        :param others_count: Number(s) of other transmissions on the same SF.
+        :param others_airtime: Summed ToA(s) of the other transmissions on the same SF [s]
+        :return: Expected number(s) of attempts and delivery probabilities.
+        """
+        success = np.exp(-(toa * others_count + others_airtime) / self.window)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # 1 - (1 - p)^m, accurate for small p
+            delivered = -np.expm1(self.max_attempts * np.log1p(-success))
+            attempts = np.where(success > 0, delivered / success, self.max_attempts)
+        return attempts, delivered
+
+    def _delivery(self, power, t_tx, attempts):
+        """
+        :return: Power and time of a delivery with the given expected number of attempts (see the class description).
+        """
+        return power * attempts, t_tx * (1 + (attempts - 1) / self.duty_cycle)
+
+    def adjust(self, mode, power, t_tx):
+        """
+        Power and time of a single transmission (see LoRaEngine.transmission()) against the background load.
+        :param mode: LoraMode used.
+        :param power: Power consumption without collisions (W).
+        :param t_tx: Time consumption without collisions (s).
+        :return: Effective power and time consumption (W and s), including retransmissions and duty-cycle back-off.
+        """
+        index = self.engine.modes.index(mode)
+        attempts, _ = self._attempts(t_tx, self.background_count[index], self.background_airtime[index])
+        effective_power, effective_time = self._delivery(power, t_tx, float(attempts))
+        return effective_power, effective_time
+
+    def adjust_batch(self, mode, power, t_tx):
+        """
+        Vectorized adjust().
+        :param mode: Array of mode indices (see LoRaEngine.transmissions()).
+        :param power: Array of power consumptions without collisions (W).
+        :param t_tx: Array of time consumptions without collisions (s).
+        :return: Arrays of effective power and time consumption (W and s).
+        """
+        attempts, _ = self._attempts(t_tx, self.background_count[mode], self.background_airtime[mode])
+        return self._delivery(power, t_tx, attempts)
+
+    def deliver(self, payloads, receive=False):
+        """
+        Vectorized delivery of a batch of transmissions sharing the channel (with each other and with the background).
+        :param payloads: Array of payload sizes (bytes).
+        :param receive: Whether to return the receiver's power instead of the sender's.
+        :return: Arrays of effective power and time consumption (W and s) and of delivery probabilities.
+        """
+        payloads = np.asarray(payloads, dtype=np.int64)
+        mode, toa, count, airtime = self._load(payloads)
+        count += self.background_count
+        airtime += self.background_airtime
+        _, power, t_tx = self.engine.transmissions(payloads, receive)
+        # exclude the transmission itself from the load on its SF
+        attempts, delivered = self._attempts(toa, count[mode] - 1, airtime[mode] - toa)
+        power, t_tx = self._delivery(power, t_tx, attempts)
+        return power, t_tx, delivered
 
 
 class LoRa:
@@ -11,17 +284,49 @@ class LoRa:
         Initialize the maximum payload, assumed maximum effective communication distance, voltage
         and current consumption and other variables.
         """
-        self.config = get_config()['Lora']  # load lora config
-        self.voltage = self.config['voltage']
-        self.i_rx = self.config['i_rx']  # mA
-        self.cr = self.config['cr']
-        # initial values
-        # are adjusted during each send and receive
-        self.lora_max_payload = self.config['lora_max_payload']  # bytes
-        self.sf = self.config['sf']
-        self.bw = self.config['bw']  # kHz
-        self.i_tx = self.config['i_tx']  # mA
-        self.comm_distance = self.config['comm_distance']  # m assume 10 km for lora
+        self.config = get_settings().lora  # load lora config
+        self.voltage = self.config.voltage
+        self.i_rx = self.config.i_rx  # mA
+        self.cr = self.config.cr
+        # default mode, the mode of every send and receive is chosen by the engine (ADR)
+        self.lora_max_payload = self.config.lora_max_payload  # bytes
+        self.sf = self.config.sf
+        self.bw = self.config.bw  # kHz
+        self.i_tx = self.config.i_tx  # mA
+        self.comm_distance = self.config.comm_distance  # m assume 10 km for lora
+        # optionally, the engine tables are read from a shared memory-mapped cost table instead of being computed
+        payload_max = get_settings().network.cost_table.payload_max
+        self.cost_table = load_cost_table("lora", lambda: LoRaEngine(self.config, payload_max).surfaces(), self.config,
+                                          payload_max)
+        self.engine = LoRaEngine(self.config, cost_table=self.cost_table)
+
+        # optionally, collisions and duty-cycle limits on the channel shared with the other users are accounted for
+        self.channel = None
+        # per-event state the send and receive costs depend on (see networks/cost_cache.py)
+        self.event_state = None
+        if self.config.channel.enabled:
+            self.channel = LoRaChannel(self.engine, self.config.channel.window, self.config.channel.duty_cycle,
+                                       self.config.channel.max_attempts)
+
+    def begin_event(self, curr_users_list):
+        """
+        Called before the negotiations of every simulation event. Sets the background load of the channel model: the
+        other users within the communication range send one payload each per window.
+        :param curr_users_list: List of current users in the environment (User object).
+        """
+        if self.channel is None:
+            return
+        n_users = sum(1 for u in curr_users_list if check_distance(u.curr_loc, self.comm_distance))
+        self.event_state = max(n_users - 1, 0)
+        self.channel.set_background(np.full(self.event_state, self.config.channel.payload))
+
+    def restore_event(self, event_state):
+        """
+        Restore the per-event state set by begin_event() in another process (e.g., in a worker process).
+        :param event_state: event_state of the other LoRa object (number of background senders).
+        """
+        self.event_state = event_state
+        self.channel.set_background(np.full(self.event_state, self.config.channel.payload))
 
     def send(self, payload):
         """
@@ -29,31 +334,10 @@ class LoRa:
         :param payload: Payload size to send (bytes)
         :return: Returns power and time consumption (W and s).
         """
-        # determine lora mode to use
-        self.determine_mode(payload)
-        # How many packets to send
-        packet_num = math.ceil(payload / self.lora_max_payload)
-
-        t_tx = 0
-        t_sym = (2 ** self.sf) / (self.bw*1000)
-        t_pre = t_sym * 4.25  # assume N_pre = 0 and crc = 0
-        # does the payload fit into 1 packet?
-        if packet_num > 1:
-            while payload - self.lora_max_payload > 0:
-                payload = payload - self.lora_max_payload
-                n_phy = 8 + max(math.ceil((28 + 8 * payload + 4 * self.sf) /
-                                          (4 * self.sf)) * (self.cr + 4), 0)
-                t_phy = t_sym * n_phy
-                t_temp_tx = t_pre + t_phy
-                t_tx += t_temp_tx
-
-        n_phy = 8 + max(math.ceil((28 + 8 * payload + 4 * self.sf) /
-                                  (4 * self.sf)) * (self.cr + 4), 0)
-        t_phy = t_sym * n_phy
-        t_temp_tx = t_pre + t_phy
-        t_tx += t_temp_tx
-
-        return (t_tx / 3600) * self.voltage * (self.i_tx / 1000), t_tx
+        mode, power, t_tx = self.engine.transmission(payload)
+        if self.channel is not None:
+            return self.channel.adjust(mode, power, t_tx)
+        return power, t_tx
 
     def receive(self, payload):
         """
@@ -62,66 +346,29 @@ class LoRa:
         :return: Returns power and time consumption (W and s).
         """
         # Note that there is practically no difference between send and receive
-        # determine lora mode to use
-        self.determine_mode(payload)
-        # How many packets to send
-        packet_num = math.ceil(payload / self.lora_max_payload)
+        mode, power, t_tx = self.engine.transmission(payload, receive=True)
+        if self.channel is not None:
+            # the receiver listens to every attempt
+            return self.channel.adjust(mode, power, t_tx)
+        return power, t_tx
 
-        t_tx = 0
-        t_sym = (2 ** self.sf) / (self.bw*1000)
-        t_pre = t_sym * 4.25  # assume N_pre = 0 and crc = 0
-        # does the payload fit into 1 packet?
-        if packet_num > 1:
-            while payload - self.lora_max_payload > 0:
-                payload = payload - self.lora_max_payload
-                n_phy = 8 + max(math.ceil((28 + 8 * self.lora_max_payload + 4 * self.sf) /
-                                          (4 * self.sf)) * (self.cr + 4), 0)
-                t_phy = t_sym * n_phy
-                t_temp_tx = t_pre + t_phy
-                t_tx = t_temp_tx
-
-        n_phy = 8 + max(math.ceil((28 + 8 * payload + 4 * self.sf) /
-                                  (4 * self.sf)) * (self.cr + 4), 0)
-        t_phy = t_sym * n_phy
-        t_temp_tx = t_pre + t_phy
-        t_tx += t_temp_tx
-
-        return (t_tx / 3600) * self.voltage * (self.i_rx / 1000), t_tx
-
-    def determine_mode(self, payload):
-        """
-        Determine the LoRa mode to use (i.e., SF/BW combination) based on the payload.
-        Simple implementation of Adaptive Data Rate (ADR).
-        :param payload: Payload size in bytes.
-        """
-        # Initialize variables to store the best mode (lowest ToA)
-        best_sf = self.sf
-        best_bw = self.bw
-        best_toa = float('inf')
-
-        # Define SF/BW configurations and their respective max payload sizes and i_tx (mA)
-        # Access the mode_configs data
-        mode_configs = {(tuple(item[0])): item[1] for item in self.config['mode_configs']}
-
-        # Loop through possible SF and BW combinations to minimize Time on Air (ToA)
-        for sf, bw in mode_configs.keys():  # Use only the defined combinations
-            bw_hz = bw * 1000
-            t_sym = (2 ** sf) / bw_hz
-            t_pre = t_sym * 4.25
-
-            n_phy = 8 + max(math.ceil((28 + 8 * payload + 4 * sf) /
-                                      (4 * sf)) * (self.cr + 4), 0)
-            t_phy = t_sym * n_phy
-            t_tx = t_pre + t_phy
-
-            # Update the mode if this combination gives lower ToA
-            if t_tx < best_toa:
-                best_toa = t_tx
-                best_sf = sf
-                best_bw = bw
-
-        # Set the best mode and corresponding parameters
-        self.sf = best_sf
-        self.bw = best_bw
-        self.lora_max_payload = mode_configs[(best_sf, best_bw)]["lora_max_payload"]
-        self.i_tx = mode_configs[(best_sf, best_bw)]["i_tx"]
+    def phase_costs(self, phase, payloads, role, users=None):
+        """
+        Costs of one negotiation phase for a batch of users, see Network.costs(). LoRa phases:
+         - message: the role sends the payload.
+        :param phase: Phase name.
+        :param payloads: Array of payload sizes (bytes), one per user.
+        :param role: Side that sends ("user" or "owner").
+        :param users: Unused.
+        :return: ((power, time) of the role, (power, time) of the other side) arrays, or None if the phase does not
+        exist in LoRa.
+        """
+        if phase != "message":
+            return None
+        sides = []
+        for receive in (False, True):
+            mode, power, t_tx = self.engine.transmissions(payloads, receive)
+            if self.channel is not None:
+                power, t_tx = self.channel.adjust_batch(mode, power, t_tx)
+            sides.append((power, t_tx))
+        return tuple(sides)
@@ -1,9 +1,21 @@
-from networks.bleemod_python.bleemod_python import BLEEMod
-from networks.zigbee import ZigBee
-from networks.lora import LoRa
+import os
 import sys
 import logging
 
+import numpy as np
+
+from networks.cost_cache import CachedPrimitives, get_shared_cost_cache
+from networks.cost_replay import CostReplay
+from registry import Registry
+from util import get_settings
+
+# Network technologies by name, imported on first use
+NETWORKS = Registry("gepard.networks", {
+    "ble": "networks.bleemod_python.bleemod_python:BLEEMod",
+    "zigbee": "networks.zigbee:ZigBee",
+    "lora": "networks.lora:LoRa",
+})
+
 
 class Network:
     """
@@ -11,13 +23,135 @@ class Network:
     """
     def __init__(self, network_type):
         self.network_type = network_type
-        if self.network_type == "ble":
-            self.network_impl = BLEEMod()
-        elif self.network_type == "zigbee":
-            self.network_impl = ZigBee()
-        elif self.network_type == "lora":
-            self.network_impl = LoRa()
-        else:
+        network_class = NETWORKS.get(self.network_type)
+        if network_class is None:
             logging.info("Network type not supported")
             sys.exit(1)
+        self.network_impl = network_class()
+        network_config = get_settings().network
+        # optionally, the network cost queries are recorded to or replayed from a log
+        self.replay = None
+        if network_config.replay.mode != "off":
+            self.replay = CostReplay(self.network_impl, self.network_type, network_config.replay.mode,
+                                     os.path.join(network_config.replay.path, f"{self.network_type}.pkl.gz"),
+                                     network_config.replay.strict)
+            self.network_impl = self.replay
+        # the primitive costs (startup, association, send, receive) are memoized for all negotiation protocols
+        self.cost_cache = None
+        cache_config = network_config.cost_cache
+        if cache_config.enabled:
+            self.cost_cache = get_shared_cost_cache(cache_config.max_entries)
+            self.network_impl = CachedPrimitives(self.network_impl, self.network_type, self.cost_cache)
+
+    def __getstate__(self):
+        # worker processes use their own network objects (see worker_network()), only the per-event state is sent
+        return {"network_type": self.network_type, "event_state": getattr(self.network_impl, "event_state", None)}
+
+    def __setstate__(self, state):
+        self.__dict__.update(worker_network(state["network_type"]).__dict__)
+        if state["event_state"] is not None:
+            self.network_impl.restore_event(state["event_state"])
+
+    def end_run(self):
+        """
+        Called once at the end of a simulation run. Reports the cost cache and replay statistics, writes the
+        recorded network cost log and lets the network technology write its state (e.g., the BLE discovery cache).
+        """
+        end_run = getattr(self.network_impl, "end_run", None)
+        if end_run is not None:
+            end_run()
+        if self.cost_cache is not None:
+            logging.debug("Network primitive cost cache: %s", self.cost_cache.stats())
+        if self.replay is not None:
+            logging.debug("Network cost %s: %s", self.replay.mode, self.replay.stats())
+            if self.replay.mode == "replay" and self.replay.misses:
+                logging.warning("%d network cost queries were not in the log %s", self.replay.misses,
+                                self.replay.path)
+            self.replay.save()
+
+    def begin_event(self, curr_users_list):
+        """
+        Called once per simulation event before the negotiations, lets the network technology prepare state shared
+        by all negotiations of the event.
+        :param curr_users_list: List of current users in the environment (User object).
+        """
+        self.network_impl.begin_event(curr_users_list)
+
+    def costs(self, phase_plan, payload_bytes, roles, users=None):
+        """
+        Batch interface to the network cost models: the power and time consumption of a sequence of negotiation
+        phases for many users at once. Every network technology implements the phases that exist in it (see the
+        phase_costs() methods of BLEEMod, ZigBee and LoRa), the other phases cost nothing:
+         - startup, association (ZigBee),
+         - connection_event, discovery, connection (BLE),
+         - message (all): the role sends the payload to the other side,
+         - ack (ZigBee): the role sends an ACK.
+        :param phase_plan: Sequence of phase names.
+        :param payload_bytes: Payload sizes (bytes) per phase, either one sequence for all users or an array of shape
+        (n_users, n_phases). Ignored for phases without payload.
+        :param roles: Side that initiates/sends in every phase ("user" or "owner").
+        :param users: Optional list of the users (User objects). Determines the number of users if payload_bytes is
+        given once for all users.
+        :return: user_power, user_time, owner_power, owner_time arrays of shape (n_users, n_phases), in the units the
+        network technology reports (see the send() / receive() methods).
+        """
+        payload_bytes = np.asarray(payload_bytes, dtype=np.int64)
+        if payload_bytes.ndim == 1:
+            payload_bytes = np.broadcast_to(payload_bytes, (1 if users is None else len(users), len(phase_plan)))
+
+        user_power, user_time, owner_power, owner_time = (np.zeros(payload_bytes.shape) for _ in range(4))
+        for k, (phase, role) in enumerate(zip(phase_plan, roles)):
+            phase_costs = self.network_impl.phase_costs(phase, payload_bytes[:, k], role, users)
+            if phase_costs is None:
+                continue
+            sender, receiver = phase_costs
+            if role == "user":
+                (user_power[:, k], user_time[:, k]), (owner_power[:, k], owner_time[:, k]) = sender, receiver
+            else:
+                (owner_power[:, k], owner_time[:, k]), (user_power[:, k], user_time[:, k]) = sender, receiver
+        return user_power, user_time, owner_power, owner_time
 
+    def charge(self, u, iot_device, user_power, user_time, owner_power, owner_time):
+        """
+        Charge the costs of one user's negotiation (one row of the costs() arrays, as lists) to the user and the IoT
+        device, phase by phase.
+        :param u: User object.
+        :param iot_device: IoT device object.
+        :param user_power: User power consumption of every phase.
+        :param user_time: User time consumption of every phase.
+        :param owner_power: IoT device power consumption of every phase.
+        :param owner_time: IoT device time consumption of every phase.
+        """
+        # has to be local not to double count
+        iot_device_power_consumed = 0
+        iot_device_time_consumed = 0
+
+        for power, duration in zip(user_power, user_time):
+            u.add_to_time_spent(duration)
+            u.add_to_power_consumed(power)
+        for power, duration in zip(owner_power, owner_time):
+            iot_device_time_consumed += duration
+            iot_device_power_consumed += power
+
+        if self.network_type == "ble":
+            # BLE costs are currents, convert from As to Ws
+            u.power_consumed = u.power_consumed * self.network_impl.voltage
+            iot_device_power_consumed = iot_device_power_consumed * self.network_impl.voltage
+
+        iot_device.add_to_power_consumed(iot_device_power_consumed)
+        iot_device.add_to_time_spent(iot_device_time_consumed)
+
+
+# Network objects of this process, by network type, used by the negotiations sent to it (see Network.__setstate__())
+_worker_networks = {}
+
+
+def worker_network(network_type):
+    """
+    :param network_type: Network technology name (e.g., ble).
+    :return: Network object of this process for the network type, created on first use.
+    """
+    network = _worker_networks.get(network_type)
+    if network is None:
+        network = _worker_networks[network_type] = Network(network_type)
+    return network
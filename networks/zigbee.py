@@ -1,4 +1,61 @@
-from util import get_config
+import numpy as np
+
+from networks.cost_table import load_cost_table
+from util import get_settings, check_distance
+
+# IEEE 802.15.4 (2.4 GHz O-QPSK PHY) timing
+DATA_RATE = 250000  # bps
+SYMBOL_TIME = 16e-6  # s
+UNIT_BACKOFF_PERIOD = 20 * SYMBOL_TIME  # s, aUnitBackoffPeriod
+CCA_DURATION = 8 * SYMBOL_TIME  # s
+MAC_MIN_BE = 3  # macMinBE
+MAC_MAX_BE = 5  # macMaxBE
+MAC_MAX_CSMA_BACKOFFS = 4  # macMaxCSMABackoffs
+
+
+class ZigBeeCSMA:
+    """
+    Unslotted CSMA/CA contention model (IEEE 802.15.4, non-beacon mode). Before sending, a device waits a random
+    number of backoff periods in [0, 2^BE - 1] and assesses the channel (CCA). If the channel is busy, BE is
+    incremented (up to macMaxBE) and the procedure repeats, at most macMaxCSMABackoffs + 1 times.
+    With n concurrent senders, every other sender occupies the channel for a fraction rho = frame time / window of the
+    event window, so a CCA finds the channel busy with probability alpha = 1 - (1 - rho)^(n - 1) and the k-th CCA is
+    reached with probability alpha^k. The expected backoff time and energy are the sums over the attempts, computed
+    with array operations for any number of users at once. The radio is assumed to stay in receive mode while backing
+    off.
+    """
+    def __init__(self, window, payload, i_list):
+        """
+        :param window: Time window the frames of the concurrent senders are spread over [s]
+        :param payload: Payload size of the frames of the other senders [bytes]
+        :param i_list: Current in receive (listening) mode [A]
+        """
+        self.window = window
+        self.occupancy = ((8 * (31 + payload)) / DATA_RATE) / window
+        self.i_list = i_list
+
+        # Duration of every CSMA attempt: mean random backoff plus CCA
+        backoff_exponents = np.minimum(MAC_MIN_BE + np.arange(MAC_MAX_CSMA_BACKOFFS + 1), MAC_MAX_BE)
+        self.attempt_durations = (2.0 ** backoff_exponents - 1) / 2 * UNIT_BACKOFF_PERIOD + CCA_DURATION
+
+    def busy_probability(self, n_senders):
+        """
+        :param n_senders: Number(s) of concurrent senders (including the sender itself).
+        :return: Probability(ies) that a CCA finds the channel busy.
+        """
+        return 1 - (1 - self.occupancy) ** np.maximum(np.asarray(n_senders, dtype=float) - 1, 0)
+
+    def backoff(self, n_senders):
+        """
+        Expected CSMA/CA cost of one frame.
+        :param n_senders: Number(s) of concurrent senders (including the sender itself), scalar or array.
+        :return: Expected backoff time [s], expected backoff charge [As] and channel access failure probability, in
+        the shape of n_senders.
+        """
+        alpha = self.busy_probability(n_senders)
+        reached = alpha[..., None] ** np.arange(MAC_MAX_CSMA_BACKOFFS + 1)
+        duration = reached @ self.attempt_durations
+        return duration, duration * self.i_list, alpha ** (MAC_MAX_CSMA_BACKOFFS + 1)
 
 
 class ZigBee:
@@ -11,10 +68,75 @@ class ZigBee:
         """
         Specifies operating voltage, ACK packet size and effective communication distance.
         """
-        self.config = get_config()['Zigbee']  # load Zigbee config
-        self.voltage = self.config['voltage']  # V
-        self.ack_size = self.config['ack_size']  # bytes
-        self.comm_distance = self.config['comm_distance']  # m effective communication distance for ZigBee
+        self.config = get_settings().zigbee  # load Zigbee config
+        self.voltage = self.config.voltage  # V
+        self.ack_size = self.config.ack_size  # bytes
+        self.comm_distance = self.config.comm_distance  # m effective communication distance for ZigBee
+
+        # static parts of send and receive, computed once
+        self.t_onoff = self.config.t_onoff
+        self.t_list = self.config.t_list
+        self.i_tx = self.config.i_tx
+        self.i_rx = self.config.i_rx
+        self.charge_onoff = self.t_onoff * self.config.i_onoff
+        self.charge_list = self.t_list * self.config.i_list
+        t_ack = (8 * (31 + 11)) / 250000  # s, where 250000 is the data rate in bps and 11 bytes is the ACK
+        self.t_ack = t_ack
+        self.charge_ack = t_ack * self.i_tx
+
+        # optionally, CSMA/CA backoff with the other users in range is accounted for
+        self.csma = None
+        self.backoff_duration = 0
+        self.backoff_charge = 0
+        # per-event state the send costs depend on (see networks/cost_cache.py)
+        self.event_state = None
+        if self.config.contention.enabled:
+            self.csma = ZigBeeCSMA(self.config.contention.window, self.config.contention.payload,
+                                   self.config.i_list)
+
+        # optionally, the send and receive costs per payload size are read from a shared memory-mapped table
+        payload_max = get_settings().network.cost_table.payload_max
+        self.cost_table = load_cost_table("zigbee", lambda: self.cost_surfaces(payload_max), self.config, payload_max)
+        self.table_max = -1
+        if self.cost_table is not None:
+            self.table_max = len(self.cost_table["send_time"]) - 1
+            self.send_table = (self.cost_table["send_power"], self.cost_table["send_time"])
+            self.receive_table = (self.cost_table["receive_power"], self.cost_table["receive_time"])
+
+    def cost_surfaces(self, payload_max):
+        """
+        Send and receive costs without CSMA/CA backoff for all payload sizes up to payload_max (see cost_table.py).
+        :param payload_max: Largest payload size (bytes).
+        :return: Dictionary of the cost arrays, indexed by payload size.
+        """
+        # called from __init__(), before begin_event() sets any backoff
+        payloads = np.arange(payload_max + 1)
+        send_power, send_time = self.send(payloads)
+        receive_power, receive_time = self.receive(payloads)
+        return {"send_power": send_power, "send_time": send_time,
+                "receive_power": receive_power, "receive_time": receive_time}
+
+    def begin_event(self, curr_users_list):
+        """
+        Called before the negotiations of every simulation event. Computes the expected CSMA/CA backoff of a frame
+        with the users within the communication range sending concurrently.
+        :param curr_users_list: List of current users in the environment (User object).
+        """
+        if self.csma is None:
+            return
+        n_senders = sum(1 for u in curr_users_list if check_distance(u.curr_loc, self.comm_distance))
+        duration, charge, _ = self.csma.backoff(n_senders)
+        self.backoff_duration = float(duration)
+        self.backoff_charge = float(charge)
+        self.event_state = (self.backoff_duration, self.backoff_charge)
+
+    def restore_event(self, event_state):
+        """
+        Restore the per-event state set by begin_event() in another process (e.g., in a worker process).
+        :param event_state: event_state of the other ZigBee object (expected backoff duration and charge).
+        """
+        self.backoff_duration, self.backoff_charge = event_state
+        self.event_state = event_state
 
     def startup(self):
         """
@@ -60,17 +182,16 @@ class ZigBee:
         :param payload: payload size (bytes)
         :return: Power and time consumed (W and s).
         """
-        t_tx = (8 * (31 + payload)) / 250000  # s, where 250000 is the data rate in bps
+        if self.csma is None and type(payload) is int and payload <= self.table_max:
+            return float(self.send_table[0][payload]), float(self.send_table[1][payload])
 
-        t_onoff = self.config['t_onoff']
-        i_onoff = self.config['i_onoff']
-        t_list = self.config['t_list']
-        i_list = self.config['i_list']
-        i_tx = self.config['i_tx']
+        t_tx = (8 * (31 + payload)) / 250000  # s, where 250000 is the data rate in bps
 
-        total_duration = t_tx + t_onoff + t_list
+        # expected CSMA/CA backoff before the frame (0 without the contention model)
+        total_duration = t_tx + self.t_onoff + self.t_list + self.backoff_duration
 
-        total_current_consumption = ((t_onoff * i_onoff) + (t_list * i_list) + (t_tx * i_tx)) / total_duration
+        total_current_consumption = ((self.charge_onoff + self.charge_list + (t_tx * self.i_tx) + self.backoff_charge)
+                                     / total_duration)
 
         total_power_consumed = total_current_consumption * self.voltage  # W
 
@@ -82,22 +203,42 @@ class ZigBee:
         :param payload: payload size (bytes)
         :return: Power and time consumed (W and s).
         """
-        t_rx = (8 * (31 + payload)) / 250000  # s
-
-        t_onoff = self.config['t_onoff']
-        i_onoff = self.config['i_onoff']
-        i_rx = self.config['i_rx']
+        if type(payload) is int and payload <= self.table_max:
+            return float(self.receive_table[0][payload]), float(self.receive_table[1][payload])
 
-        t_tx = (8 * (31 + 11)) / 250000  # s, where 250000 is the data rate in bps and 11 bytes is the ACK
-
-        i_tx = self.config['i_tx']
+        t_rx = (8 * (31 + payload)) / 250000  # s
 
         # No need for listening because 802.15.4 sets up a constant 'quiet' period after a transmission
+        # The ACK is sent without CSMA/CA
 
-        total_duration = t_rx + t_onoff + t_tx  # s
+        total_duration = t_rx + self.t_onoff + self.t_ack  # s
 
-        total_current_consumption = ((t_onoff * i_onoff) + (t_rx * i_rx) + (t_tx * i_tx)) / total_duration  # A
+        total_current_consumption = (self.charge_onoff + (t_rx * self.i_rx) + self.charge_ack) / total_duration  # A
 
         total_power_consumed = total_current_consumption * self.voltage  # W
 
         return total_power_consumed, total_duration
+
+    def phase_costs(self, phase, payloads, role, users=None):
+        """
+        Costs of one negotiation phase for a batch of users, see Network.costs(). ZigBee phases:
+         - startup: radio startup (both sides),
+         - association: association of the mote with the coordinator (both sides),
+         - message: the role sends the payload,
+         - ack: the role sends an ACK (ack_size bytes, the payload is ignored).
+        :param phase: Phase name.
+        :param payloads: Array of payload sizes (bytes), one per user.
+        :param role: Side that sends ("user" or "owner").
+        :param users: Unused.
+        :return: ((power, time) of the role, (power, time) of the other side), scalars or arrays, or None if the
+        phase does not exist in ZigBee.
+        """
+        if phase == "startup":
+            return self.startup(), self.startup()
+        if phase == "association":
+            return self.association(), self.association()
+        if phase == "message":
+            return self.send(payloads), self.receive(payloads)
+        if phase == "ack":
+            return self.send(self.ack_size), self.receive(self.ack_size)
+        return None
@@ -0,0 +1,84 @@
+import importlib
+import logging
+from importlib.metadata import entry_points
+
+'''
+Lazy registries of the simulation components (network technologies, negotiation protocols and scenarios).
+
+Components are registered by name with the location of their class ("module:ClassName") and the module is only
+imported when the component is first requested, so a run loads only the components it uses (e.g., a LoRa run does not
+import the BLE model). Third-party components can be added without editing the dispatch code, either at runtime with
+register() or by a package that declares an entry point in the registry's group, e.g., in its pyproject.toml:
+
+    [project.entry-points."gepard.negotiation_protocols"]
+    my_protocol = "my_package.my_protocol:MyProtocol"
+'''
+
+
+class Registry:
+    """
+    Name -> component class registry with lazy imports.
+    """
+    def __init__(self, group, builtins):
+        """
+        :param group: Entry point group of third-party components (e.g., gepard.networks).
+        :param builtins: Dictionary of built-in component names and their "module:ClassName" locations.
+        """
+        self.group = group
+        self.targets = dict(builtins)
+        self.loaded = {}  # name -> class of the components imported so far
+        self.entry_points_loaded = False
+
+    def register(self, name, target):
+        """
+        Register a component.
+        :param name: Component name used in config.yaml and on the command line.
+        :param target: Component class, or its "module:ClassName" location to import it lazily.
+        """
+        self.loaded.pop(name, None)
+        if isinstance(target, str):
+            self.targets[name] = target
+        else:
+            self.targets[name] = f"{target.__module__}:{target.__qualname__}"
+            self.loaded[name] = target
+
+    def _load_entry_points(self):
+        """
+        Add the components installed packages declare in the entry point group. Built-in and registered names take
+        precedence.
+        """
+        self.entry_points_loaded = True
+        installed = entry_points()
+        # Python 3.9 returns a dictionary of groups, select() and the group argument were added in 3.10
+        group = installed.select(group=self.group) if hasattr(installed, "select") else installed.get(self.group, [])
+        for entry_point in group:
+            self.targets.setdefault(entry_point.name, entry_point.value)
+
+    def names(self):
+        """
+        :return: Sorted names of all available components.
+        """
+        if not self.entry_points_loaded:
+            self._load_entry_points()
+        return sorted(self.targets)
+
+    def get(self, name):
+        """
+        Component class registered under the name, importing its module on first use.
+        :param name: Component name.
+        :return: Component class, or None if no component is registered under the name.
+        """
+        if name in self.loaded:
+            return self.loaded[name]
+        if name not in self.targets and not self.entry_points_loaded:
+            self._load_entry_points()
+        target = self.targets.get(name)
+        if target is None:
+            return None
+        module_name, _, class_name = target.partition(":")
+        component = importlib.import_module(module_name)
+        for attribute in class_name.split("."):
+            component = getattr(component, attribute)
+        logging.debug("Loaded %s from %s", name, target)
+        self.loaded[name] = component
+        return component
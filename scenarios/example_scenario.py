@@ -1,13 +1,8 @@
-import random
-
-# visualization imports
-import matplotlib.pyplot as plt
 import numpy as np
-from matplotlib.patches import Circle
 
 from user import User
 
-from util import get_config
+from util import get_settings
 
 
 class ExampleScenario:
@@ -16,23 +11,26 @@ class ExampleScenario:
     Used for first time testing of the code with small number of users in the IoT environment.
     Can be run with any networking technology and negotiatio protocol implemented.
     """
-    def __init__(self, list_of_users, iot_device, network):
+    def __init__(self, list_of_users, iot_device, network, streams):
         """
         Initializes all the users, the IoT device and the space size for the scenario.
         :param list_of_users: List of all User objects.
         :param iot_device: IoT device object.
+        :param network: Network object.
+        :param streams: RandomStreams of the run (per-user generators).
         """
-        self.config = get_config()['Example']  # Load example-specific config
+        self.config = get_settings().example  # Load example-specific config
         self.list_of_users = list_of_users
         self.iot_device = iot_device
-        self.last_arrival = self.config['last_arrival']
+        self.last_arrival = self.config.last_arrival
         # The example scenario radius is assumed to be 50 meters by default
-        self.radius = self.config['radius']
-        self.lmbd = self.config['lambda']  # User arrival rate per minute
-        self.multiplier = self.config['multiplier']
-        self.speed_min = self.config['speed_min']
-        self.speed_max = self.config['speed_max']
+        self.radius = self.config.radius
+        self.lmbd = self.config.lmbd  # User arrival rate per minute
+        self.multiplier = self.config.multiplier
+        self.speed_min = self.config.speed_min
+        self.speed_max = self.config.speed_max
         self.network = network
+        self.streams = streams
 
     def generate_scenario(self, dist):
         """
@@ -48,16 +46,19 @@ class ExampleScenario:
 
         # New arrivals come until midnight as we simulate 1 full day
         while arrival_time <= self.last_arrival:
+            # All user-specific randomness comes from the user's own stream
+            rng = self.streams.user(user_id)
+
             # Generate the speed
-            speed = self.multiplier * random.uniform(self.speed_min, self.speed_max)
+            speed = self.multiplier * rng.uniform(self.speed_min, self.speed_max)
 
             # Generate user arrival angle and calculate coordinates on the sensing disk
-            arrival_angle = np.random.rand() * np.pi * 2
+            arrival_angle = rng.random() * np.pi * 2
             x_a = np.cos(arrival_angle) * self.radius
             y_a = np.sin(arrival_angle) * self.radius
 
             # Generate departure angle and calculate coordinates on the sensing disk
-            departure_angle = np.random.rand() * np.pi * 2
+            departure_angle = rng.random() * np.pi * 2
             x_d = np.cos(departure_angle) * self.radius
             y_d = np.sin(departure_angle) * self.radius
 
@@ -110,30 +111,28 @@ class ExampleScenario:
                         within_comm_range_time = distance / speed
 
             # Privacy fundamentalists (1), privacy pragmatists (2), and privacy unconcerned (3)
-            privacy_coeff = random.choice([1] * self.config['privacy_fundamentalists_proportion']
-                                          + [2] * self.config['privacy_pragmatists_proportion']
-                                          + [3] * self.config['privacy_unconcerned_proportion'])
+            privacy_coeff = rng.choice(self.config.privacy_label_population)
             if privacy_coeff == 1:
-                privacy_coeff = random.uniform(*self.config['privacy_fundamentalists_coeff_range'])
+                privacy_coeff = rng.uniform(*self.config.privacy_fundamentalists_coeff_range)
                 privacy_label = 1
             elif privacy_coeff == 2:
                 privacy_label = 2
-                privacy_coeff = random.uniform(*self.config['privacy_pragmatists_coeff_range'])
+                privacy_coeff = rng.uniform(*self.config.privacy_pragmatists_coeff_range)
             else:
                 privacy_label = 3
-                privacy_coeff = random.uniform(*self.config['privacy_unconcerned_coeff_range'])
+                privacy_coeff = rng.uniform(*self.config.privacy_unconcerned_coeff_range)
 
             # Define weights for utility calculation
             # same as hospital scenario
             # for example scenario we assume that service provided is more important than energy consumed for user
             # and that data collected is more important than energy consumed for IoT device
             # first is data/service and second is energy
-            weights = [self.config['time_weight'], self.config['energy_weight']]
+            weights = [self.config.time_weight, self.config.energy_weight]
 
             self.iot_device.update_weights(weights)
 
             # Create the user and append to the list
-            user = User(user_id, speed, (x_a, y_a), (x_d, y_d), privacy_label, privacy_coeff, weights)
+            user = User(user_id, speed, (x_a, y_a), (x_d, y_d), privacy_label, privacy_coeff, weights, rng)
             self.list_of_users.append(user)
             user_id += 1
 
@@ -165,6 +164,10 @@ class ExampleScenario:
         Method used to vizualize the scenario, i.e., space, user arrival/departure points and
         trajectory across the space.
         """
+        # imported here, so that simulation runs do not load matplotlib
+        import matplotlib.pyplot as plt
+        from matplotlib.patches import Circle
+
         fig, ax = plt.subplots()
         plt.rcParams['figure.figsize'] = [4, 4]
 
@@ -1,29 +1,29 @@
-from scenarios.shopping_mall import ShoppingMall
-from scenarios.hospital import Hospital
-from scenarios.university import University
-from scenarios.example_scenario import ExampleScenario
 import sys
 import logging
 
+from registry import Registry
+
+# Scenarios by name, imported on first use
+SCENARIOS = Registry("gepard.scenarios", {
+    "example_scenario": "scenarios.example_scenario:ExampleScenario",
+    "shopping_mall": "scenarios.shopping_mall:ShoppingMall",
+    "hospital": "scenarios.hospital:Hospital",
+    "university": "scenarios.university:University",
+})
+
 
 class Scenario:
     """
     Metaclass for the Scenarios. Used to unify and call different scenario implementations.
     """
-    def __init__(self, scenario, list_of_users, iot_device, network):
+    def __init__(self, scenario, list_of_users, iot_device, network, streams):
         self.list_of_users = list_of_users
         self.iot_device = iot_device
-        if scenario == "example_scenario":
-            self.scenario = ExampleScenario(list_of_users, iot_device, network)
-        elif scenario == "shopping_mall":
-            self.scenario = ShoppingMall(list_of_users, iot_device, network)
-        elif scenario == "hospital":
-            self.scenario = Hospital(list_of_users, iot_device, network)
-        elif scenario == "university":
-            self.scenario = University(list_of_users, iot_device, network)
-        else:
+        scenario_class = SCENARIOS.get(scenario)
+        if scenario_class is None:
             logging.error("Scenario not supported")
             sys.exit(1)
+        self.scenario = scenario_class(list_of_users, iot_device, network, streams)
 
     def generate_scenario(self, distribution):
         """
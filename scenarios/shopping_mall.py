@@ -1,12 +1,7 @@
-import random
-
-# visualization imports
-import matplotlib.pyplot as plt
 import numpy as np
-from matplotlib.patches import Circle
 
 from user import User
-from util import get_config
+from util import get_settings
 
 
 class ShoppingMall:
@@ -14,26 +9,29 @@ class ShoppingMall:
     Implements the Shopping Mall scenario.
     """
 
-    def __init__(self, list_of_users, iot_device, network):
+    def __init__(self, list_of_users, iot_device, network, streams):
         """
         Initializes all the users, the IoT device and the space size for the scenario.
         :param list_of_users: List of all User objects.
         :param iot_device: IoT device object.
+        :param network: Network object.
+        :param streams: RandomStreams of the run (per-user generators).
         """
-        self.config = get_config()['ShoppingMall']  # Load shopping mall-specific config
+        self.config = get_settings().shopping_mall  # Load shopping mall-specific config
         self.list_of_users = list_of_users
         self.iot_device = iot_device
         # The radius of the shopping mall is assumed to be 120 meters
-        self.radius = self.config['radius']
-        self.last_arrival = self.config['last_arrival']
+        self.radius = self.config.radius
+        self.last_arrival = self.config.last_arrival
         # Arrival lambda is assumed from shopping mall data analysis papers
         # ref: https://arxiv.org/pdf/1905.13098.pdf
         # customers per min.
-        self.lmbd = self.config['lambda']  # User arrival rate per minute
-        self.multiplier = self.config['multiplier']
-        self.speed_min = self.config['speed_min']
-        self.speed_max = self.config['speed_max']
+        self.lmbd = self.config.lmbd  # User arrival rate per minute
+        self.multiplier = self.config.multiplier
+        self.speed_min = self.config.speed_min
+        self.speed_max = self.config.speed_max
         self.network = network
+        self.streams = streams
 
     def generate_scenario(self, dist):
         """
@@ -49,16 +47,19 @@ class ShoppingMall:
 
         # New arrivals come until 8 pm
         while arrival_time <= self.last_arrival:
+            # All user-specific randomness comes from the user's own stream
+            rng = self.streams.user(user_id)
+
             # Generate the speed (m/min.)
-            speed = self.multiplier * np.random.uniform(self.speed_min, self.speed_max)
+            speed = self.multiplier * rng.uniform(self.speed_min, self.speed_max)
 
             # Generate user arrival angle and calculate coordinates on the sensing disk
-            arrival_angle = np.random.rand() * np.pi * 2
+            arrival_angle = rng.random() * np.pi * 2
             x_a = np.cos(arrival_angle) * self.radius
             y_a = np.sin(arrival_angle) * self.radius
 
             # Generate departure angle and calculate coordinates on the sensing disk
-            departure_angle = np.random.rand() * np.pi * 2
+            departure_angle = rng.random() * np.pi * 2
             x_d = np.cos(departure_angle) * self.radius
             y_d = np.sin(departure_angle) * self.radius
 
@@ -111,29 +112,27 @@ class ShoppingMall:
                         within_comm_range_time = distance / speed
 
             # Privacy fundamentalists (1), privacy pragmatists (2), and privacy unconcerned (3)
-            privacy_coeff = random.choice([1] * self.config['privacy_fundamentalists_proportion']
-                                          + [2] * self.config['privacy_pragmatists_proportion']
-                                          + [3] * self.config['privacy_unconcerned_proportion'])
+            privacy_coeff = rng.choice(self.config.privacy_label_population)
             if privacy_coeff == 1:
-                privacy_coeff = random.uniform(*self.config['privacy_fundamentalists_coeff_range'])
+                privacy_coeff = rng.uniform(*self.config.privacy_fundamentalists_coeff_range)
                 privacy_label = 1
             elif privacy_coeff == 2:
                 privacy_label = 2
-                privacy_coeff = random.uniform(*self.config['privacy_pragmatists_coeff_range'])
+                privacy_coeff = rng.uniform(*self.config.privacy_pragmatists_coeff_range)
             else:
                 privacy_label = 3
-                privacy_coeff = random.uniform(*self.config['privacy_unconcerned_coeff_range'])
+                privacy_coeff = rng.uniform(*self.config.privacy_unconcerned_coeff_range)
 
             # Define weights for utility calculation
             # for shopping mall scenario we assume that energy consumed is more important than service provided for user
             # but that data collected is more important than energy consumed for IoT device
             # first is time and second is energy
-            weights = [self.config['time_weight'], self.config['energy_weight']]
+            weights = [self.config.time_weight, self.config.energy_weight]
 
             self.iot_device.update_weights(weights)
 
             # Create the user and append to the list
-            user = User(user_id, speed, (x_a, y_a), (x_d, y_d), privacy_label, privacy_coeff, weights)
+            user = User(user_id, speed, (x_a, y_a), (x_d, y_d), privacy_label, privacy_coeff, weights, rng)
             self.list_of_users.append(user)
             user_id += 1
 
@@ -165,6 +164,10 @@ class ShoppingMall:
         Method used to visualize the scenario, i.e., space, user arrival/departure points and
         trajectory across the space.
         """
+        # imported here, so that simulation runs do not load matplotlib
+        import matplotlib.pyplot as plt
+        from matplotlib.patches import Circle
+
         fig, ax = plt.subplots()
         plt.rcParams['figure.figsize'] = [4, 4]
 
@@ -1,10 +1,5 @@
-import random
-
-# visualization imports
-import matplotlib.pyplot as plt
 import numpy as np
-from matplotlib.patches import Circle
-from util import get_config
+from util import get_settings
 
 from user import User
 
@@ -13,25 +8,26 @@ class University:
     """
     Implements the Shopping Mall scenario.
     """
-    def __init__(self, list_of_users, iot_device, network):
+    def __init__(self, list_of_users, iot_device, network, streams):
         """
         Initializes all the users, the IoT device and the space size for the scenario.
         :param list_of_users: List of all User objects.
         :param iot_device: IoT device object.
         :param network: Network object to determine the communication range.
         """
-        self.config = get_config()['University']  # Load config once
+        self.config = get_settings().university  # Load config once
         self.list_of_users = list_of_users
         self.iot_device = iot_device
         # The university radius is assumed to be the middle ground, i.e., 80 meters
-        self.radius = self.config['radius']
+        self.radius = self.config.radius
         # Assume university to work 24/7 (smoothes out the peaks at noon and emptiness at nights)
-        self.last_arrival = self.config['last_arrival']
-        self.lmbd = self.config['lambda']  # base arrival rate per minute
-        self.multiplier = self.config['multiplier']
-        self.speed_min = self.config['speed_min']
-        self.speed_max = self.config['speed_max']
+        self.last_arrival = self.config.last_arrival
+        self.lmbd = self.config.lmbd  # base arrival rate per minute
+        self.multiplier = self.config.multiplier
+        self.speed_min = self.config.speed_min
+        self.speed_max = self.config.speed_max
         self.network = network
+        self.streams = streams
 
     def generate_scenario(self, dist):
         """
@@ -51,17 +47,20 @@ class University:
         user_id = 0
 
         while arrival_time <= self.last_arrival:
+            # All user-specific randomness comes from the user's own stream
+            rng = self.streams.user(user_id)
+
             # Generate the speed (m/min.)
             # increase speed by 10% as in university people will walk faster
-            speed = self.multiplier * np.random.uniform(self.speed_min, self.speed_max)
+            speed = self.multiplier * rng.uniform(self.speed_min, self.speed_max)
 
             # Generate user arrival angle and calculate coordinates on the sensing disk
-            arrival_angle = np.random.rand() * np.pi * 2
+            arrival_angle = rng.random() * np.pi * 2
             x_a = np.cos(arrival_angle) * self.radius
             y_a = np.sin(arrival_angle) * self.radius
 
             # Generate departure angle and calculate coordinates on the sensing disk
-            departure_angle = np.random.rand() * np.pi * 2
+            departure_angle = rng.random() * np.pi * 2
             x_d = np.cos(departure_angle) * self.radius
             y_d = np.sin(departure_angle) * self.radius
 
@@ -118,33 +117,31 @@ class University:
                         within_comm_range_time = distance / speed
 
             # Privacy fundamentalists (1), privacy pragmatists (2), and privacy unconcerned (3)
-            privacy_coeff = random.choice([1] * self.config['privacy_fundamentalists_proportion']
-                                          + [2] * self.config['privacy_pragmatists_proportion']
-                                          + [3] * self.config['privacy_unconcerned_proportion'])
+            privacy_coeff = rng.choice(self.config.privacy_label_population)
             if privacy_coeff == 1:
-                privacy_coeff = random.uniform(*self.config['privacy_fundamentalists_coeff_range'])
+                privacy_coeff = rng.uniform(*self.config.privacy_fundamentalists_coeff_range)
                 privacy_label = 1
             elif privacy_coeff == 2:
                 privacy_label = 2
-                privacy_coeff = random.uniform(*self.config['privacy_pragmatists_coeff_range'])
+                privacy_coeff = rng.uniform(*self.config.privacy_pragmatists_coeff_range)
             else:
                 privacy_label = 3
-                privacy_coeff = random.uniform(*self.config['privacy_unconcerned_coeff_range'])
+                privacy_coeff = rng.uniform(*self.config.privacy_unconcerned_coeff_range)
 
             # Adjust privacy coefficient to be lower since university is less privacy sensitive?
             # TODO: this doesn't seem to have any implications right now
-            privacy_coeff = self.config['privacy_adjustment_factor'] * privacy_coeff
+            privacy_coeff = self.config.privacy_adjustment_factor * privacy_coeff
 
             # Define weights for utility calculation
             # for university scenario we assume that energy consumed is more important than service provided for user
             # and that energy consumed is more important than data collected for IoT device
             # first is time and second is energy
-            weights = [self.config['time_weight'], self.config['energy_weight']]
+            weights = [self.config.time_weight, self.config.energy_weight]
 
             self.iot_device.update_weights(weights)
 
             # Create the user and append to the list
-            user = User(user_id, speed, (x_a, y_a), (x_d, y_d), privacy_label, privacy_coeff, weights)
+            user = User(user_id, speed, (x_a, y_a), (x_d, y_d), privacy_label, privacy_coeff, weights, rng)
             self.list_of_users.append(user)
             user_id += 1
 
@@ -175,6 +172,10 @@ class University:
         Method used to visualize the scenario, i.e., space, user arrival/departure points and
         trajectory across the space.
         """
+        # imported here, so that simulation runs do not load matplotlib
+        import matplotlib.pyplot as plt
+        from matplotlib.patches import Circle
+
         fig, ax = plt.subplots()
         plt.rcParams['figure.figsize'] = [4, 4]
 
@@ -1,8 +1,11 @@
+import numpy as np
+
+
 class User:
     """
     User object implementation.
     """
-    def __init__(self, id_, speed, arr_loc, dep_loc, privacy_label, privacy_coeff, weights):
+    def __init__(self, id_, speed, arr_loc, dep_loc, privacy_label, privacy_coeff, weights, rng=None):
         """
         Initializes the user object.
         :param id_: Unique user id.
@@ -14,6 +17,8 @@ class User:
         :param privacy_coeff: Privacy coefficient (depends on label, for example
         see :func:`~scenarios.hospital.generate_scenario`).
         :param weights: Weights used in utility calculations (data vs energy trade-off).
+        :param rng: User's own numpy Generator (see util.RandomStreams), used for all the user's random decisions.
+        If None, an unseeded one is used.
         """
         self.id_ = id_
         self.speed = speed
@@ -34,6 +39,7 @@ class User:
         self.time_spent = 0.0
         self.weights = weights
         self.offers = []
+        self.rng = rng if rng is not None else np.random.default_rng()
 
     def update_utility(self, utility):
         """
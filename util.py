@@ -2,11 +2,10 @@ import numpy as np
 import shutil
 import os
 import csv
-import random
 import math
 import logging
-from scipy.integrate import quad
-from scipy.optimize import fsolve
+from dataclasses import dataclass, fields
+from functools import lru_cache, partial
 import yaml
 
 
@@ -36,6 +35,756 @@ def get_config():
     return _config
 
 
+def _setting(data, section, key, default=None, kind=(int, float), probability=False, positive=False):
+    """
+    Read and validate a single setting from a config.yaml section.
+    :param data: Section dictionary from config.yaml.
+    :param section: Section name (used in error messages).
+    :param key: Setting name.
+    :param default: Value to use if the setting is missing. If None, the setting is required.
+    :param kind: Accepted type(s) of the setting.
+    :param probability: Whether the setting must lie within [0, 1].
+    :param positive: Whether the setting must be strictly positive.
+    :return: Setting value.
+    """
+    if key not in data:
+        if default is None:
+            raise ValueError(f"Missing setting '{key}' in section '{section}' of config.yaml")
+        return default
+
+    value = data[key]
+    if isinstance(value, bool) or not isinstance(value, kind):
+        raise ValueError(f"Setting '{key}' in section '{section}' of config.yaml has invalid type "
+                         f"{type(value).__name__}")
+    if probability and not 0 <= value <= 1:
+        raise ValueError(f"Setting '{key}' in section '{section}' of config.yaml must be within [0, 1]")
+    if positive and value <= 0:
+        raise ValueError(f"Setting '{key}' in section '{section}' of config.yaml must be positive")
+    return value
+
+
+def _setting_range(data, section, key):
+    """
+    Read and validate a [low, high] range setting from a config.yaml section.
+    :param data: Section dictionary from config.yaml.
+    :param section: Section name (used in error messages).
+    :param key: Setting name.
+    :return: (low, high) tuple.
+    """
+    value = _setting(data, section, key, kind=(list, tuple))
+    if len(value) != 2 or not all(isinstance(v, (int, float)) for v in value) or value[0] > value[1]:
+        raise ValueError(f"Setting '{key}' in section '{section}' of config.yaml must be a [low, high] range")
+    return tuple(value)
+
+
+def _project_path(path):
+    """
+    Resolve an optional file path setting; relative paths are relative to the project root.
+    :param path: Path from config.yaml (empty or None for no path).
+    :return: Absolute path or None.
+    """
+    if not path:
+        return None
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+
+
+@dataclass(frozen=True)
+class PrivacyTypeSettings:
+    """
+    Values given per privacy type (fundamentalist, pragmatist and, optionally, unconcerned).
+    """
+    fundamentalist: object
+    pragmatist: object
+    unconcerned: object = None
+
+    @classmethod
+    def from_dict(cls, data, section, read=_setting):
+        """
+        :param data: Dictionary keyed by privacy type.
+        :param section: Section name (used in error messages).
+        :param read: Function used to read and validate each value.
+        :return: PrivacyTypeSettings object.
+        """
+        return cls(read(data, section, 'fundamentalist'), read(data, section, 'pragmatist'),
+                   read(data, section, 'unconcerned') if 'unconcerned' in data else None)
+
+
+@dataclass(frozen=True)
+class TournamentSettings:
+    """
+    Tournament parameters.
+    """
+    runs: int
+    networks: tuple
+    scenarios: tuple
+    protocols: tuple
+
+    @classmethod
+    def from_dict(cls, data, section='Tournament'):
+        """
+        :param data: Section dictionary from config.yaml.
+        :param section: Section name.
+        :return: TournamentSettings object.
+        """
+        return cls(_setting(data, section, 'runs', kind=int, positive=True),
+                   *(tuple(_setting(data, section, key, kind=list)) for key in ('networks', 'scenarios', 'protocols')))
+
+
+@dataclass(frozen=True)
+class ScenarioSettings:
+    """
+    Scenario parameters (shared by University, Hospital, ShoppingMall and Example).
+    """
+    radius: float
+    last_arrival: float
+    lmbd: float
+    multiplier: float
+    speed_min: float
+    speed_max: float
+    privacy_fundamentalists_proportion: int
+    privacy_pragmatists_proportion: int
+    privacy_unconcerned_proportion: int
+    privacy_fundamentalists_coeff_range: tuple
+    privacy_pragmatists_coeff_range: tuple
+    privacy_unconcerned_coeff_range: tuple
+    privacy_adjustment_factor: float
+    time_weight: float
+    energy_weight: float
+    # Pre-derived population of privacy labels (1, 2, 3) to draw user privacy labels from
+    privacy_label_population: tuple
+
+    @classmethod
+    def from_dict(cls, data, section):
+        """
+        :param data: Section dictionary from config.yaml.
+        :param section: Section name.
+        :return: ScenarioSettings object.
+        """
+        proportions = [_setting(data, section, f'privacy_{t}_proportion', kind=int)
+                       for t in ('fundamentalists', 'pragmatists', 'unconcerned')]
+        return cls(radius=_setting(data, section, 'radius', positive=True),
+                   last_arrival=_setting(data, section, 'last_arrival', positive=True),
+                   lmbd=_setting(data, section, 'lambda', positive=True),
+                   multiplier=_setting(data, section, 'multiplier', positive=True),
+                   speed_min=_setting(data, section, 'speed_min', positive=True),
+                   speed_max=_setting(data, section, 'speed_max', positive=True),
+                   privacy_fundamentalists_proportion=proportions[0],
+                   privacy_pragmatists_proportion=proportions[1],
+                   privacy_unconcerned_proportion=proportions[2],
+                   privacy_fundamentalists_coeff_range=_setting_range(data, section,
+                                                                      'privacy_fundamentalists_coeff_range'),
+                   privacy_pragmatists_coeff_range=_setting_range(data, section, 'privacy_pragmatists_coeff_range'),
+                   privacy_unconcerned_coeff_range=_setting_range(data, section, 'privacy_unconcerned_coeff_range'),
+                   privacy_adjustment_factor=_setting(data, section, 'privacy_adjustment_factor', default=1.0),
+                   time_weight=_setting(data, section, 'time_weight'),
+                   energy_weight=_setting(data, section, 'energy_weight'),
+                   privacy_label_population=tuple([1] * proportions[0] + [2] * proportions[1]
+                                                  + [3] * proportions[2]))
+
+
+@dataclass(frozen=True)
+class LoraMode:
+    """
+    LoRa SF/BW combination with its maximum payload (bytes) and transmission current (mA).
+    """
+    sf: int
+    bw: float
+    lora_max_payload: int
+    i_tx: float
+
+
+@dataclass(frozen=True)
+class LoraChannelSettings:
+    """
+    LoRa channel model (collisions and duty cycle) parameters.
+    """
+    enabled: bool = False
+    window: float = 60.0  # s
+    duty_cycle: float = 0.01
+    max_attempts: int = 8
+    payload: int = 51  # bytes sent by every other user per window
+
+
+@dataclass(frozen=True)
+class LoraSettings:
+    """
+    LoRa network parameters.
+    """
+    voltage: float
+    i_rx: float
+    cr: float
+    lora_max_payload: int
+    sf: int
+    bw: float
+    i_tx: float
+    comm_distance: float
+    mode_configs: tuple  # of LoraMode, in config.yaml order
+    channel: LoraChannelSettings
+
+    @classmethod
+    def from_dict(cls, data, section='Lora'):
+        """
+        :param data: Section dictionary from config.yaml.
+        :param section: Section name.
+        :return: LoraSettings object.
+        """
+        modes = []
+        for (sf, bw), mode in _setting(data, section, 'mode_configs', kind=list):
+            modes.append(LoraMode(sf, bw, _setting(mode, section, 'lora_max_payload', kind=int, positive=True),
+                                  _setting(mode, section, 'i_tx', positive=True)))
+        if not modes:
+            raise ValueError(f"Setting 'mode_configs' in section '{section}' of config.yaml is empty")
+
+        channel = data.get('channel') or {}
+        defaults = LoraChannelSettings()
+        channel_settings = LoraChannelSettings(
+            enabled=bool(channel.get('enabled', False)),
+            window=_setting(channel, section, 'window', default=defaults.window, positive=True),
+            duty_cycle=_setting(channel, section, 'duty_cycle', default=defaults.duty_cycle, probability=True,
+                                positive=True),
+            max_attempts=_setting(channel, section, 'max_attempts', default=defaults.max_attempts, kind=int,
+                                  positive=True),
+            payload=_setting(channel, section, 'payload', default=defaults.payload, kind=int, positive=True))
+
+        return cls(voltage=_setting(data, section, 'voltage', positive=True),
+                   i_rx=_setting(data, section, 'i_rx', positive=True),
+                   cr=_setting(data, section, 'cr', positive=True),
+                   lora_max_payload=_setting(data, section, 'lora_max_payload', kind=int, positive=True),
+                   sf=_setting(data, section, 'sf', kind=int, positive=True),
+                   bw=_setting(data, section, 'bw', positive=True),
+                   i_tx=_setting(data, section, 'i_tx', positive=True),
+                   comm_distance=_setting(data, section, 'comm_distance', positive=True),
+                   mode_configs=tuple(modes), channel=channel_settings)
+
+
+@dataclass(frozen=True)
+class ZigbeeContentionSettings:
+    """
+    ZigBee CSMA/CA contention model parameters.
+    """
+    enabled: bool = False
+    window: float = 1.0  # s
+    payload: int = 65  # bytes sent by every other user per window
+
+
+@dataclass(frozen=True)
+class ZigbeeSettings:
+    """
+    ZigBee network parameters.
+    """
+    voltage: float
+    ack_size: int
+    comm_distance: float
+    t_onoff: float
+    i_onoff: float
+    t_list: float
+    i_list: float
+    i_tx: float
+    i_rx: float
+    contention: ZigbeeContentionSettings
+
+    @classmethod
+    def from_dict(cls, data, section='Zigbee'):
+        """
+        :param data: Section dictionary from config.yaml.
+        :param section: Section name.
+        :return: ZigbeeSettings object.
+        """
+        contention = data.get('contention') or {}
+        defaults = ZigbeeContentionSettings()
+        contention_settings = ZigbeeContentionSettings(
+            enabled=bool(contention.get('enabled', False)),
+            window=_setting(contention, section, 'window', default=defaults.window, positive=True),
+            payload=_setting(contention, section, 'payload', default=defaults.payload, kind=int, positive=True))
+        return cls(contention=contention_settings,
+                   **{f.name: _setting(data, section, f.name, positive=True) for f in fields(cls)
+                      if f.name != 'contention'})
+
+
+@dataclass(frozen=True)
+class DiscoverySettings:
+    """
+    BLE device discovery model parameters (see BLEDiscovery).
+    """
+    n_points: int = 100
+    epsilon_hit: float = 0.9999
+    adv_interval: float = 0.25  # Ta [s]
+    scan_interval: float = 5  # Ts [s]
+    scan_window: float = 2  # ds [s]
+    rho_max: float = 0.01  # [s]
+    max_time: float = 1000  # [s]
+
+    @classmethod
+    def from_dict(cls, data, section='BLE'):
+        """
+        :param data: discovery dictionary of the BLE section (missing values take the defaults above).
+        :param section: Section name.
+        :return: DiscoverySettings object.
+        """
+        defaults = cls()
+        settings = cls(n_points=_setting(data, section, 'n_points', default=defaults.n_points, kind=int,
+                                         positive=True),
+                       epsilon_hit=_setting(data, section, 'epsilon_hit', default=defaults.epsilon_hit,
+                                            probability=True),
+                       **{key: _setting(data, section, key, default=getattr(defaults, key), positive=True)
+                          for key in ('adv_interval', 'scan_interval', 'scan_window', 'rho_max', 'max_time')})
+        if settings.scan_window > settings.scan_interval:
+            raise ValueError(f"Setting 'scan_window' in section '{section}' of config.yaml must not exceed "
+                             f"'scan_interval'")
+        return settings
+
+    def arguments(self):
+        """
+        :return: Positional arguments (n_points, epsilon_hit, Ta, Ts, ds, rho_max, max_time) of the discovery model.
+        """
+        return (self.n_points, self.epsilon_hit, self.adv_interval, self.scan_interval, self.scan_window,
+                self.rho_max, self.max_time)
+
+
+@dataclass(frozen=True)
+class DiscoveryCacheSettings:
+    """
+    BLE discovery model result cache parameters.
+    """
+    enabled: bool = True
+    max_entries: int = 256
+    path: str = None  # absolute path of the on-disk store (None for in-memory only)
+
+
+@dataclass(frozen=True)
+class DiscoveryTableSettings:
+    """
+    BLE discovery model lookup table parameters.
+    """
+    enabled: bool = False
+    path: str = None  # absolute path of the .npz table
+    max_error: float = 0.05  # largest accepted relative interpolation error of the table
+
+
+@dataclass(frozen=True)
+class DiscoveryAdaptiveSettings:
+    """
+    BLE discovery model adaptive precision parameters.
+    """
+    enabled: bool = False
+    rel_tol: float = 1e-3
+    abs_tol: float = 0.0
+    n_initial: int = 8
+    n_max: int = 1024
+
+
+@dataclass(frozen=True)
+class ContentionSettings:
+    """
+    BLE advertising contention model parameters.
+    """
+    enabled: bool = False
+    adv_payload: int = 0  # privacy policy bytes in the advertisements of the other users [bytes]
+
+
+@dataclass(frozen=True)
+class BLESettings:
+    """
+    BLE network parameters.
+    """
+    voltage: float
+    comm_distance: float
+    discovery: DiscoverySettings
+    discovery_cache: DiscoveryCacheSettings
+    discovery_table: DiscoveryTableSettings
+    discovery_adaptive: DiscoveryAdaptiveSettings
+    contention: ContentionSettings
+
+    @classmethod
+    def from_dict(cls, data, section='BLE'):
+        """
+        :param data: Section dictionary from config.yaml.
+        :param section: Section name.
+        :return: BLESettings object.
+        """
+        cache = data.get('discovery_cache') or {}
+        discovery_cache = DiscoveryCacheSettings(enabled=bool(cache.get('enabled', True)),
+                                                 max_entries=_setting(cache, section, 'max_entries', default=256,
+                                                                      kind=int, positive=True),
+                                                 path=_project_path(cache.get('path')))
+        table = data.get('discovery_table') or {}
+        discovery_table = DiscoveryTableSettings(enabled=bool(table.get('enabled', False)),
+                                                 path=_project_path(table.get('path')),
+                                                 max_error=_setting(table, section, 'max_error', default=0.05,
+                                                                    positive=True))
+        adaptive = data.get('discovery_adaptive') or {}
+        n_initial = _setting(adaptive, section, 'n_initial', default=8, kind=int, positive=True)
+        n_max = _setting(adaptive, section, 'n_max', default=1024, kind=int, positive=True)
+        if n_max < n_initial:
+            raise ValueError(f"Setting 'n_max' in section '{section}' of config.yaml must not be smaller than "
+                             f"'n_initial'")
+        discovery_adaptive = DiscoveryAdaptiveSettings(enabled=bool(adaptive.get('enabled', False)),
+                                                       rel_tol=_setting(adaptive, section, 'rel_tol', default=1e-3),
+                                                       abs_tol=_setting(adaptive, section, 'abs_tol', default=0.0),
+                                                       n_initial=n_initial, n_max=n_max)
+        contention = data.get('contention') or {}
+        contention_settings = ContentionSettings(enabled=bool(contention.get('enabled', False)),
+                                                 adv_payload=_setting(contention, section, 'adv_payload', default=0,
+                                                                      kind=int))
+        if contention_settings.adv_payload < 0:
+            raise ValueError(f"Setting 'adv_payload' in section '{section}' of config.yaml must not be negative")
+        return cls(voltage=_setting(data, section, 'voltage', positive=True),
+                   comm_distance=_setting(data, section, 'comm_distance', positive=True),
+                   discovery=DiscoverySettings.from_dict(data.get('discovery') or {}, section),
+                   discovery_cache=discovery_cache, discovery_table=discovery_table,
+                   discovery_adaptive=discovery_adaptive, contention=contention_settings)
+
+
+@dataclass(frozen=True)
+class CostCacheSettings:
+    """
+    Network primitive cost cache parameters.
+    """
+    enabled: bool = False
+    max_entries: int = 4096
+
+
+@dataclass(frozen=True)
+class CostTableSettings:
+    """
+    Memory-mapped network cost table parameters.
+    """
+    enabled: bool = False
+    path: str = None  # absolute path of the directory holding the tables
+    payload_max: int = 4096  # largest payload size (bytes) in the per-payload tables
+
+
+@dataclass(frozen=True)
+class ReplaySettings:
+    """
+    Network cost record/replay parameters.
+    """
+    mode: str = "off"  # off, record or replay
+    path: str = None  # absolute path of the directory holding the logs
+    strict: bool = False  # replay: fail on queries the log does not cover instead of computing them
+
+
+@dataclass(frozen=True)
+class NetworkSettings:
+    """
+    Parameters shared by all network technologies.
+    """
+    cost_cache: CostCacheSettings = CostCacheSettings()
+    cost_table: CostTableSettings = CostTableSettings()
+    replay: ReplaySettings = ReplaySettings()
+
+    @classmethod
+    def from_dict(cls, data, section='Network'):
+        """
+        :param data: Section dictionary from config.yaml.
+        :param section: Section name.
+        :return: NetworkSettings object.
+        """
+        cache = data.get('cost_cache') or {}
+        table = data.get('cost_table') or {}
+        replay = data.get('replay') or {}
+        # YAML reads an unquoted off as False
+        replay_settings = ReplaySettings(mode=str(replay.get('mode') or 'off'), path=_project_path(replay.get('path')),
+                                         strict=bool(replay.get('strict', False)))
+        if replay_settings.mode not in ('off', 'record', 'replay'):
+            raise ValueError(f"Setting 'mode' in section '{section}' of config.yaml must be off, record or replay")
+        if replay_settings.mode != 'off' and replay_settings.path is None:
+            raise ValueError(f"Setting 'path' in section '{section}' of config.yaml is required for record/replay")
+        return cls(cost_cache=CostCacheSettings(enabled=bool(cache.get('enabled', False)),
+                                                max_entries=_setting(cache, section, 'max_entries', default=4096,
+                                                                     kind=int, positive=True)),
+                   cost_table=CostTableSettings(enabled=bool(table.get('enabled', False)),
+                                                path=_project_path(table.get('path')),
+                                                payload_max=_setting(table, section, 'payload_max', default=4096,
+                                                                     kind=int, positive=True)),
+                   replay=replay_settings)
+
+
+@dataclass(frozen=True)
+class ExecutionSettings:
+    """
+    Execution backend parameters (see executor.py).
+    """
+    mode: str = "inline"  # inline, thread or process
+    workers: int = None  # maximum number of worker threads/processes (None for the default)
+    inline_threshold: int = 8  # batches with fewer items run inline
+
+    @classmethod
+    def from_dict(cls, data, section='Execution'):
+        """
+        :param data: Section dictionary from config.yaml.
+        :param section: Section name.
+        :return: ExecutionSettings object.
+        """
+        mode = data.get('mode', 'inline')
+        if mode not in ('inline', 'thread', 'process'):
+            raise ValueError(f"Setting 'mode' in section '{section}' of config.yaml must be inline, thread or process")
+        workers = data.get('workers')
+        return cls(mode=mode,
+                   workers=None if workers is None else _setting(data, section, 'workers', kind=int, positive=True),
+                   inline_threshold=_setting(data, section, 'inline_threshold', default=8, kind=int))
+
+
+@dataclass(frozen=True)
+class PragmatistThresholds:
+    """
+    Alanezi pragmatist consent thresholds.
+    """
+    one_phase: float
+    two_phase: float
+
+
+@dataclass(frozen=True)
+class AlaneziSettings:
+    """
+    Alanezi negotiation protocol parameters.
+    """
+    user_pp_size: int
+    owner_pp_size: int
+    privacy_dim: tuple  # of (t, r, s, i) tuples
+    gamma_ranges: PrivacyTypeSettings  # of (low, high) ranges
+    pragmatist_thresholds: PragmatistThresholds
+
+    @classmethod
+    def from_dict(cls, data, section='Alanezi'):
+        """
+        :param data: Section dictionary from config.yaml.
+        :param section: Section name.
+        :return: AlaneziSettings object.
+        """
+        thresholds = _setting(data, section, 'pragmatist_thresholds', kind=dict)
+        return cls(user_pp_size=_setting(data, section, 'user_pp_size', kind=int, positive=True),
+                   owner_pp_size=_setting(data, section, 'owner_pp_size', kind=int, positive=True),
+                   privacy_dim=tuple(tuple(dim) for dim in _setting(data, section, 'privacy_dim', kind=list)),
+                   gamma_ranges=PrivacyTypeSettings.from_dict(_setting(data, section, 'gamma_ranges', kind=dict),
+                                                              section, read=_setting_range),
+                   pragmatist_thresholds=PragmatistThresholds(
+                       _setting(thresholds, section, 'one_phase', probability=True),
+                       _setting(thresholds, section, 'two_phase', probability=True)))
+
+
+@dataclass(frozen=True)
+class CunchePhaseThresholds:
+    """
+    Cunche consent thresholds of a single privacy type.
+    """
+    initial_consent_probability: float
+    first_phase_probability: float
+
+
+@dataclass(frozen=True)
+class CuncheSettings:
+    """
+    Cunche negotiation protocol parameters.
+    """
+    user_pp_size: int
+    owner_pp_size: int
+    consent_thresholds: PrivacyTypeSettings  # of CunchePhaseThresholds
+    default_phase: int
+
+    @classmethod
+    def from_dict(cls, data, section='Cunche'):
+        """
+        :param data: Section dictionary from config.yaml.
+        :param section: Section name.
+        :return: CuncheSettings object.
+        """
+        def read_thresholds(thresholds, section_, key):
+            values = _setting(thresholds, section_, key, kind=dict)
+            return CunchePhaseThresholds(*(_setting(values, section_, f.name, probability=True)
+                                           for f in fields(CunchePhaseThresholds)))
+
+        thresholds = _setting(data, section, 'consent_thresholds', kind=dict)
+        return cls(user_pp_size=_setting(data, section, 'user_pp_size', kind=int, positive=True),
+                   owner_pp_size=_setting(data, section, 'owner_pp_size', kind=int, positive=True),
+                   consent_thresholds=PrivacyTypeSettings.from_dict(thresholds, section, read=read_thresholds),
+                   default_phase=_setting(thresholds, section, 'default_phase', kind=int))
+
+
+@dataclass(frozen=True)
+class ConcessionSettings:
+    """
+    Concession negotiation protocol parameters.
+    """
+    user_pp_size: int
+    owner_pp_size: int
+    negotiation_steps: int
+    consent_probabilities: PrivacyTypeSettings
+
+    @classmethod
+    def from_dict(cls, data, section='Concession'):
+        """
+        :param data: Section dictionary from config.yaml.
+        :param section: Section name.
+        :return: ConcessionSettings object.
+        """
+        return cls(user_pp_size=_setting(data, section, 'user_pp_size', kind=int, positive=True),
+                   owner_pp_size=_setting(data, section, 'owner_pp_size', kind=int, positive=True),
+                   negotiation_steps=_setting(data, section, 'negotiation_steps', kind=int, positive=True),
+                   consent_probabilities=PrivacyTypeSettings.from_dict(
+                       _setting(data, section, 'consent_probabilities', kind=dict), section,
+                       read=partial(_setting, probability=True)))
+
+
+@dataclass(frozen=True)
+class DeadlineFactors:
+    """
+    Padome negotiation deadline factors.
+    """
+    base_deadline: float
+    user_count_factor_multiplier: float
+    network_factors: tuple  # of (network name, factor) pairs
+    default_network_factor: float
+    distance_factor_multiplier: float
+    pp_size_factor_multiplier: float
+
+    def network_factor(self, network):
+        """
+        Look up the network factor, falling back to the default factor.
+        :param network: Network name as given in config.yaml (e.g., BLE).
+        :return: Network factor.
+        """
+        for name, factor in self.network_factors:
+            if name == network:
+                return factor
+        return self.default_network_factor
+
+
+@dataclass(frozen=True)
+class PadomeSettings:
+    """
+    Padome negotiation protocol parameters.
+    """
+    reservation_value: float
+    user_pp_size: int
+    owner_pp_size: int
+    neg_value: int
+    neg_range: int
+    deadline_factors: DeadlineFactors
+    privacy_type_distribution: PrivacyTypeSettings
+    response_likelihood: PrivacyTypeSettings
+    user_elicitation_cost: float
+    privacy_weights: PrivacyTypeSettings  # of (data_collection, data_retention, data_sharing) weights
+
+    @classmethod
+    def from_dict(cls, data, section='Padome'):
+        """
+        :param data: Section dictionary from config.yaml.
+        :param section: Section name.
+        :return: PadomeSettings object.
+        """
+        factors = _setting(data, section, 'deadline_factors', kind=dict)
+        network_factors = dict(_setting(factors, section, 'network_factors', kind=dict))
+        deadline_factors = DeadlineFactors(
+            base_deadline=_setting(factors, section, 'base_deadline'),
+            user_count_factor_multiplier=_setting(factors, section, 'user_count_factor_multiplier'),
+            default_network_factor=network_factors.pop('default', 0),
+            network_factors=tuple(network_factors.items()),
+            distance_factor_multiplier=_setting(factors, section, 'distance_factor_multiplier'),
+            pp_size_factor_multiplier=_setting(factors, section, 'pp_size_factor_multiplier'))
+
+        def read_weights(weights, section_, key):
+            return tuple(_setting(weights, section_, key, kind=list))
+
+        return cls(reservation_value=_setting(data, section, 'reservation_value'),
+                   user_pp_size=_setting(data, section, 'user_pp_size', kind=int, positive=True),
+                   owner_pp_size=_setting(data, section, 'owner_pp_size', kind=int, positive=True),
+                   neg_value=_setting(data, section, 'neg_value', kind=int, positive=True),
+                   neg_range=_setting(data, section, 'neg_range', kind=int, positive=True),
+                   deadline_factors=deadline_factors,
+                   privacy_type_distribution=PrivacyTypeSettings.from_dict(
+                       _setting(data, section, 'privacy_type_distribution', kind=dict), section,
+                       read=partial(_setting, probability=True)),
+                   response_likelihood=PrivacyTypeSettings.from_dict(
+                       _setting(data, section, 'response_likelihood', kind=dict), section,
+                       read=partial(_setting, probability=True)),
+                   user_elicitation_cost=_setting(data, section, 'user_elicitation_cost'),
+                   privacy_weights=PrivacyTypeSettings.from_dict(
+                       _setting(data, section, 'privacy_weights', kind=dict), section, read=read_weights))
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Frozen, validated view of config.yaml. Compiled once and cheap to pickle (e.g., to ship to worker processes).
+    """
+    tournament: TournamentSettings
+    university: ScenarioSettings
+    hospital: ScenarioSettings
+    shopping_mall: ScenarioSettings
+    example: ScenarioSettings
+    lora: LoraSettings
+    zigbee: ZigbeeSettings
+    ble: BLESettings
+    network: NetworkSettings
+    execution: ExecutionSettings
+    alanezi: AlaneziSettings
+    cunche: CuncheSettings
+    concession: ConcessionSettings
+    padome: PadomeSettings
+
+    @classmethod
+    def from_dict(cls, config):
+        """
+        :param config: config Python object (as returned by load_config()).
+        :return: Settings object.
+        """
+        def section(name):
+            if not isinstance(config.get(name), dict):
+                raise ValueError(f"Missing section '{name}' in config.yaml")
+            return config[name]
+
+        return cls(tournament=TournamentSettings.from_dict(section('Tournament')),
+                   university=ScenarioSettings.from_dict(section('University'), 'University'),
+                   hospital=ScenarioSettings.from_dict(section('Hospital'), 'Hospital'),
+                   shopping_mall=ScenarioSettings.from_dict(section('ShoppingMall'), 'ShoppingMall'),
+                   example=ScenarioSettings.from_dict(section('Example'), 'Example'),
+                   lora=LoraSettings.from_dict(section('Lora')),
+                   zigbee=ZigbeeSettings.from_dict(section('Zigbee')),
+                   ble=BLESettings.from_dict(section('BLE')),
+                   # optional section, older config files do not have it
+                   network=NetworkSettings.from_dict(config.get('Network') or {}),
+                   execution=ExecutionSettings.from_dict(config.get('Execution') or {}),
+                   alanezi=AlaneziSettings.from_dict(section('Alanezi')),
+                   cunche=CuncheSettings.from_dict(section('Cunche')),
+                   concession=ConcessionSettings.from_dict(section('Concession')),
+                   padome=PadomeSettings.from_dict(section('Padome')))
+
+
+def load_settings(file_path='config.yaml'):
+    """
+    Load and compile the YAML config file into a Settings object.
+    :param file_path: YAML config file path (config.yaml)
+    :return: Settings object
+    """
+    return Settings.from_dict(load_config(file_path))
+
+
+# Store compiled settings globally
+_settings = None
+
+
+def get_settings():
+    """
+    Get the compiled Settings object. config.yaml is parsed only on first access.
+    :return: Settings object
+    """
+    global _settings
+    if _settings is None:
+        _settings = Settings.from_dict(get_config())
+    return _settings
+
+
+def set_settings(settings):
+    """
+    Install an already compiled Settings object (e.g., one shipped to a worker process),
+    so that config.yaml does not have to be parsed again.
+    :param settings: Settings object.
+    """
+    global _settings
+    _settings = settings
+
+
 def calc_utility(time, energy, weights):
     """
     Calculate the utility of the device
@@ -46,9 +795,25 @@ def calc_utility(time, energy, weights):
     :param weights: Represents the importance of time left vs power consumption.
     :return: Estimated utility.
     """
+    return calc_utility_batch(time, energy, weights)[()]
+
+
+def calc_utility_batch(times, energies, weights):
+    """
+    Array-in, array-out version of calc_utility(). Scores many users at once.
+    :param times: Array of times the users will be in the environment (s).
+    :param energies: Array of current power consumptions (W).
+    :param weights: Either a single [w_time, w_energy] pair shared by all users or an array of shape (n, 2)
+    with per-user weights.
+    :return: Array of estimated utilities.
+    """
     k = 100  # scaling factor
 
-    utility = k * (weights[0] * np.log(1 + time) / weights[1] * np.log(1 + energy))
+    weights = np.asarray(weights, dtype=float)
+    w_time, w_energy = weights[..., 0], weights[..., 1]
+
+    utility = k * (w_time * np.log(1 + np.asarray(times, dtype=float)) / w_energy
+               * np.log(1 + np.asarray(energies, dtype=float)))
     # utility = k * np.log(1 + time) / np.log(1 + energy) # alternative method for unweighted utility calculations
 
     return utility
@@ -60,21 +825,27 @@ def calc_time_remaining(user):
     :param user: User object.
     :return: Remaining time in seconds.
     """
+    return calc_time_remaining_batch(user.curr_loc, user.dep_loc, user.speed)[()]
 
-    # Get user's current location
-    curr_loc = user.curr_loc
-    # Get user's destination
-    dest = user.dep_loc
-    # Get user's speed
-    speed = user.speed
 
-    # Calculate distance between user's current location and destination
-    distance = np.sqrt((curr_loc[0] - dest[0]) ** 2 + (curr_loc[1] - dest[1]) ** 2)
+def calc_time_remaining_batch(curr_locs, dep_locs, speeds):
+    """
+    Array-in, array-out version of calc_time_remaining().
+    :param curr_locs: Array of users' current locations with shape (n, 2) (or a single (x, y)).
+    :param dep_locs: Array of users' destinations with shape (n, 2) (or a single (x, y)).
+    :param speeds: Array of users' speeds (or a single speed).
+    :return: Array of remaining times.
+    """
+    curr_locs = np.asarray(curr_locs, dtype=float)
+    dep_locs = np.asarray(dep_locs, dtype=float)
 
-    # Calculate time it takes for user to reach destination
-    time = distance / speed
+    # Calculate distance between users' current locations and destinations. float_power squares with pow() like
+    # the scalar formula, the ** operator squares arrays by multiplication, which rounds differently for some inputs
+    distances = np.sqrt(np.float_power(curr_locs[..., 0] - dep_locs[..., 0], 2)
+                        + np.float_power(curr_locs[..., 1] - dep_locs[..., 1], 2))
 
-    return time
+    # Calculate time it takes for users to reach destination
+    return distances / np.asarray(speeds, dtype=float)
 
 
 def check_distance(curr_loc, distance):
@@ -208,18 +979,81 @@ def determine_decimals(value):
         return min(10, abs(int(np.floor(np.log10(abs(value))))) + 2)
 
 
+class RandomStreams:
+    """
+    Independent random number streams for a single simulation run, all derived from one root seed
+    with numpy SeedSequence. Every subsystem (e.g., user arrivals) and every user gets its own generator,
+    keyed by name or user id rather than by creation order, so results do not depend on the order
+    (or the thread/process) in which the streams are consumed.
+    """
+    # spawn keys of the subsystem streams
+    SUBSYSTEMS = {"arrivals": 0, "protocol": 1}
+    # spawn key prefix of the per-user streams
+    USERS = 2
+
+    def __init__(self, seed=None):
+        """
+        Initialize the root seed sequence.
+        :param seed: Root seed of the run. If None, fresh entropy is drawn from the OS.
+        """
+        self.root = np.random.SeedSequence(seed)
+        # log/store this value to reproduce the run
+        self.seed = self.root.entropy
+
+    def _generator(self, *spawn_key):
+        """
+        Create the generator of the child seed sequence with the given spawn key.
+        :param spawn_key: Spawn key of the child seed sequence.
+        :return: numpy Generator.
+        """
+        return np.random.default_rng(np.random.SeedSequence(self.seed, spawn_key=spawn_key))
+
+    def subsystem(self, name):
+        """
+        Get a fresh generator for a subsystem of the simulation.
+        :param name: Subsystem name (see SUBSYSTEMS).
+        :return: numpy Generator.
+        """
+        if name not in self.SUBSYSTEMS:
+            raise ValueError(f"Unknown random stream: {name}")
+        return self._generator(self.SUBSYSTEMS[name])
+
+    def user(self, user_id):
+        """
+        Get a fresh generator for a user. Used for everything drawn for or by the user
+        (e.g., speed, trajectory, privacy preferences and the user's negotiation decisions).
+        :param user_id: Unique user id.
+        :return: numpy Generator.
+        """
+        return self._generator(self.USERS, user_id)
+
+
+def derive_run_seed(seed, run):
+    """
+    Derive the root seed of a tournament run from the tournament seed.
+    Every run number gets its own seed, shared by all protocol/network/scenario combinations,
+    so that they are compared on the same user populations.
+    :param seed: Tournament seed.
+    :param run: Run number.
+    :return: Root seed of the run (int).
+    """
+    return int(np.random.SeedSequence(seed, spawn_key=(run,)).generate_state(1, np.uint64)[0])
+
+
 class Distribution:
     """
     Class for different distribution implementation.
     Currently, implements only Poisson arrival process.
     """
 
-    def __init__(self, distribution_type):
+    def __init__(self, distribution_type, rng=None):
         """
         Initialize the Distribution class.
         :param distribution_type: Type of distribution to call.
+        :param rng: numpy Generator to draw samples from (see RandomStreams). If None, an unseeded one is used.
         """
         self.distribution_type = distribution_type
+        self.rng = rng if rng is not None else np.random.default_rng()
 
     def generate_random_samples(self, rate):
         """
@@ -232,7 +1066,7 @@ class Distribution:
                 raise ValueError("Rate parameter is required for exponential distribution")
             # Poisson process
             # Get the next probability value from Uniform(0,1)
-            p = random.random()
+            p = self.rng.random()
 
             # Plug it into the inverse of the CDF of Exponential(_lambda)
             inter_arrival_time = -math.log(1.0 - p) / rate
@@ -252,98 +1086,92 @@ def calc_norm_utility(data, is_iot_device):
 
     # Scaling utilities
     if not is_iot_device:
-        # Find the maximum utility
-        max_utility = max([u.utility for u in data])
-
-        # Find the minimum utility
-        min_utility = min([u.utility for u in data])
-        for u in data:
-            # check that utilities are non-zero
-            if max_utility != 0:
-                u.norm_utility = (u.utility - min_utility) / (max_utility - min_utility) * 100
+        norm_utilities = normalize_utilities([u.utility for u in data])
+        if norm_utilities is not None:
+            for u, norm_utility in zip(data, norm_utilities):
+                u.norm_utility = norm_utility
 
     # check that utilities are non-zero
     else:
-        # Find the maximum utility
-        max_utility = max([u.utility for u in data[:-1]])
-
-        # Find the minimum utility
-        min_utility = min([u.utility for u in data[:-1]])
-
-        if max_utility != 0:
-            # Scale iot device utility
-            data[-1].norm_utility = ((data[-1].utility - min_utility) / (max_utility - min_utility) * 100) / len(
-                data)
-
-
-def df_w_v(x, a, b):
-    """
-    Define the PDF df_w^v(x) for the uniform distribution U(a, b).
-
-    :param x: The point at which the PDF is evaluated. It can be any real number.
-    :param a: The lower bound of the uniform distribution.
-    :param b: The upper bound of the uniform distribution.
-    :return: The value of the PDF at the point `x`.
-    If `x` is within the range [a, b], the value is 1 / (b - a), otherwise, it returns 0.
-    """
-    if a <= x <= b:
-        return 1 / (b - a)
-    else:
-        return 0
+        # Scale iot device utility against the user utilities
+        norm_utility = normalize_utilities([u.utility for u in data[:-1]], data[-1].utility)
+        if norm_utility is not None:
+            data[-1].norm_utility = norm_utility / len(data)
 
 
-def integral_function(z, a, b, c_w):
+def normalize_utilities(utilities, values=None):
     """
-    Define the equation to solve for z by computing the integral of the weighted PDF.
-    :param z: The lower limit of the integral.
-    :param a: The lower bound of the uniform distribution.
-    :param b: The upper bound of the uniform distribution.
-    :param c_w: A constant value to compare the integral result against in order to solve for z.
-    In our case the elicitation cost.
-    :return: The equation to solve for: integral_value - c(w) = 0
+    Min/max normalization of utilities to [0, 100] in one pass over the data.
+    :param utilities: Array of utilities that define the scale (minimum and maximum).
+    :param values: Values to scale. If None, the utilities themselves are scaled.
+    :return: Scaled values (NaN if all utilities are equal, so there is no scale) or None if the maximum utility is
+    zero (nothing to scale).
     """
+    utilities = np.asarray(utilities, dtype=float)
+    min_utility, max_utility = utilities.min(), utilities.max()
 
-    # Define the integrand
-    def integrand(x):
-        """
-        The integrand function to be integrated.
-        :param x: The variable of integration.
-        :return: The value of the integrand.
-        """
-        return (x - z) * df_w_v(x, a, b)
+    # check that utilities are non-zero
+    if max_utility == 0:
+        return None
 
-    # Compute the integral from z to b
-    integral_value, _ = quad(integrand, z, b)
+    values = utilities if values is None else np.asarray(values, dtype=float)
+    if max_utility == min_utility:
+        # do not fail the finished run over its summary
+        logging.warning("Cannot normalize utilities, all of them are equal (%s)", max_utility)
+        return np.full_like(values, np.nan)[()]
 
-    # The equation to solve for: integral_value - c(w) = 0
-    return integral_value - c_w
+    return ((values - min_utility) / (max_utility - min_utility) * 100)[()]
 
 
 def solve_for_z(a, b, c_w):
     """
-    Solve for z using the numerical solver `fsolve`.
-    This function uses `fsolve` to solve the equation defined by the integral function. The goal
-    is to find a value of `z` such that the integral value is equal to the constant `c_w`.
+    Solve for the reservation index z of the uniform distribution U(a, b), i.e., the value of `z` such that
+    the integral of (x - z) * f(x) from z to b, with f the PDF of U(a, b), is equal to the constant `c_w`.
+    Solutions are cached by (a, b, c_w), since the same offer distributions and elicitation cost are queried
+    on every negotiation round.
 
     :param a: The lower bound of the uniform distribution.
     :param b: The upper bound of the uniform distribution.
     :param c_w: A constant value that the result of the integral is compared against, i.e., elicitation cost.
 
-    :return: The value of `z` that satisfies the equation defined by the integral function.
+    :return: The value of `z` that satisfies the equation.
     """
+    return _solve_for_z_cached(float(a), float(b), float(c_w))
 
-    # Initial guess for z (start with the midpoint of the range)
-    z_initial_guess = (a + b) / 2
 
-    # Solve for z using numerical method
-    z_solution = fsolve(integral_function, z_initial_guess, args=(a, b, c_w))[0]
+@lru_cache(maxsize=1024)
+def _solve_for_z_cached(a, b, c_w):
+    """
+    Cached scalar version of solve_for_z_batch().
+    :param a: The lower bound of the uniform distribution.
+    :param b: The upper bound of the uniform distribution.
+    :param c_w: Elicitation cost.
+    :return: The value of `z`.
+    """
+    return float(solve_for_z_batch(a, b, c_w))
 
-    # Alternatively use
-    # from scipy.optimize import brentq
-    #
-    # z_solution = brentq(integral_function, a - 0.1, b, args=(a, b, c_w))
 
-    return z_solution
+def solve_for_z_batch(a, b, c_w):
+    """
+    Closed-form solution of the reservation index equation of solve_for_z() for uniform distributions U(a, b).
+    For z in [a, b] the integral is (b - z)^2 / (2 * (b - a)), which gives z = b - sqrt(2 * c_w * (b - a)).
+    If the elicitation cost is larger than half the range, the solution lies below a, where the integral is
+    (a + b) / 2 - z, so z = (a + b) / 2 - c_w.
+
+    :param a: Array of lower bounds of the uniform distributions (or a single value).
+    :param b: Array of upper bounds of the uniform distributions (or a single value).
+    :param c_w: Array of elicitation costs (or a single value).
+    :return: Array of `z` values.
+    """
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    c_w = np.asarray(c_w, dtype=float)
+
+    inside = (b - a) / 2 >= c_w
+    with np.errstate(invalid='ignore'):
+        z_inside = b - np.sqrt(2 * c_w * (b - a))
+
+    return np.where(inside, z_inside, (a + b) / 2 - c_w)[()]
 
 
 def point_to_segment_distance(p, a, b):
@@ -354,36 +1182,58 @@ def point_to_segment_distance(p, a, b):
     :param b: End of the segment (x2, y2)
     :return: Shortest distance from point p to the segment ab
     """
-    # Convert to numpy arrays for vector math
-    p = np.array(p)
-    a = np.array(a)
-    b = np.array(b)
+    return segment_to_point_distances([a], [b], p)[0]
+
+
+def segment_to_point_distances(seg_starts, seg_ends, point=(0, 0)):
+    """
+    Vectorized version of point_to_segment_distance(). Computes the shortest distance from a single point to many
+    segments at once.
+    :param seg_starts: Array-like of segment start points with shape (n, 2), e.g., user arrival locations.
+    :param seg_ends: Array-like of segment end points with shape (n, 2), e.g., user departure locations.
+    :param point: The point (x, y), by default the IoT device location (0, 0).
+    :return: Array of n shortest distances from the point to each segment.
+    """
+    a = np.asarray(seg_starts, dtype=float).reshape(-1, 2)
+    b = np.asarray(seg_ends, dtype=float).reshape(-1, 2)
+    p = np.asarray(point, dtype=float)
     ab = b - a
     ap = p - a
 
-    # Project point p onto line ab, compute parameter t of projection
-    t = np.dot(ap, ab) / np.dot(ab, ab)
+    # Project the point onto every line at once, guarding against degenerate (zero-length) segments
+    ab_sq = np.einsum('ij,ij->i', ab, ab)
+    t = np.divide(np.einsum('ij,ij->i', ap, ab), ab_sq, out=np.zeros_like(ab_sq), where=ab_sq != 0)
 
     # Clamp t to [0, 1] to restrict to segment
-    t = max(0, min(1, t))
+    t = np.clip(t, 0, 1)
+
+    # Distance from the point to the closest point on each segment
+    closest = a + t[:, None] * ab
+    return np.hypot(p[0] - closest[:, 0], p[1] - closest[:, 1])
 
-    # Compute the closest point on the segment
-    closest = a + t * ab
 
-    # Return distance from p to that point
-    return np.linalg.norm(p - closest)
+def users_in_range_mask(users, comm_range, device_location=(0, 0)):
+    """
+    Used to determine, in one vectorized pass, which users at least at some point crossed the communications range
+    of the IoT device.
+    :param users: list of users
+    :param comm_range: communications range of the IoT device
+    :param device_location: IoT device location (x, y), by default the center of the environment (0, 0).
+    :return: Boolean numpy array, True for users whose trajectory crosses the communication range
+    """
+    if not users:
+        return np.zeros(0, dtype=bool)
+    distances = segment_to_point_distances([u.arr_loc for u in users], [u.dep_loc for u in users], device_location)
+    return distances <= comm_range
 
 
-def get_users_in_range(users, comm_range):
+def get_users_in_range(users, comm_range, device_location=(0, 0)):
     """
     Used to get users that at least at some point crossed the communications range of the IoT device
     :param users: list of users
     :param comm_range: communications range of the IoT device
+    :param device_location: IoT device location (x, y), by default the center of the environment (0, 0).
     :return: list of users that at least at some point crossed the communications range of the IoT device
     """
-    users_in_range = []
-    for user in users:
-        distance = point_to_segment_distance((0, 0), user.arr_loc, user.dep_loc)
-        if distance <= comm_range:
-            users_in_range.append(user)
-    return users_in_range
+    mask = users_in_range_mask(users, comm_range, device_location)
+    return [user for user, in_range in zip(users, mask) if in_range]